@@ -0,0 +1,207 @@
+import json
+import posixpath
+import re
+import threading
+from collections import OrderedDict
+
+# Реестр типов проверки ответа: имя -> фабрика(expected, spec) -> matcher(answer) -> bool.
+# Тип задается в JSON задания полем "check", например:
+#   {"type": "input", "correct_answer": "7", "check": {"type": "numeric", "tolerance": 0}}
+MATCHERS = {}
+
+# Тип проверки по умолчанию для заданий без поля "check"
+DEFAULT_MATCHERS = {
+    'question': 'exact',
+    'input': 'text',
+}
+
+COMPILED_CACHE_SIZE = 64
+
+
+class CheckSpecError(ValueError):
+    """Поле check задания не разбирается: неизвестный тип проверки или неверные параметры"""
+
+
+def register_matcher(name):
+    def decorator(factory):
+        MATCHERS[name] = factory
+        return factory
+    return decorator
+
+
+def _as_list(value):
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def _as_text(answer):
+    return '' if answer is None else str(answer)
+
+
+def _normalize_text(value, collapse_whitespace=False):
+    # Как в исходной проверке: пробелы по краям и регистр не важны. С опцией
+    # "collapse_whitespace" пробелы внутри ответа тоже сводятся к одному
+    text = _as_text(value)
+    text = ' '.join(text.split()) if collapse_whitespace else text.strip()
+    return text.lower()
+
+
+def _parse_number(value):
+    try:
+        return float(_as_text(value).strip().replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def _split_items(value, separator, collapse_whitespace=False):
+    return [_normalize_text(item, collapse_whitespace)
+            for item in _as_text(value).split(separator) if item.strip()]
+
+
+def _canonical_path(value, case_sensitive):
+    path = _as_text(value).strip()
+    if not path:
+        return ''
+    path = posixpath.normpath(path)
+    if path.startswith('//'):
+        path = '/' + path.lstrip('/')
+    return path if case_sensitive else path.casefold()
+
+
+@register_matcher('exact')
+def exact_matcher(expected, spec):
+    options = _as_list(expected)
+    return lambda answer: answer in options
+
+
+@register_matcher('text')
+def text_matcher(expected, spec):
+    collapse = spec.get('collapse_whitespace', False)
+    options = frozenset(_normalize_text(value, collapse) for value in _as_list(expected))
+    return lambda answer: _normalize_text(answer, collapse) in options
+
+
+@register_matcher('numeric')
+def numeric_matcher(expected, spec):
+    tolerance = float(spec.get('tolerance', 0))
+    targets = [_parse_number(value) for value in _as_list(expected)]
+    if any(target is None for target in targets):
+        raise ValueError(f'Некорректное числовое значение ответа: {expected!r}')
+
+    def match(answer):
+        number = _parse_number(answer)
+        return number is not None and any(abs(number - target) <= tolerance for target in targets)
+    return match
+
+
+@register_matcher('regex')
+def regex_matcher(expected, spec):
+    flags = re.IGNORECASE if spec.get('ignore_case', True) else 0
+    pattern = re.compile(spec.get('pattern', expected), flags)
+    return lambda answer: pattern.fullmatch(_as_text(answer).strip()) is not None
+
+
+@register_matcher('set')
+def set_matcher(expected, spec):
+    separator = spec.get('separator', ',')
+    collapse = spec.get('collapse_whitespace', False)
+    if isinstance(expected, (list, tuple)):
+        target = frozenset(_normalize_text(item, collapse) for item in expected)
+    else:
+        target = frozenset(_split_items(expected, separator, collapse))
+    return lambda answer: frozenset(_split_items(answer, separator, collapse)) == target
+
+
+@register_matcher('ordered')
+def ordered_matcher(expected, spec):
+    separator = spec.get('separator', ',')
+    collapse = spec.get('collapse_whitespace', False)
+    if isinstance(expected, (list, tuple)):
+        target = [_normalize_text(item, collapse) for item in expected]
+    else:
+        target = _split_items(expected, separator, collapse)
+    return lambda answer: _split_items(answer, separator, collapse) == target
+
+
+@register_matcher('path')
+def path_matcher(expected, spec):
+    case_sensitive = spec.get('case_sensitive', True)
+    options = frozenset(_canonical_path(value, case_sensitive) for value in _as_list(expected))
+    return lambda answer: _canonical_path(answer, case_sensitive) in options
+
+
+def compile_matcher(task):
+    """Создает функцию проверки ответа для одного задания"""
+    spec = task.get('check') or {}
+    if isinstance(spec, str):
+        spec = {'type': spec}
+
+    matcher_type = spec.get('type') or DEFAULT_MATCHERS.get(task.get('type'))
+    if matcher_type is None:
+        return None
+
+    factory = MATCHERS.get(matcher_type)
+    if factory is None:
+        raise ValueError(f"Неизвестный тип проверки ответа: {matcher_type}")
+
+    return factory(spec.get('expected', task.get('correct_answer')), spec)
+
+
+class CompiledLab:
+    """Разобранный контент работы с подготовленными проверками ответов"""
+
+    __slots__ = ('version', 'tasks', 'tasks_by_number', 'matchers')
+
+    def __init__(self, content, version=None):
+        self.version = version
+        self.tasks = json.loads(content) if content else []
+        self.tasks_by_number = {t.get('task_number'): t for t in self.tasks if t.get('task_number')}
+        self.matchers = {}
+        for number, task in self.tasks_by_number.items():
+            try:
+                self.matchers[number] = compile_matcher(task)
+            except (ValueError, TypeError, AttributeError, re.error) as e:
+                raise CheckSpecError(f"Задание {number}: {e}") from e
+
+    def check(self, task_number, answer):
+        matcher = self.matchers.get(task_number)
+        return bool(matcher and matcher(answer))
+
+
+def validate_content(content):
+    """Разбор заданий и их проверок без кэширования; ошибка - CheckSpecError или ValueError JSON"""
+    return CompiledLab(content)
+
+
+_compiled_labs = OrderedDict()
+_compiled_labs_lock = threading.Lock()
+
+
+def get_compiled_lab(lab):
+    """Возвращает скомпилированный контент работы; компиляция - один раз на версию контента.
+
+    Версию и контент дает lab.task_source(): после новой сборки пакета работы
+    версия меняется, и задания компилируются заново. Контент при этом не
+    хешируется: проверка ответа не зависит от его размера.
+    """
+    version, content = lab.task_source()
+    key = (lab.id, version)
+
+    with _compiled_labs_lock:
+        compiled = _compiled_labs.get(key)
+        if compiled is not None:
+            _compiled_labs.move_to_end(key)
+            return compiled
+
+    compiled = CompiledLab(content, version)
+
+    with _compiled_labs_lock:
+        _compiled_labs[key] = compiled
+        while len(_compiled_labs) > COMPILED_CACHE_SIZE:
+            _compiled_labs.popitem(last=False)
+
+    return compiled
+
+
+def clear_compiled_labs():
+    with _compiled_labs_lock:
+        _compiled_labs.clear()
@@ -1,16 +1,149 @@
-from flask import Flask, request, jsonify, session, send_from_directory
+import click
+from flask import Flask, Response, g, request, jsonify, session, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import bindparam, delete, event, insert, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm.exc import StaleDataError
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.security import generate_password_hash, check_password_hash
+from collections import defaultdict
 from datetime import datetime, timedelta
+import gzip
+import io
 import json
 import os
+import random
+import re
+import threading
+import time
+
+from answer_checkers import CheckSpecError, get_compiled_lab
+from fast_json import dumps, json_response
+from jobs import JobRunner
+from lab_packages import LAB_FIELDS, LabPackageError, lab_packages
+from leaderboard import TOTAL, Leaderboard
+from maintenance import (MaintenanceError, backup_database, check_integrity, optimize_database,
+                         vacuum_database)
+from profiler import ProfilerBusy, profiler
+from projections import (ANSWER_SUBMITTED, LAB_COMPLETED, LAB_STARTED, SCORE_RECALCULATED,
+                         STUDENT_GROUP_CHANGED, STUDENT_REMOVED, TIME_HEARTBEAT, WORKSPACE_CHANGED,
+                         ProjectionRunner, StudentLabProjection)
+from rate_limit import RateLimiter
+from read_engine import RoutingSession, read_engine, use_read_engine
+from scoring import (SCORING_RULES_VERSION, apply_task_answer, lab_max_score,
+                     previous_task_completed, replay_attempts, total_task_score)
+from shards import SHARD_FLAG, shard_router, use_shard
+from shared_cache import create_cache_store, default_cache_path
+from snapshot_cache import SnapshotCache
+from static_assets import BUILD_DIR, build_assets, send_asset
 
 app = Flask(__name__, static_folder='../frontend')
 app.config['SECRET_KEY'] = 'cyber-polygon-secret-key-2024'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///cyber_range.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///cyber_range.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['PROGRESS_UPDATE_RETRIES'] = 5
+app.config['MAX_BATCH_ANSWERS'] = 50
+
+# Лимиты частоты запросов на запись: rate - токенов в секунду, burst - емкость корзины
+app.config['RATE_LIMIT_ENABLED'] = True
+app.config['RATE_LIMITS'] = {
+    # Подбор пароля: по адресу и логину; общий лимит адреса рассчитан на класс за одним NAT
+    'login': {'rate': 10 / 60, 'burst': 10, 'key': 'ip_username'},
+    'login_ip': {'rate': 1.0, 'burst': 100, 'key': 'ip'},
+    'answer': {'rate': 1.0, 'burst': 15},
+    'time': {'rate': 0.5, 'burst': 6},
+    # Открытие рабочей области; закрывающие события (hidden/close) не ограничиваются
+    'workspace': {'rate': 1.0, 'burst': 20},
+    'write': {'rate': 2.0, 'burst': 20},
+}
+# Путь к SQLite-файлу с общими для всех воркеров счетчиками (по умолчанию - память процесса)
+app.config['RATE_LIMIT_STORAGE'] = os.environ.get('RATE_LIMIT_STORAGE')
+# Число обратных прокси перед приложением: адрес клиента берется из X-Forwarded-For
+# (без прокси заголовок подделывается клиентом, поэтому по умолчанию не читается)
+app.config['TRUSTED_PROXY_COUNT'] = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+
+# Фоновые задачи: потоков в каждом воркере и интервал опроса очереди (с)
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['JOB_POLL_INTERVAL'] = 1.0
+# Задача без отметки прогресса дольше этого времени (с) считается брошенной упавшим воркером
+app.config['JOB_STALE_AFTER'] = int(os.environ.get('JOB_STALE_AFTER', 600))
+app.config['BULK_DELETE_CHUNK'] = 50
+# Предел одного интервала активности в рабочей области (с): вкладка, оставленная
+# открытой без закрытия страницы, не накапливает часы "работы"
+app.config['WORKSPACE_MAX_INTERVAL'] = int(os.environ.get('WORKSPACE_MAX_INTERVAL', 2 * 3600))
+# Перевод группы в архив: студентов в одной транзакции и пауза между транзакциями (с)
+app.config['ROLLOVER_CHUNK'] = 50
+app.config['ROLLOVER_CHUNK_PAUSE'] = 0.05
+app.config['RECALC_BATCH_SIZE'] = 500
+app.config['RECALC_DIFF_LIMIT'] = 200
+
+# Модели чтения из журнала активности: период фонового обновления (с) и размер пачки событий.
+# ACTIVITY_READ_MODELS=1 переводит статистику работ и ведомость студентов на модель чтения
+# (для базы, созданной до журнала, сначала: flask events-backfill)
+app.config['PROJECTION_INTERVAL'] = 1.0
+app.config['PROJECTION_BATCH_SIZE'] = 1000
+app.config['ACTIVITY_READ_MODELS'] = os.environ.get('ACTIVITY_READ_MODELS') == '1'
+
+# Пакеты работ (lab.json, instructions.html, tasks.json) и период проверки mtime файлов (с)
+app.config['LAB_PACKAGES_DIR'] = os.environ.get(
+    'LAB_PACKAGES_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'labs'))
+app.config['LAB_PACKAGES_CHECK_INTERVAL'] = float(os.environ.get('LAB_PACKAGES_CHECK_INTERVAL', 2))
+
+# Рейтинг по ЛР1/ЛР2: как часто воркер применяет чужие изменения из журнала (с)
+# и сколько строк отдается за один запрос
+app.config['LEADERBOARD_SYNC_INTERVAL'] = float(os.environ.get('LEADERBOARD_SYNC_INTERVAL', 1))
+app.config['LEADERBOARD_MAX_LIMIT'] = 100
+
+# Время жизни снимков ответов преподавательских эндпоинтов (с)
+app.config['SNAPSHOT_CACHE_TTL'] = float(os.environ.get('SNAPSHOT_CACHE_TTL', 5))
+# Каталог работ меняется только синхронизацией пакетов (flask labs-sync)
+app.config['CATALOG_CACHE_TTL'] = float(os.environ.get('CATALOG_CACHE_TTL', 300))
+# Путь к SQLite-файлу общего уровня кэша: сбросы кэша и готовые снимки видны всем воркерам
+# и командам flask (labs-sync). По умолчанию - свой файл для каждой базы (<база>.cache);
+# CACHE_STORAGE= (пусто) - кэш только в памяти процесса
+app.config['CACHE_STORAGE'] = os.environ.get(
+    'CACHE_STORAGE', default_cache_path(app.config['SQLALCHEMY_DATABASE_URI'], app.instance_path))
+
+# Отдельный пул соединений только для чтения: GET-запросы преподавателя
+# не занимают соединения, через которые пишут студенты
+app.config['READ_ENGINE_POOL_SIZE'] = int(os.environ.get('READ_ENGINE_POOL_SIZE', 5))
 
-db = SQLAlchemy(app)
+# Шарды с прогрессом и попытками студентов: имя -> URI базы, например
+# DATABASE_SHARDS='{"ib": "sqlite:///shard-ib.db", "it": "sqlite:///shard-it.db"}'.
+# Группа или кафедра -> шард; остальные группы распределяются по хешу
+app.config['SHARDS'] = json.loads(os.environ.get('DATABASE_SHARDS', '{}'))
+app.config['SHARD_ASSIGNMENTS'] = json.loads(os.environ.get('SHARD_ASSIGNMENTS', '{}'))
+
+# Профилировщик /api/debug/profiler включается явно: PROFILER_ENABLED=1
+app.config['PROFILER_ENABLED'] = os.environ.get('PROFILER_ENABLED') == '1'
+app.config['PROFILER_MAX_SECONDS'] = 120
+app.config['PROFILER_MAX_REQUESTS'] = 1000
+
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+read_engine.init_app(app, db)
+shard_router.init_app(app, db)
+lab_packages.init_app(app)
+if app.config['TRUSTED_PROXY_COUNT']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_COUNT'])
+rate_limiter = RateLimiter()
+# Снимки сбрасываются при изменении состава студентов и итоговых баллов;
+# мелкие изменения (например, время последней активности) ограничены TTL
+cache_store = create_cache_store(app.config['CACHE_STORAGE'])
+snapshot_cache = SnapshotCache(ttl=app.config['SNAPSHOT_CACHE_TTL'], store=cache_store)
+catalog_cache = SnapshotCache(ttl=app.config['CATALOG_CACHE_TTL'], store=cache_store, namespace='catalog')
+leaderboard = Leaderboard()
+
+# SQLite используется несколькими процессами-воркерами: WAL позволяет читать
+# во время записи, busy_timeout - дождаться блокировки вместо ошибки
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if type(dbapi_connection).__module__ != 'sqlite3':
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA busy_timeout=5000')
+    cursor.close()
 
 # Модели базы данных
 class User(db.Model):
@@ -21,6 +154,8 @@ class User(db.Model):
     role = db.Column(db.String(20), nullable=False)  # student, teacher
     group = db.Column(db.String(50))
     department = db.Column(db.String(100))
+    # Шард с прогрессом студента (None - основная база)
+    shard = db.Column(db.String(50))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def set_password(self, password):
@@ -45,10 +180,28 @@ class Lab(db.Model):
     description = db.Column(db.Text)
     lab_number = db.Column(db.Integer, nullable=False)  # 0 - подготовка, 1 - ЛР1, 2 - ЛР2
     difficulty = db.Column(db.String(20), nullable=False)  # easy, medium, hard
-    content = db.Column(db.Text)  # JSON с заданиями
+    content = db.Column(db.Text)  # JSON с заданиями (для работ без пакета)
     max_score = db.Column(db.Integer, default=100)
     is_active = db.Column(db.Boolean, default=True)
     order = db.Column(db.Integer, nullable=False)
+    # Пакет работы в LAB_PACKAGES_DIR, из которого берется контент
+    package = db.Column(db.String(100))
+    
+    def task_content(self):
+        """JSON заданий: из пакета работы, если он есть, иначе из столбца content"""
+        return self.task_source()[1]
+    
+    def task_source(self):
+        """(версия, JSON заданий). Версия пакета - номер его сборки; столбец content
+        меняется только в sync_lab_packages, который сбрасывает поколение каталога"""
+        if self.package:
+            try:
+                revision, content = lab_packages.versioned_content(self.package)
+                return ('package', self.package, revision), content
+            except LabPackageError:
+                # Пакет удален или не собирается: копия с последней синхронизации
+                pass
+        return ('content', cache_store.generation(catalog_cache.namespace)), self.content
     
     def to_dict(self):
         return {
@@ -70,10 +223,33 @@ class StudentProgress(db.Model):
     attempts = db.Column(db.Integer, default=0)
     start_time = db.Column(db.DateTime)
     end_time = db.Column(db.DateTime)
+    # Активное время (с) по закрытым интервалам; открытый интервал начался в active_since
+    # и длится, пока видна хотя бы одна вкладка из active_tabs (JSON-список)
     total_time = db.Column(db.Integer, default=0)
+    active_since = db.Column(db.DateTime)
+    active_tabs = db.Column(db.Text)
     completed_tasks = db.Column(db.Text, default='[]')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Версия строки: UPDATE выполняется с условием version = прочитанной,
+    # при расхождении SQLAlchemy выбрасывает StaleDataError
+    version = db.Column(db.Integer, nullable=False, default=1)
+    # Версия правил подсчета баллов, по которым посчитан score
+    rules_version = db.Column(db.Integer, nullable=False, default=SCORING_RULES_VERSION)
+    
+    __mapper_args__ = {'version_id_col': version}
+    
+    def open_interval(self, now):
+        """Длительность текущего интервала активности (с), не больше WORKSPACE_MAX_INTERVAL"""
+        if not self.active_since:
+            return 0
+        seconds = int((now - self.active_since).total_seconds())
+        return min(max(seconds, 0), app.config['WORKSPACE_MAX_INTERVAL'])
+    
+    def close_interval(self, now):
+        self.total_time = (self.total_time or 0) + self.open_interval(now)
+        self.active_since = None
+        self.active_tabs = None
     
     def to_dict(self):
         return {
@@ -85,7 +261,8 @@ class StudentProgress(db.Model):
             'attempts': self.attempts,
             'start_time': self.start_time.isoformat() if self.start_time else None,
             'end_time': self.end_time.isoformat() if self.end_time else None,
-            'total_time': self.total_time,
+            'total_time': (self.total_time or 0) + self.open_interval(datetime.utcnow()),
+            'active': self.active_since is not None,
             'completed_tasks': json.loads(self.completed_tasks) if self.completed_tasks else []
         }
 
@@ -98,6 +275,70 @@ class TaskAttempt(db.Model):
     is_correct = db.Column(db.Boolean, default=False)
     attempt_time = db.Column(db.DateTime, default=datetime.utcnow)
 
+class ActivityEvent(db.Model):
+    """Журнал активности студентов: строки только добавляются"""
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, nullable=False)
+    lab_id = db.Column(db.Integer)
+    kind = db.Column(db.String(30), nullable=False)
+    payload = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class StudentLabView(db.Model):
+    """Модель чтения: состояние студента по работе, строится из журнала активности"""
+    student_id = db.Column(db.Integer, primary_key=True)
+    lab_id = db.Column(db.Integer, primary_key=True, index=True)
+    status = db.Column(db.String(20), nullable=False)
+    score = db.Column(db.Integer, nullable=False, default=0)
+    answers = db.Column(db.Integer, nullable=False, default=0)
+    correct_answers = db.Column(db.Integer, nullable=False, default=0)
+    elapsed_time = db.Column(db.Integer, nullable=False, default=0)
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    last_event_at = db.Column(db.DateTime)
+
+class ProjectionCheckpoint(db.Model):
+    """Позиция проекции в журнале: id последнего примененного события"""
+    name = db.Column(db.String(50), primary_key=True)
+    position = db.Column(db.Integer, nullable=False, default=0)
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text, default='{}')
+    status = db.Column(db.String(20), default='queued', index=True)  # queued, running, done, failed, cancelled
+    progress_done = db.Column(db.Integer, default=0)
+    progress_total = db.Column(db.Integer)
+    message = db.Column(db.String(200))
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    cancel_requested = db.Column(db.Boolean, default=False)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress_done': self.progress_done,
+            'progress_total': self.progress_total,
+            'message': self.message,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'cancel_requested': self.cancel_requested,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+job_runner = JobRunner(app, db, Job)
+projection_runner = ProjectionRunner(app, db, ActivityEvent, ProjectionCheckpoint,
+                                     [StudentLabProjection(StudentLabView.__table__)])
+
 def create_initial_data():
     if User.query.count() == 0:
         print("Создание начальных данных...")
@@ -122,173 +363,186 @@ def create_initial_data():
         student.set_password('student123')
         db.session.add(student)
         
-        # Создаем практические работы
-        labs_data = [
-            {
-                 'title': 'Подготовительный этап',
-                'description': 'Настройка системы мониторинга и уведомлений',
-                'lab_number': 0,
-                'difficulty': 'easy',
-                'order': 1,
-                'max_score': 0,
-                'content': json.dumps([{
-                    'type': 'info',
-                    'title': 'Подготовительный этап',
-                    'content': '''
-                        <h3>1. Настройка уведомлений на email</h3>
-                        <p><strong>Зайти под учетной записью kali с паролем 190902.</strong></p>
-                        
-                        <h4>1.1. Настройка утилиты logcheck для отправки отчета на email</h4>
-                        <div style="margin-left: 1.5rem;">
-                            <p><strong>1.1.1</strong> Зайти под учетной записью kali с паролем 190902.</p>
-                            <p><strong>1.1.2</strong> Открыть терминал и ввести команду:</p>
-                            <div style="background: var(--bg-secondary); padding: 0.75rem; border-radius: 6px; margin: 0.5rem 0; font-family: monospace;">
-                                sudo nano /etc/logcheck/logcheck.conf
-                            </div>
-                            <p>Для редактирования файла конфигурации logcheck. Необходимо указать свой почтовый адрес email.</p>
-                            <p>Далее сохраняем <kbd>Ctrl+O</kbd> и закрываем файл <kbd>Ctrl+X</kbd></p>
-                        </div>
-                        
-                        <h4>1.2 Настройка почтового клиента MSMTP</h4>
-                        <div style="margin-left: 1.5rem;">
-                            <p><strong>1.2.1</strong> Войти в учетную запись электронной почты mail.ru, войти в раздел
-                            безопасность, найти раздел «Способы входа» и найти пункт «Пароли для
-                            внешних приложений».</p>
-                            <p>После чего необходимо создать новый пароль для внешних приложений
-                            и не закрывая вкладку с появившимся паролем, скопировать его.</p>
-                            
-                            <p><strong>1.2.2</strong> Ввести команду</p>
-                            <div style="background: var(--bg-secondary); padding: 0.75rem; border-radius: 6px; margin: 0.5rem 0; font-family: monospace;">
-                                sudo nano /etc/msmtprc
-                            </div>
-                            <p>и указать свой почтовый адрес email и ввести созданный пароль для
-                            внешних приложений. Сохранить и закрыть файл.</p>
-                            
-                            <p><strong>1.2.3</strong> Ввести команду</p>
-                            <div style="background: var(--bg-secondary); padding: 0.75rem; border-radius: 6px; margin: 0.5rem 0; font-family: monospace;">
-                                sudo nano ~/.msmtprc
-                            </div>
-                            <p>для настройки конфига msmtp для пользователя kali, ввести email и
-                            пароль из п. 1.2.2. Сохранить и закрыть файл.</p>
-                            
-                            <p><strong>1.2.4</strong> Установить права доступа с помощью команд:</p>
-                            <div style="background: var(--bg-secondary); padding: 0.75rem; border-radius: 6px; margin: 0.5rem 0; font-family: monospace;">
-                                sudo chmod 600 /etc/msmtprc<br>
-                                sudo touch /var/log/msmtp.log<br>
-                                sudo chown kali:kali /var/log/msmtp.log
-                            </div>
-                        </div>
-                        
-                        <h4>1.3 Редактирование скрипта мониторинга</h4>
-                        <div style="margin-left: 1.5rem;">
-                            <p><strong>1.3.1</strong> Ввести команду</p>
-                            <div style="background: var(--bg-secondary); padding: 0.75rem; border-radius: 6px; margin: 0.5rem 0; font-family: monospace;">
-                                sudo nano /usr/local/bin/monitor-system-load.sh
-                            </div>
-                            <p>Найти строку и указать свой email</p>
-                            <div style="background: var(--bg-secondary); padding: 0.75rem; border-radius: 6px; margin: 0.5rem 0; font-family: monospace;">
-                                echo -e "$ALERT_MESSAGE" | mail -s "🚨 ВНИМАНИЕ: Перегрузка системы на $(hostname)" ваш_email@mail.ru
-                            </div>
-                            <p>Сохранить и закрыть файл.</p>
-                            
-                            <p><strong>1.3.2</strong> Ввести команду</p>
-                            <div style="background: var(--bg-secondary); padding: 0.75rem; border-radius: 6px; margin: 0.5rem 0; font-family: monospace;">
-                                sudo nano /usr/local/bin/advanced-system-monitor.sh
-                            </div>
-                            <p>Найти строку и указать свой email</p>
-                            <div style="background: var(--bg-secondary); padding: 0.75rem; border-radius: 6px; margin: 0.5rem 0; font-family: monospace;">
-                                ALERT_EMAIL=ваш_email@mail.ru
-                            </div>
-                            <p>Сохранить и закрыть файл.</p>
-                        </div>
-                        
-                        <div style="margin-top: 2rem; padding: 1rem; background: rgba(59, 130, 246, 0.1); border-radius: 8px; border: 1px solid rgba(59, 130, 246, 0.3);">
-                            <p><strong>После изучения материалов нажмите "Завершить подготовительный этап".</strong></p>
-                            <p><em>Примечание: Подготовительный этап оценивается без баллов.</em></p>
-                        </div>
-                    '''
-                }])
-            },
-            {
-                'title': 'Практическая работа №1',
-                'description': 'Обработка инцидента, связанного с несоответствующим использованием ресурсов системы',
-                'lab_number': 1,
-                'difficulty': 'medium',
-                'order': 2,
-                'max_score': 30,  # Максимум 30 баллов
-                'content': json.dumps([
-                    {
-                        'type': 'question',
-                        'question': 'Какой пароль используется для входа в учетную запись kali?',
-                        'answers': ['190902', '123456', 'password', 'kali123'],
-                        'correct_answer': '190902',
-                        'task_number': 1
-                    },
-                    {
-                        'type': 'question', 
-                        'question': 'Какая команда используется для редактирования файла конфигурации logcheck?',
-                        'answers': [
-                            'sudo nano /etc/logcheck/logcheck.conf',
-                            'sudo edit /etc/logcheck.conf', 
-                            'vim /etc/logcheck.conf',
-                            'gedit /etc/logcheck/logcheck.conf'
-                        ],
-                        'correct_answer': 'sudo nano /etc/logcheck/logcheck.conf',
-                        'task_number': 2
-                    },
-                    {
-                        'type': 'question',
-                        'question': 'Какое ПО вызвало перегрузку системы?',
-                        'answers': ['Minetest', 'nsnake', 'Minecraft', 'Apache'],
-                        'correct_answer': 'Minetest',
-                        'task_number': 3
-                    }
-                ])
-            },
-            {
-                'title': 'Практическая работа №2', 
-                'description': 'Обработка инцидента, связанного с несанкционированным доступом к системе',
-                'lab_number': 2,
-                'difficulty': 'medium',
-                'order': 3,
-                'max_score': 30,  # Максимум 30 баллов
-                'content': json.dumps([
-                    {
-                        'type': 'question',
-                        'question': 'Сколько неудачных попыток входа было обнаружено в учетную запись user1?',
-                        'answers': ['5', '7', '10', '3'],
-                        'correct_answer': '7',
-                        'task_number': 1
-                    },
-                    {
-                        'type': 'question',
-                        'question': 'В какой файл нужно добавить ограничение количества попыток аутентификации?',
-                        'answers': [
-                            '/etc/pam.d/lightdm',
-                            '/etc/ssh/sshd_config', 
-                            '/etc/login.defs',
-                            '/etc/security/limits.conf'
-                        ],
-                        'correct_answer': '/etc/pam.d/lightdm',
-                        'task_number': 2
-                    },
-                    {
-                        'type': 'input',
-                        'question': 'Какое значение параметра deny нужно установить для ограничения в 3 попытки?',
-                        'correct_answer': '3',
-                        'task_number': 3
-                    }
-                ])
-            }
-        ]
-        
-        for lab_data in labs_data:
-            lab = Lab(**lab_data)
+        db.session.commit()
+        print("Начальные данные созданы!")
+
+# Столбцы, добавленные после первого выпуска: create_all не меняет существующие таблицы
+SCHEMA_UPGRADES = [
+    ('student_progress', 'version', 'version INTEGER NOT NULL DEFAULT 1'),
+    ('student_progress', 'rules_version', 'rules_version INTEGER NOT NULL DEFAULT 1'),
+    ('user', 'shard', 'shard VARCHAR(50)'),
+    ('student_progress', 'active_since', 'active_since DATETIME'),
+    ('student_progress', 'active_tabs', 'active_tabs TEXT'),
+    ('lab', 'package', 'package VARCHAR(100)'),
+    ('job', 'heartbeat_at', 'heartbeat_at DATETIME'),
+]
+
+def upgrade_schema():
+    inspector = db.inspect(db.engine)
+    for table, column, ddl in SCHEMA_UPGRADES:
+        columns = {c['name'] for c in inspector.get_columns(table)}
+        if column not in columns:
+            db.session.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {ddl}'))
+    db.session.commit()
+
+def init_db():
+    """Создание схемы и начальных данных (однократно, до запуска воркеров)"""
+    db.create_all()
+    shard_router.create_all(db.metadata)
+    upgrade_schema()
+    create_initial_data()
+    sync_lab_packages()
+    check_lab_contents()
+
+def sync_lab_packages():
+    """Строки Lab для пакетов работ: новые пакеты добавляются, метаданные обновляются.
+
+    Работа из базы без пакета связывается с пакетом того же номера. Столбец
+    content хранит копию контента пакета на случай, если каталог пакета пропадет.
+    """
+    created = 0
+    for package in lab_packages.packages():
+        # Сборка контента проверяет пакет и перечитывает метаданные
+        content = package.content()
+        lab = Lab.query.filter_by(package=package.slug).first()
+        if lab is None:
+            lab = Lab.query.filter_by(package=None, lab_number=package.meta['lab_number']).order_by(Lab.order).first()
+        if lab is None:
+            lab = Lab()
             db.session.add(lab)
+            created += 1
         
+        lab.package = package.slug
+        lab.content = content
+        for field in LAB_FIELDS:
+            if field in package.meta:
+                setattr(lab, field, package.meta[field])
+    
+    db.session.commit()
+    catalog_cache.invalidate()
+    cache_store.bump(LEADERBOARD_GENERATION)
+    if created:
+        print(f"Создано {created} практических работ")
+
+class ProgressConflict(Exception):
+    """Прогресс не удалось сохранить из-за конкурентных изменений"""
+
+progress_update_stats = {'commits': 0, 'conflicts': 0, 'failures': 0}
+progress_update_stats_lock = threading.Lock()
+
+def _count_progress_update(key):
+    with progress_update_stats_lock:
+        progress_update_stats[key] += 1
+
+def commit_with_retry(operation):
+    """Оптимистичная запись прогресса без блокировок.
+
+    operation() заново читает StudentProgress, вносит изменения и возвращает ответ.
+    Если строку за это время изменил другой запрос (не совпала версия),
+    транзакция откатывается и operation() повторяется.
+    """
+    retries = app.config['PROGRESS_UPDATE_RETRIES']
+    for attempt in range(retries):
+        result = operation()
+        try:
+            db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            _count_progress_update('conflicts')
+            # Небольшая случайная пауза разводит конкурирующие запросы
+            time.sleep(random.uniform(0, 0.005 * (attempt + 1)))
+            continue
+        _count_progress_update('commits')
+        return result
+    
+    _count_progress_update('failures')
+    raise ProgressConflict()
+
+def log_event(kind, student_id, lab_id=None, **payload):
+    """Событие журнала активности в текущей транзакции (и в шарде студента)"""
+    db.session.add(ActivityEvent(
+        kind=kind,
+        student_id=student_id,
+        lab_id=lab_id,
+        payload=json.dumps(payload) if payload else None
+    ))
+
+def commit_shard_first(shard):
+    """Фиксация удаленных данных студентов в шарде раньше их строк в основной базе.
+
+    Шард и основная база - разные транзакции: при сбое между коммитами остаются
+    студенты без прогресса (удаление можно повторить), а не прогресс без студентов.
+    Без шарда все изменения остаются в одной транзакции основной базы.
+    """
+    if shard is not None:
         db.session.commit()
-        print(f"Создано {len(labs_data)} практических работ")
-        print("Начальные данные созданы!")
+
+def check_lab_contents():
+    """Разбор заданий всех работ: ошибка в поле check видна при загрузке, а не при первом ответе"""
+    problems = []
+    for lab in Lab.query.order_by(Lab.order):
+        try:
+            get_compiled_lab(lab)
+        except ValueError as e:
+            problems.append(f"{lab.title} (id {lab.id}): {e}")
+    if problems:
+        raise CheckSpecError("Ошибки в заданиях работ:\n" + "\n".join(problems))
+
+def conflict_response():
+    return jsonify({'success': False, 'error': 'Данные изменены другим запросом, повторите попытку'}), 409
+
+@app.errorhandler(CheckSpecError)
+def check_spec_error_response(e):
+    # Контент работы изменен в обход labs-sync и не разбирается: понятная ошибка вместо 500
+    return jsonify({'success': False, 'error': f'Задания работы настроены с ошибкой: {e}'}), 503
+
+def reset_worker_state():
+    """Сброс состояния, унаследованного от мастер-процесса после fork.
+
+    Соединения с БД и любые кэши/буферы уровня процесса должны создаваться
+    заново в каждом воркере, иначе процессы будут делить один дескриптор.
+    Здесь же запускаются фоновые потоки воркера.
+    """
+    with app.app_context():
+        db.engine.dispose()
+    read_engine.dispose()
+    shard_router.dispose()
+    rate_limiter.reset()
+    snapshot_cache.clear()
+    catalog_cache.clear()
+    leaderboard.reset()
+    profiler.reset()
+    job_runner.reset()
+    job_runner.start()
+    projection_runner.reset()
+    projection_runner.start()
+
+@app.before_request
+def route_teacher_reads():
+    # Аналитика преподавателя читает через отдельный движок только для чтения
+    if request.method == 'GET' and request.path.startswith('/api/teacher/'):
+        use_read_engine()
+
+@app.before_request
+def route_student_shard():
+    # Прогресс и попытки студента читаются и пишутся в его шарде
+    if session.get('user_role') == 'student':
+        use_shard(session.get('user_shard'))
+
+@app.before_request
+def start_profiled_request():
+    profiler.request_started(request.method, request.path, request.endpoint)
+
+@app.after_request
+def remember_response_status(response):
+    # Код ответа для профилировщика: teardown_request получает только исключение
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_profiled_request(exc):
+    # teardown выполняется и тогда, когда обработчик упал: запрос не остается в профиле
+    profiler.request_finished(500 if exc is not None else g.get('response_status', 500))
 
 @app.after_request
 def after_request(response):
@@ -300,6 +554,8 @@ def after_request(response):
 
 # API АВТОРИЗАЦИИ
 @app.route('/api/login', methods=['POST'])
+@rate_limiter.limit('login_ip')
+@rate_limiter.limit('login')
 def login():
     data = request.get_json()
     username = data.get('username', '').strip()
@@ -313,6 +569,7 @@ def login():
     if user and user.check_password(password):
         session['user_id'] = user.id
         session['user_role'] = user.role
+        session['user_shard'] = user.shard
         return jsonify({
             'success': True,
             'message': 'Вход выполнен успешно',
@@ -337,10 +594,13 @@ def check_auth():
 # API ПРАКТИЧЕСКИХ РАБОТ
 @app.route('/api/labs')
 def get_labs():
-    labs = Lab.query.filter_by(is_active=True).order_by(Lab.order).all()
+    def build_catalog():
+        labs = Lab.query.filter_by(is_active=True).order_by(Lab.order).all()
+        return [lab.to_dict() for lab in labs]
+    
     return jsonify({
         'success': True,
-        'labs': [lab.to_dict() for lab in labs]
+        'labs': catalog_cache.get_or_compute('labs', build_catalog)
     })
 
 @app.route('/api/labs/<int:lab_id>')
@@ -460,6 +720,7 @@ def get_lab_progress(lab_id):
     })
 
 @app.route('/api/student/lab/<int:lab_id>/start', methods=['POST'])
+@rate_limiter.limit('write')
 def start_lab(lab_id):
     if 'user_id' not in session or session.get('user_role') != 'student':
         return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
@@ -480,24 +741,30 @@ def start_lab(lab_id):
             if not prev_progress or prev_progress.status != 'completed':
                 return jsonify({'success': False, 'error': 'Сначала выполните предыдущую практическую работу'}), 403
     
-    progress = StudentProgress.query.filter_by(
-        student_id=user.id,
-        lab_id=lab_id
-    ).first()
-    
-    if not progress:
-        progress = StudentProgress(
+    def mark_started():
+        progress = StudentProgress.query.filter_by(
             student_id=user.id,
-            lab_id=lab_id,
-            status='in_progress',
-            start_time=datetime.utcnow()
-        )
-        db.session.add(progress)
-    elif progress.status == 'not_started':
-        progress.status = 'in_progress'
-        progress.start_time = datetime.utcnow()
+            lab_id=lab_id
+        ).first()
+        
+        if not progress:
+            progress = StudentProgress(
+                student_id=user.id,
+                lab_id=lab_id,
+                status='in_progress',
+                start_time=datetime.utcnow()
+            )
+            db.session.add(progress)
+            log_event(LAB_STARTED, user.id, lab_id)
+        elif progress.status == 'not_started':
+            progress.status = 'in_progress'
+            progress.start_time = datetime.utcnow()
+            log_event(LAB_STARTED, user.id, lab_id)
     
-    db.session.commit()
+    try:
+        commit_with_retry(mark_started)
+    except ProgressConflict:
+        return conflict_response()
     
     return jsonify({
         'success': True,
@@ -505,6 +772,7 @@ def start_lab(lab_id):
     })
 
 @app.route('/api/student/lab/<int:lab_id>/check-answer', methods=['POST'])
+@rate_limiter.limit('answer')
 def check_answer_endpoint(lab_id):
     if 'user_id' not in session or session.get('user_role') != 'student':
         return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
@@ -522,136 +790,201 @@ def check_answer_endpoint(lab_id):
     if not lab:
         return jsonify({'success': False, 'error': 'Практическая работа не найдена'}), 404
     
-    progress = StudentProgress.query.filter_by(
-        student_id=user.id,
-        lab_id=lab_id
-    ).first()
-    
-    if not progress or progress.status != 'in_progress':
-        return jsonify({'success': False, 'error': 'Практическая работа не начата'}), 403
-    
-    # Получаем контент лабораторной и задачи
-    tasks_content = json.loads(lab.content) if lab.content else []
+    # Контент работы разбирается и проверки ответов компилируются один раз на версию
+    compiled_lab = get_compiled_lab(lab)
     
     # Находим текущую задачу
-    task = next((t for t in tasks_content if t.get('task_number') == task_number), None)
+    task = compiled_lab.tasks_by_number.get(task_number)
     
-    if not task:
-        return jsonify({'success': False, 'error': 'Задание не найдено'}), 404
-    
-    # Проверяем, можно ли выполнять эту задачу
-    completed_tasks = json.loads(progress.completed_tasks) if progress.completed_tasks else []
-    
-    # Проверяем, выполнены ли предыдущие задачи
-    if task_number > 1:
-        # Находим предыдущую задачу
-        prev_task = next((t for t in completed_tasks if t['task_number'] == task_number - 1), None)
+    def record_answer():
+        # Прогресс читается заново при каждой попытке записи
+        progress = StudentProgress.query.filter_by(
+            student_id=user.id,
+            lab_id=lab_id
+        ).first()
+        
+        if not progress or progress.status != 'in_progress':
+            return jsonify({'success': False, 'error': 'Практическая работа не начата'}), 403
+        
+        if not task:
+            return jsonify({'success': False, 'error': 'Задание не найдено'}), 404
+        
+        # Проверяем, можно ли выполнять эту задачу
+        completed_tasks = json.loads(progress.completed_tasks) if progress.completed_tasks else []
         
         # Если предыдущая задача не выполнена, запрещаем выполнение текущей
-        if not prev_task or not prev_task.get('completed', False):
+        if not previous_task_completed(completed_tasks, task_number):
             return jsonify({
                 'success': False, 
                 'error': 'Сначала выполните предыдущее задание'
             })  # Убираем status=403, чтобы фронтенд мог прочитать сообщение
-    
-    is_correct = False
-    if task['type'] == 'question':
-        is_correct = answer == task['correct_answer']
-    elif task['type'] == 'input':
-        is_correct = answer.strip().lower() == task['correct_answer'].strip().lower()
-    
-    attempt = TaskAttempt(
-        student_id=user.id,
-        lab_id=lab_id,
-        task_number=task_number,
-        answer=answer,
-        is_correct=is_correct
-    )
-    db.session.add(attempt)
-    
-    task_data = next((t for t in completed_tasks if t['task_number'] == task_number), None)
-    
-    if not task_data:
-        # Первая попытка
-        score = 10 if is_correct else 9
-        task_data = {
-            'task_number': task_number,
-            'completed': is_correct,
-            'attempts': 1,
-            'last_answer': answer,
-            'score': score,
-            'unlocked_next': is_correct  # Разблокировать следующее задание если правильно
-        }
-        completed_tasks.append(task_data)
-    else:
-        # Уже есть попытки
-        task_data['attempts'] += 1
-        
-        if is_correct and not task_data['completed']:
-            # Впервые ответил правильно
-            task_data['completed'] = True
-            # -1 балл за каждую лишнюю попытку (начиная со второй)
-            penalty = min(task_data['attempts'] - 1, 9)  # Максимум 9 баллов можно снять
-            task_data['score'] = max(1, 10 - penalty)
-            task_data['unlocked_next'] = True  # Разблокировать следующее задание
-        elif not is_correct and not task_data['completed']:
-            # Еще не ответил правильно, уменьшаем баллы
-            if task_data['attempts'] <= 10:
-                task_data['score'] = max(0, 10 - task_data['attempts'] + 1)
-            else:
-                task_data['score'] = 0
         
-        task_data['last_answer'] = answer
-    
-    progress.completed_tasks = json.dumps(completed_tasks)
-    db.session.commit()
+        is_correct = compiled_lab.check(task_number, answer)
+        
+        attempt = TaskAttempt(
+            student_id=user.id,
+            lab_id=lab_id,
+            task_number=task_number,
+            answer=answer,
+            is_correct=is_correct
+        )
+        db.session.add(attempt)
+        log_event(ANSWER_SUBMITTED, user.id, lab_id, task_number=task_number, is_correct=is_correct)
+        
+        task_data = apply_task_answer(completed_tasks, task_number, answer, is_correct)
+        progress.completed_tasks = json.dumps(completed_tasks)
+        
+        return jsonify({
+            'success': True,
+            'is_correct': is_correct,
+            'task_data': task_data
+        })
     
-    return jsonify({
-        'success': True,
-        'is_correct': is_correct,
-        'task_data': task_data
-    })
+    try:
+        return commit_with_retry(record_answer)
+    except ProgressConflict:
+        return conflict_response()
 
-@app.route('/api/student/lab/<int:lab_id>/complete', methods=['POST'])
-def complete_lab(lab_id):
+@app.route('/api/student/lab/<int:lab_id>/check-answers', methods=['POST'])
+@rate_limiter.limit('answer')
+def check_answers_batch(lab_id):
+    """Пакетная проверка ответов: задания применяются по порядку в одной транзакции"""
     if 'user_id' not in session or session.get('user_role') != 'student':
         return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
     
-    data = request.get_json()
-    total_time = data.get('total_time', 0)
+    data = request.get_json() or {}
+    answers = data.get('answers')
     
-    user = User.query.get(session['user_id'])
+    if not isinstance(answers, list) or not answers:
+        return jsonify({'success': False, 'error': 'Не переданы ответы'}), 400
     
-    progress = StudentProgress.query.filter_by(
-        student_id=user.id,
-        lab_id=lab_id
-    ).first()
+    if len(answers) > app.config['MAX_BATCH_ANSWERS']:
+        return jsonify({'success': False, 'error': 'Слишком много ответов в одном запросе'}), 400
     
-    if not progress or progress.status != 'in_progress':
-        return jsonify({'success': False, 'error': 'Практическая работа не начата'}), 403
+    for item in answers:
+        if not isinstance(item, dict) or not item.get('task_number'):
+            return jsonify({'success': False, 'error': 'Не указан номер задания'}), 400
     
+    user = User.query.get(session['user_id'])
     lab = Lab.query.get(lab_id)
     
-    completed_tasks = json.loads(progress.completed_tasks) if progress.completed_tasks else []
+    if not lab:
+        return jsonify({'success': False, 'error': 'Практическая работа не найдена'}), 404
     
-    # Считаем общий балл
-    total_score = 0
-    for task in completed_tasks:
-        if task.get('completed'):
-            total_score += task.get('score', 0)
+    compiled_lab = get_compiled_lab(lab)
     
-    # Для подготовительной работы баллы не учитываем
-    if lab.lab_number == 0:
-        total_score = 0
+    def record_answers():
+        progress = StudentProgress.query.filter_by(
+            student_id=user.id,
+            lab_id=lab_id
+        ).first()
+        
+        if not progress or progress.status != 'in_progress':
+            return jsonify({'success': False, 'error': 'Практическая работа не начата'}), 403
+        
+        completed_tasks = json.loads(progress.completed_tasks) if progress.completed_tasks else []
+        results = []
+        attempts = []
+        
+        # Каждый ответ видит изменения предыдущих ответов из этого же пакета
+        for item in answers:
+            task_number = item['task_number']
+            answer = item.get('answer', '')
+            task = compiled_lab.tasks_by_number.get(task_number)
+            
+            if not task:
+                results.append({'task_number': task_number, 'success': False,
+                                'error': 'Задание не найдено'})
+                continue
+            
+            if not previous_task_completed(completed_tasks, task_number):
+                results.append({'task_number': task_number, 'success': False,
+                                'error': 'Сначала выполните предыдущее задание'})
+                continue
+            
+            is_correct = compiled_lab.check(task_number, answer)
+            attempts.append(TaskAttempt(
+                student_id=user.id,
+                lab_id=lab_id,
+                task_number=task_number,
+                answer=answer,
+                is_correct=is_correct
+            ))
+            log_event(ANSWER_SUBMITTED, user.id, lab_id, task_number=task_number, is_correct=is_correct)
+            
+            task_data = apply_task_answer(completed_tasks, task_number, answer, is_correct)
+            results.append({
+                'task_number': task_number,
+                'success': True,
+                'is_correct': is_correct,
+                'task_data': dict(task_data)
+            })
+        
+        db.session.add_all(attempts)
+        if attempts:
+            progress.completed_tasks = json.dumps(completed_tasks)
+        
+        return jsonify({
+            'success': True,
+            'results': results
+        })
     
-    progress.status = 'completed'
-    progress.score = total_score
-    progress.end_time = datetime.utcnow()
+    try:
+        return commit_with_retry(record_answers)
+    except ProgressConflict:
+        return conflict_response()
+
+@app.route('/api/student/lab/<int:lab_id>/complete', methods=['POST'])
+@rate_limiter.limit('write')
+def complete_lab(lab_id):
+    if 'user_id' not in session or session.get('user_role') != 'student':
+        return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
     
-    if progress.start_time:
-        progress.total_time = int((progress.end_time - progress.start_time).total_seconds())
+    user = User.query.get(session['user_id'])
+    lab = Lab.query.get(lab_id)
     
-    db.session.commit()
+    def finish_lab():
+        progress = StudentProgress.query.filter_by(
+            student_id=user.id,
+            lab_id=lab_id
+        ).first()
+        
+        if not progress or progress.status != 'in_progress':
+            return None
+        
+        completed_tasks = json.loads(progress.completed_tasks) if progress.completed_tasks else []
+        
+        # Считаем общий балл
+        total_score = total_task_score(completed_tasks)
+        
+        # Для подготовительной работы баллы не учитываем
+        if lab.lab_number == 0:
+            total_score = 0
+        
+        progress.status = 'completed'
+        progress.score = total_score
+        progress.rules_version = SCORING_RULES_VERSION
+        progress.end_time = datetime.utcnow()
+        # Итоговое время - сумма интервалов активности, а не end_time - start_time
+        progress.close_interval(progress.end_time)
+        
+        log_event(LAB_COMPLETED, user.id, lab_id, score=total_score, total_time=progress.total_time)
+        return progress
+    
+    try:
+        progress = commit_with_retry(finish_lab)
+    except ProgressConflict:
+        return conflict_response()
+    
+    if progress:
+        snapshot_cache.invalidate()
+        if lab_id in leaderboard.lab_ids:
+            leaderboard.record(user.id, user.group, lab_id, progress.score, progress.total_time)
+    
+    if not progress:
+        return jsonify({'success': False, 'error': 'Практическая работа не начата'}), 403
+    
+    total_score = progress.score
     
     def convert_to_msk(utc_dt):
         if not utc_dt:
@@ -661,13 +994,8 @@ def complete_lab(lab_id):
     start_time_msk = convert_to_msk(progress.start_time)
     end_time_msk = convert_to_msk(progress.end_time)
     
-    # Устанавливаем максимальный балл: 30 для ЛР1 и ЛР2, 0 для подготовительной
-    if lab.lab_number in [1, 2]:
-        max_score = 30
-    elif lab.lab_number == 0:
-        max_score = 0
-    else:
-        max_score = lab.max_score if lab else 100
+    # Максимальный балл считается по текущему набору заданий, 0 для подготовительной
+    max_score = lab_max_score(lab.lab_number, get_compiled_lab(lab).tasks)
     
     return jsonify({
         'success': True,
@@ -679,27 +1007,299 @@ def complete_lab(lab_id):
         'total_time': progress.total_time
     })
 
-@app.route('/api/student/lab/<int:lab_id>/update-time', methods=['POST'])
-def update_lab_time(lab_id):
+WORKSPACE_STATES = ('open', 'visible', 'hidden', 'close')
+WORKSPACE_CLOSING_STATES = ('hidden', 'close')
+
+@app.route('/api/student/lab/<int:lab_id>/workspace', methods=['POST'])
+def workspace_event(lab_id):
+    """Смена состояния вкладки рабочей области студента.
+
+    Интервал активности открывается, когда становится видна первая вкладка
+    (open/visible), и закрывается, когда скрыта или закрыта последняя
+    (hidden/close); длительность добавляется к total_time. Время считается по
+    часам сервера, клиент присылает только смену состояния и id вкладки.
+    Вкладка, закрытая без события (сбой браузера), держит интервал открытым,
+    но не дольше WORKSPACE_MAX_INTERVAL.
+    """
     if 'user_id' not in session or session.get('user_role') != 'student':
         return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
     
-    data = request.get_json()
-    elapsed_time = data.get('elapsed_time', 0)
+    data = request.get_json(silent=True) or {}
+    state = data.get('state')
+    if state not in WORKSPACE_STATES:
+        return jsonify({'success': False, 'error': 'Неизвестное состояние рабочей области'}), 400
+    tab = str(data.get('tab') or '')[:64]
+    
+    # Потерянное закрывающее событие оставило бы интервал открытым, поэтому лимит - только на открытие
+    if state not in WORKSPACE_CLOSING_STATES:
+        wait = rate_limiter.check('workspace')
+        if wait:
+            return rate_limiter.limited_response(wait)
     
     user = User.query.get(session['user_id'])
     
-    progress = StudentProgress.query.filter_by(
-        student_id=user.id,
-        lab_id=lab_id
-    ).first()
+    def change_state():
+        progress = StudentProgress.query.filter_by(
+            student_id=user.id,
+            lab_id=lab_id
+        ).first()
+        
+        if not progress or progress.status == 'not_started':
+            return None
+        
+        now = datetime.utcnow()
+        # Пишем только смену состояния: повторное open видимой вкладки ничего не меняет
+        if progress.status == 'in_progress':
+            tabs = set(json.loads(progress.active_tabs)) if progress.active_tabs else set()
+            if state in WORKSPACE_CLOSING_STATES:
+                if tab in tabs:
+                    tabs.discard(tab)
+                    progress.active_tabs = json.dumps(sorted(tabs)) if tabs else None
+                if not tabs and progress.active_since:
+                    progress.close_interval(now)
+                    log_event(WORKSPACE_CHANGED, user.id, lab_id, state=state, active_time=progress.total_time)
+            else:
+                if tab not in tabs:
+                    tabs.add(tab)
+                    progress.active_tabs = json.dumps(sorted(tabs))
+                if not progress.active_since:
+                    progress.active_since = now
+                    log_event(WORKSPACE_CHANGED, user.id, lab_id, state=state, active_time=progress.total_time or 0)
+        
+        return {
+            'success': True,
+            'status': progress.status,
+            'active': progress.active_since is not None,
+            'total_time': (progress.total_time or 0) + progress.open_interval(now)
+        }
     
-    if progress:
-        progress.total_time = elapsed_time
-        db.session.commit()
+    try:
+        result = commit_with_retry(change_state)
+    except ProgressConflict:
+        return conflict_response()
+    
+    if result is None:
+        return jsonify({'success': False, 'error': 'Практическая работа не начата'}), 403
+    return jsonify(result)
+
+@app.route('/api/student/lab/<int:lab_id>/update-time', methods=['POST'])
+@rate_limiter.limit('time')
+def update_lab_time(lab_id):
+    """Устаревший эндпоинт периодического сохранения времени.
+
+    Время теперь считается по событиям /workspace; ответ оставлен для страниц,
+    открытых до обновления, присланное клиентом значение не сохраняется.
+    """
+    if 'user_id' not in session or session.get('user_role') != 'student':
+        return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
     
     return jsonify({'success': True})
 
+# РЕЙТИНГ
+# Поколение в общем кэше: его смена (синхронизация работ) заставляет каждый воркер
+# пересобрать рейтинг из базы. Перевод студента в другую группу приходит событием журнала
+LEADERBOARD_GENERATION = 'leaderboard'
+LEADERBOARD_EVENTS = (LAB_COMPLETED, SCORE_RECALCULATED, STUDENT_REMOVED, STUDENT_GROUP_CHANGED)
+
+def leaderboard_lab_ids():
+    return db.session.execute(
+        select(Lab.id).where(Lab.lab_number.in_([1, 2]), Lab.is_active == True)
+    ).scalars().all()
+
+def rebuild_leaderboard(generation):
+    """Рейтинг заново из завершенных работ во всех шардах"""
+    lab_ids = leaderboard_lab_ids()
+    # Позиции журнала читаются раньше прогресса: события, записанные между этими
+    # запросами, применятся повторно, а результат в них - абсолютный
+    positions = dict(zip(shard_router.names(), shard_router.fan_out(
+        lambda conn: conn.execute(select(db.func.max(ActivityEvent.id))).scalar() or 0
+    )))
+    query = (
+        select(StudentProgress.student_id, StudentProgress.lab_id, StudentProgress.score,
+               StudentProgress.total_time)
+        .where(StudentProgress.status == 'completed', StudentProgress.lab_id.in_(lab_ids))
+    )
+    rows = [row for shard_rows in shard_router.fan_out(lambda conn: conn.execute(query).all())
+            for row in shard_rows]
+    groups = dict(db.session.execute(select(User.id, User.group).where(User.role == 'student')).all())
+    
+    leaderboard.rebuild(
+        ((row.student_id, groups[row.student_id], row.lab_id, row.score, row.total_time)
+         for row in rows if row.student_id in groups),
+        lab_ids, generation, positions
+    )
+
+def apply_leaderboard_events():
+    """Результаты, записанные другими воркерами: новые события журнала каждого шарда"""
+    previous = g.get(SHARD_FLAG)
+    try:
+        for shard in shard_router.names():
+            use_shard(shard)
+            events = db.session.execute(
+                select(ActivityEvent.id, ActivityEvent.student_id, ActivityEvent.lab_id,
+                       ActivityEvent.kind, ActivityEvent.payload)
+                .where(ActivityEvent.id > leaderboard.positions.get(shard, 0),
+                       ActivityEvent.kind.in_(LEADERBOARD_EVENTS))
+                .order_by(ActivityEvent.id)
+            ).all()
+            if not events:
+                continue
+            
+            unknown = {e.student_id for e in events if e.kind == LAB_COMPLETED and not leaderboard.knows(e.student_id)}
+            groups = {}
+            if unknown:
+                groups = dict(db.session.execute(
+                    select(User.id, User.group).where(User.id.in_(unknown), User.role == 'student')
+                ).all())
+            
+            for event in events:
+                if event.kind == STUDENT_REMOVED:
+                    leaderboard.remove_student(event.student_id)
+                    continue
+                if event.kind == STUDENT_GROUP_CHANGED:
+                    leaderboard.move_student(event.student_id, json.loads(event.payload)['group'])
+                    continue
+                if event.lab_id not in leaderboard.lab_ids:
+                    continue
+                
+                payload = json.loads(event.payload) if event.payload else {}
+                if leaderboard.knows(event.student_id):
+                    group = leaderboard.group_of(event.student_id)
+                elif event.student_id in groups:
+                    group = groups[event.student_id]
+                else:
+                    # Студент уже удален или пересчет для работы, которой нет в рейтинге
+                    continue
+                
+                if event.kind == LAB_COMPLETED:
+                    leaderboard.record(event.student_id, group, event.lab_id,
+                                       payload.get('score', 0), payload.get('total_time', 0))
+                elif leaderboard.position(event.lab_id, event.student_id) is not None:
+                    leaderboard.record(event.student_id, group, event.lab_id, payload.get('score', 0))
+            leaderboard.positions[shard] = events[-1].id
+    finally:
+        use_shard(previous)
+
+def sync_leaderboard():
+    """Доводит рейтинг процесса до состояния базы перед чтением.
+
+    Первое обращение и смена поколения - полная пересборка, иначе не чаще
+    раза в LEADERBOARD_SYNC_INTERVAL применяются новые события журнала.
+    Результаты, завершенные в этом воркере, попадают в рейтинг сразу.
+    """
+    generation = cache_store.generation(LEADERBOARD_GENERATION)
+    with leaderboard.lock:
+        if leaderboard.generation != generation:
+            rebuild_leaderboard(generation)
+        elif time.monotonic() - leaderboard.synced_at >= app.config['LEADERBOARD_SYNC_INTERVAL']:
+            apply_leaderboard_events()
+        else:
+            return
+        leaderboard.synced_at = time.monotonic()
+
+def leaderboard_lab_arg():
+    """Таблица из параметра lab: total (сумма по ЛР1 и ЛР2) или id работы"""
+    value = request.args.get('lab', TOTAL)
+    if value == TOTAL:
+        return TOTAL
+    try:
+        lab_id = int(value)
+    except ValueError:
+        return None
+    return lab_id if lab_id in leaderboard.lab_ids else None
+
+def leaderboard_entries(entries):
+    """Имена и группы для строк рейтинга (одним запросом)"""
+    ids = [entry['student_id'] for entry in entries]
+    users = {row.id: row for row in db.session.execute(
+        select(User.id, User.name, User.group).where(User.id.in_(ids))
+    )} if ids else {}
+    for entry in entries:
+        user = users.get(entry['student_id'])
+        entry['name'] = user.name if user else None
+        entry['group'] = user.group if user else None
+    return entries
+
+def leaderboard_student_allowed(student_id):
+    return session.get('user_role') == 'teacher' or session.get('user_id') == student_id
+
+@app.route('/api/leaderboard')
+def get_leaderboard():
+    """Первые limit мест: по всем студентам или по группе (group)"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
+    
+    sync_leaderboard()
+    lab_id = leaderboard_lab_arg()
+    if lab_id is None:
+        return jsonify({'success': False, 'error': 'Работа не участвует в рейтинге'}), 400
+    
+    group = request.args.get('group') or None
+    if group is not None and session.get('user_role') != 'teacher':
+        # Студенту доступна таблица только своей группы
+        if group != User.query.get(session['user_id']).group:
+            return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
+    
+    limit = min(request.args.get('limit', 10, type=int), app.config['LEADERBOARD_MAX_LIMIT'])
+    return jsonify({
+        'success': True,
+        'lab': lab_id,
+        'group': group,
+        'size': leaderboard.size(lab_id, group),
+        'leaders': leaderboard_entries(leaderboard.top(lab_id, group, max(limit, 0)))
+    })
+
+@app.route('/api/leaderboard/students/<int:student_id>')
+def get_leaderboard_position(student_id):
+    """Место и процентиль студента среди всех и в своей группе"""
+    if 'user_id' not in session or not leaderboard_student_allowed(student_id):
+        return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
+    
+    sync_leaderboard()
+    lab_id = leaderboard_lab_arg()
+    if lab_id is None:
+        return jsonify({'success': False, 'error': 'Работа не участвует в рейтинге'}), 400
+    
+    group = leaderboard.group_of(student_id)
+    return jsonify({
+        'success': True,
+        'lab': lab_id,
+        'student_id': student_id,
+        'group': group,
+        'overall': leaderboard.position(lab_id, student_id),
+        'in_group': leaderboard.position(lab_id, student_id, group) if group is not None else None
+    })
+
+@app.route('/api/leaderboard/students/<int:student_id>/around')
+def get_leaderboard_around(student_id):
+    """Соседи студента по рейтингу: radius мест выше и ниже"""
+    if 'user_id' not in session or not leaderboard_student_allowed(student_id):
+        return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
+    
+    sync_leaderboard()
+    lab_id = leaderboard_lab_arg()
+    if lab_id is None:
+        return jsonify({'success': False, 'error': 'Работа не участвует в рейтинге'}), 400
+    
+    radius = min(max(request.args.get('radius', 3, type=int), 0), app.config['LEADERBOARD_MAX_LIMIT'] // 2)
+    in_group = request.args.get('scope') == 'group'
+    group = leaderboard.group_of(student_id) if in_group else None
+    neighbours = None
+    # У студента без группы есть только место среди всех
+    if not in_group or group is not None:
+        neighbours = leaderboard.around(lab_id, student_id, group, radius)
+    if neighbours is None:
+        return jsonify({'success': False, 'error': 'Студента нет в рейтинге'}), 404
+    
+    return jsonify({
+        'success': True,
+        'lab': lab_id,
+        'student_id': student_id,
+        'group': group,
+        'size': leaderboard.size(lab_id, group),
+        'neighbours': leaderboard_entries(neighbours)
+    })
+
 # API ДЛЯ ПРЕПОДАВАТЕЛЕЙ
 @app.route('/api/teacher/dashboard')
 def teacher_dashboard():
@@ -708,21 +1308,24 @@ def teacher_dashboard():
     
     user = User.query.get(session['user_id'])
     
-    # Считаем только ЛР1 и ЛР2, исключаем подготовительную (lab_number=0)
-    total_labs = Lab.query.filter(
-        Lab.is_active == True,
-        Lab.lab_number.in_([1, 2])  # Только ЛР1 и ЛР2
-    ).count()
-    
-    total_students = User.query.filter_by(role='student').count()
+    def build_stats():
+        # Считаем только ЛР1 и ЛР2, исключаем подготовительную (lab_number=0)
+        total_labs = Lab.query.filter(
+            Lab.is_active == True,
+            Lab.lab_number.in_([1, 2])  # Только ЛР1 и ЛР2
+        ).count()
+        
+        total_students = User.query.filter_by(role='student').count()
+        
+        return {
+            'total_students': total_students,
+            'total_labs': total_labs  # Теперь будет 2
+        }
     
     return jsonify({
         'success': True,
         'user': user.to_dict(),
-        'stats': {
-            'total_students': total_students,
-            'total_labs': total_labs  # Теперь будет 2
-        }
+        'stats': snapshot_cache.get_or_compute('teacher_dashboard_stats', build_stats)
     })
 
 @app.route('/api/teacher/students')
@@ -730,39 +1333,25 @@ def get_students():
     if 'user_id' not in session or session.get('user_role') != 'teacher':
         return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
     
-    students = User.query.filter_by(role='student').all()
-    students_data = []
-    
-    for student in students:
-        progresses = StudentProgress.query.filter_by(student_id=student.id).all()
-        
-        # Фильтруем только выполненные ЛР1 и ЛР2
-        completed_labs = []
-        for progress in progresses:
-            if progress.status == 'completed':
-                lab = Lab.query.get(progress.lab_id)
-                if lab and lab.lab_number in [1, 2]:  # Только ЛР1 и ЛР2
-                    completed_labs.append({
-                        'lab_id': lab.id,
-                        'lab_title': lab.title,
-                        'lab_number': lab.lab_number,
-                        'score': progress.score,
-                        'completed_at': progress.end_time
-                    })
-        
-        # Рассчитываем средний балл только по ЛР1 и ЛР2
-        if completed_labs:
-            total_score = sum(lab['score'] for lab in completed_labs)
-            average_score = round(total_score / len(completed_labs), 1)
-        else:
-            average_score = 0
+    # Строки Core вместо ORM-объектов: без identity map и копирования через to_dict()
+    def build_students():
+        students = db.session.execute(
+            select(User.id, User.username, User.name, User.group).where(User.role == 'student')
+        ).all()
+        labs = {lab.id: lab for lab in db.session.execute(select(Lab.id, Lab.title, Lab.lab_number))}
         
-        # Последняя активность
-        last_activity = None
-        if progresses:
-            # Находим самую позднюю дату обновления
-            latest_progress = max(progresses, key=lambda p: p.updated_at if p.updated_at else datetime.min)
-            last_activity = latest_progress.updated_at
+        # Прогресс всех студентов собирается со всех шардов параллельно
+        if app.config['ACTIVITY_READ_MODELS']:
+            view = StudentLabView
+            query = select(view.student_id, view.lab_id, view.status, view.score,
+                           view.completed_at.label('end_time'), view.last_event_at.label('updated_at'))
+        else:
+            query = select(StudentProgress.student_id, StudentProgress.lab_id, StudentProgress.status,
+                           StudentProgress.score, StudentProgress.end_time, StudentProgress.updated_at)
+        progresses_by_student = defaultdict(list)
+        for rows in shard_router.fan_out(lambda conn: conn.execute(query).all()):
+            for row in rows:
+                progresses_by_student[row.student_id].append(row)
         
         # Конвертируем время в МСК
         def convert_to_msk(utc_dt):
@@ -770,25 +1359,62 @@ def get_students():
                 return None
             return utc_dt + timedelta(hours=3)
         
-        last_activity_msk = convert_to_msk(last_activity) if last_activity else None
+        students_data = []
         
-        students_data.append({
-            'id': student.id,
-            'username': student.username,
-            'name': student.name,
-            'group': student.group,
-            'completed_labs_count': len(completed_labs),
-            'average_score': average_score,
-            'last_activity': last_activity_msk.strftime('%d.%m.%Y %H:%M:%S') if last_activity_msk else None,
-            'completed_labs': completed_labs
+        for student in students:
+            progresses = progresses_by_student.get(student.id, [])
+        
+            # Фильтруем только выполненные ЛР1 и ЛР2
+            completed_labs = []
+            for progress in progresses:
+                if progress.status == 'completed':
+                    lab = labs.get(progress.lab_id)
+                    if lab and lab.lab_number in [1, 2]:  # Только ЛР1 и ЛР2
+                        completed_labs.append({
+                            'lab_id': lab.id,
+                            'lab_title': lab.title,
+                            'lab_number': lab.lab_number,
+                            'score': progress.score,
+                            'completed_at': progress.end_time
+                        })
+        
+            # Рассчитываем средний балл только по ЛР1 и ЛР2
+            if completed_labs:
+                total_score = sum(lab['score'] for lab in completed_labs)
+                average_score = round(total_score / len(completed_labs), 1)
+            else:
+                average_score = 0
+        
+            # Последняя активность
+            last_activity = None
+            if progresses:
+                # Находим самую позднюю дату обновления
+                latest_progress = max(progresses, key=lambda p: p.updated_at if p.updated_at else datetime.min)
+                last_activity = latest_progress.updated_at
+        
+            last_activity_msk = convert_to_msk(last_activity) if last_activity else None
+        
+            students_data.append({
+                'id': student.id,
+                'username': student.username,
+                'name': student.name,
+                'group': student.group,
+                'completed_labs_count': len(completed_labs),
+                'average_score': average_score,
+                'last_activity': last_activity_msk.strftime('%d.%m.%Y %H:%M:%S') if last_activity_msk else None,
+                'completed_labs': completed_labs
+            })
+        
+        # В кэше - готовые байты ответа: повторные запросы не сериализуют список заново
+        return dumps({
+            'success': True,
+            'students': students_data
         })
     
-    return jsonify({
-        'success': True,
-        'students': students_data
-    })
+    return json_response(snapshot_cache.get_or_compute('teacher_students', build_students))
 
 @app.route('/api/teacher/students', methods=['POST'])
+@rate_limiter.limit('write')
 def create_student():
     if 'user_id' not in session or session.get('user_role') != 'teacher':
         return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
@@ -808,12 +1434,14 @@ def create_student():
         username=data['username'],
         name=data['name'],
         role='student',
-        group=data['group']
+        group=data['group'],
+        shard=shard_router.choose(group=data['group'])
     )
     student.set_password(data['password'])
     
     db.session.add(student)
     db.session.commit()
+    snapshot_cache.invalidate()
     
     return jsonify({
         'success': True,
@@ -830,7 +1458,22 @@ def get_student_details(student_id):
     if not student or student.role != 'student':
         return jsonify({'success': False, 'error': 'Студент не найден'}), 404
     
-    progresses = StudentProgress.query.filter_by(student_id=student_id).all()
+    use_shard(student.shard)
+    progresses = db.session.execute(
+        select(StudentProgress.lab_id, StudentProgress.status, StudentProgress.score,
+               StudentProgress.start_time, StudentProgress.end_time, StudentProgress.total_time,
+               StudentProgress.attempts, StudentProgress.updated_at)
+        .where(StudentProgress.student_id == student_id)
+    ).all()
+    
+    # Попытки по заданиям всех работ одним запросом
+    attempts_by_lab = defaultdict(dict)
+    for lab_id, task_number, count in db.session.execute(
+        select(TaskAttempt.lab_id, TaskAttempt.task_number, db.func.count())
+        .where(TaskAttempt.student_id == student_id)
+        .group_by(TaskAttempt.lab_id, TaskAttempt.task_number)
+    ):
+        attempts_by_lab[lab_id][task_number] = count
     
     # Находим последнюю активность
     last_activity = None
@@ -849,21 +1492,15 @@ def get_student_details(student_id):
     
     labs_stats = []
     # Получаем все лабораторные работы
-    labs = Lab.query.filter_by(is_active=True).order_by(Lab.order).all()
+    labs = db.session.execute(
+        select(Lab.id, Lab.title, Lab.lab_number).where(Lab.is_active == True).order_by(Lab.order)
+    ).all()
+    lab_numbers = dict(db.session.execute(select(Lab.id, Lab.lab_number)).all())
     
     for lab in labs:
         progress = next((p for p in progresses if p.lab_id == lab.id), None)
         if progress and progress.status == 'completed':
-            attempts = TaskAttempt.query.filter_by(
-                student_id=student_id,
-                lab_id=lab.id
-            ).all()
-            
-            task_attempts = {}
-            for attempt in attempts:
-                if attempt.task_number not in task_attempts:
-                    task_attempts[attempt.task_number] = 0
-                task_attempts[attempt.task_number] += 1
+            task_attempts = attempts_by_lab.get(lab.id, {})
             
             start_time_msk = convert_to_msk(progress.start_time)
             end_time_msk = convert_to_msk(progress.end_time)
@@ -883,9 +1520,7 @@ def get_student_details(student_id):
     # Средний балл только для ЛР1 и ЛР2
     completed_progress = [p for p in progresses 
                          if p.status == 'completed' 
-                         and p.lab_id 
-                         and Lab.query.get(p.lab_id) 
-                         and Lab.query.get(p.lab_id).lab_number in [1, 2]]
+                         and lab_numbers.get(p.lab_id) in [1, 2]]
     
     if completed_progress:
         total_score = sum(p.score for p in completed_progress)
@@ -893,7 +1528,7 @@ def get_student_details(student_id):
     else:
         average_score = 0
     
-    return jsonify({
+    return json_response({
         'success': True,
         'student': {
             **student.to_dict(),
@@ -908,6 +1543,7 @@ def get_student_details(student_id):
     })
 
 @app.route('/api/teacher/students/<int:student_id>', methods=['PUT'])
+@rate_limiter.limit('write')
 def update_student(student_id):
     if 'user_id' not in session or session.get('user_role') != 'teacher':
         return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
@@ -920,6 +1556,7 @@ def update_student(student_id):
     
     if 'name' in data:
         student.name = data['name']
+    group_changed = 'group' in data and data['group'] != student.group
     if 'group' in data:
         student.group = data['group']
     if 'username' in data:
@@ -930,8 +1567,15 @@ def update_student(student_id):
             student.username = data['username']
     if 'password' in data and data['password']:
         student.set_password(data['password'])
+    if group_changed:
+        # Остальные воркеры переносят студента в рейтинге по событию журнала
+        use_shard(student.shard)
+        log_event(STUDENT_GROUP_CHANGED, student.id, group=student.group)
     
     db.session.commit()
+    snapshot_cache.invalidate()
+    if group_changed:
+        leaderboard.move_student(student.id, student.group)
     
     return jsonify({
         'success': True,
@@ -940,6 +1584,7 @@ def update_student(student_id):
     })
 
 @app.route('/api/teacher/students/<int:student_id>', methods=['DELETE'])
+@rate_limiter.limit('write')
 def delete_student(student_id):
     if 'user_id' not in session or session.get('user_role') != 'teacher':
         return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
@@ -948,50 +1593,338 @@ def delete_student(student_id):
     if not student or student.role != 'student':
         return jsonify({'success': False, 'error': 'Студент не найден'}), 404
     
+    use_shard(student.shard)
     StudentProgress.query.filter_by(student_id=student_id).delete()
     TaskAttempt.query.filter_by(student_id=student_id).delete()
+    log_event(STUDENT_REMOVED, student_id)
+    commit_shard_first(student.shard)
     
     db.session.delete(student)
     db.session.commit()
+    snapshot_cache.invalidate()
+    # Остальные воркеры убирают студента из рейтинга по событию журнала
+    leaderboard.remove_student(student_id)
     
     return jsonify({
         'success': True,
         'message': 'Студент удален'
     })
 
-@app.route('/api/teacher/labs')
-def get_teacher_labs():
+@app.route('/api/teacher/students/bulk-delete', methods=['POST'])
+@rate_limiter.limit('write')
+def bulk_delete_students():
     if 'user_id' not in session or session.get('user_role') != 'teacher':
         return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
     
-    # Получаем только ЛР1 и ЛР2
-    labs = Lab.query.filter(Lab.lab_number.in_([1, 2]), Lab.is_active == True).order_by(Lab.order).all()
-    labs_data = []
+    data = request.get_json() or {}
+    student_ids = data.get('student_ids')
     
-    for lab in labs:
-        completed_count = StudentProgress.query.filter_by(
-            lab_id=lab.id,
-            status='completed'
-        ).count()
+    if not isinstance(student_ids, list) or not student_ids:
+        return jsonify({'success': False, 'error': 'Не выбраны студенты'}), 400
+    
+    job = job_runner.submit('bulk_delete_students', {'student_ids': student_ids},
+                            created_by=session['user_id'])
+    
+    return jsonify({
+        'success': True,
+        'message': 'Удаление запущено',
+        'job_id': job.id
+    }), 202
+
+@job_runner.handler('bulk_delete_students')
+def bulk_delete_students_job(ctx, student_ids):
+    ids_by_shard = defaultdict(list)
+    for row in User.query.with_entities(User.id, User.shard) \
+            .filter(User.id.in_(student_ids), User.role == 'student'):
+        ids_by_shard[row.shard].append(row.id)
+    chunk_size = app.config['BULK_DELETE_CHUNK']
+    total = sum(len(ids) for ids in ids_by_shard.values())
+    deleted = 0
+    ctx.report(0, total)
+    
+    for shard, shard_ids in ids_by_shard.items():
+        use_shard(shard)
+        for start in range(0, len(shard_ids), chunk_size):
+            chunk = shard_ids[start:start + chunk_size]
+            StudentProgress.query.filter(StudentProgress.student_id.in_(chunk)).delete(synchronize_session=False)
+            TaskAttempt.query.filter(TaskAttempt.student_id.in_(chunk)).delete(synchronize_session=False)
+            for student_id in chunk:
+                log_event(STUDENT_REMOVED, student_id)
+            commit_shard_first(shard)
+            User.query.filter(User.id.in_(chunk)).delete(synchronize_session=False)
+            # Коммит каждой порции освобождает блокировку записи для студентов
+            db.session.commit()
+            snapshot_cache.invalidate()
+            for student_id in chunk:
+                leaderboard.remove_student(student_id)
+            deleted += len(chunk)
+            ctx.report(deleted)
+    
+    return {'deleted': deleted}
+
+@app.route('/api/teacher/groups')
+def get_groups():
+    if 'user_id' not in session or session.get('user_role') != 'teacher':
+        return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
+    
+    groups = db.session.execute(
+        select(User.group, db.func.count())
+        .where(User.role == 'student')
+        .group_by(User.group)
+        .order_by(User.group)
+    ).all()
+    
+    return jsonify({
+        'success': True,
+        'groups': [{'group': group, 'students_count': count} for group, count in groups]
+    })
+
+@app.route('/api/teacher/rollover', methods=['POST'])
+@rate_limiter.limit('write')
+def start_rollover():
+    """Перевод группы в архив; dry_run - только подсчет того, что будет удалено"""
+    if 'user_id' not in session or session.get('user_role') != 'teacher':
+        return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    group = data.get('group')
+    if not group:
+        return jsonify({'success': False, 'error': 'Не указана группа'}), 400
+    
+    ids_by_shard = group_students_by_shard(group)
+    if not ids_by_shard:
+        return jsonify({'success': False, 'error': 'В группе нет студентов'}), 404
+    
+    if data.get('dry_run'):
+        progress_count = 0
+        attempts_count = 0
+        for shard, student_ids in ids_by_shard.items():
+            use_shard(shard)
+            progress_count += StudentProgress.query.filter(StudentProgress.student_id.in_(student_ids)).count()
+            attempts_count += TaskAttempt.query.filter(TaskAttempt.student_id.in_(student_ids)).count()
+        
+        return jsonify({
+            'success': True,
+            'group': group,
+            'students': sum(len(ids) for ids in ids_by_shard.values()),
+            'progress': progress_count,
+            'attempts': attempts_count
+        })
+    
+    job = job_runner.submit('cohort_rollover', {'group': group}, created_by=session['user_id'])
+    
+    return jsonify({
+        'success': True,
+        'message': 'Перевод группы в архив запущен',
+        'job_id': job.id
+    }), 202
+
+@job_runner.handler('cohort_rollover')
+def cohort_rollover_job(ctx, group):
+    return rollover_group(group, report=ctx.report)
+
+def group_students_by_shard(group):
+    ids_by_shard = defaultdict(list)
+    for student_id, shard in db.session.execute(
+        select(User.id, User.shard).where(User.group == group, User.role == 'student').order_by(User.id)
+    ):
+        ids_by_shard[shard].append(student_id)
+    return ids_by_shard
+
+def rollover_group(group, report=None):
+    """Архивирование результатов группы и удаление ее студентов.
+
+    Каждая порция из ROLLOVER_CHUNK студентов удаляется отдельно: DELETE ... RETURNING
+    возвращает удаленные строки прогресса и попыток, и каждая запись студента
+    (gzip, строка JSON на студента) пишется в архив и сбрасывается на диск до
+    коммита. Между порциями блокировка записи свободна для остальных студентов.
+
+    Если прогресс в шарде, порция - две транзакции: сначала шард (прогресс,
+    попытки, события), затем пользователи в основной базе. Сбой между ними
+    оставляет студентов без прогресса, но не прогресс без студентов. После
+    обоих коммитов в архив пишется строка {"committed": [id, ...]}; записи
+    порции без такой строки могли остаться в базе.
+    """
+    ids_by_shard = group_students_by_shard(group)
+    total = sum(len(ids) for ids in ids_by_shard.values())
+    if not total:
+        raise ValueError(f"В группе {group} нет студентов")
+    
+    archive_dir = os.path.join(app.instance_path, 'archives')
+    os.makedirs(archive_dir, exist_ok=True)
+    safe_group = re.sub(r'[^\w-]+', '_', group)
+    archive_path = os.path.join(archive_dir, f"{safe_group}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.jsonl.gz")
+    
+    users, progress, attempts = User.__table__, StudentProgress.__table__, TaskAttempt.__table__
+    user_columns = [c for c in users.c if c.name != 'password_hash']
+    chunk_size = app.config['ROLLOVER_CHUNK']
+    summary = {'group': group, 'archive': archive_path, 'students': 0, 'progress': 0, 'attempts': 0}
+    if report:
+        report(0, total, f"Группа {group}")
+    
+    with open(archive_path, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as compressed, \
+            io.TextIOWrapper(compressed, encoding='utf-8') as archive:
         
-        progresses = StudentProgress.query.filter_by(lab_id=lab.id, status='completed').all()
+        def write_archive(lines):
+            for line in lines:
+                archive.write(json.dumps(line, ensure_ascii=False, default=str) + '\n')
+            archive.flush()
+            os.fsync(raw.fileno())
         
-        # Средний балл только среди тех, кто выполнил
-        if progresses:
-            total_score = sum(p.score for p in progresses)
-            avg_score = round(total_score / len(progresses), 1)
+        for shard, student_ids in ids_by_shard.items():
+            use_shard(shard)
+            for start in range(0, len(student_ids), chunk_size):
+                chunk = student_ids[start:start + chunk_size]
+                records = {student_id: {'user': None, 'progress': [], 'attempts': []} for student_id in chunk}
+                # Прогресс в основной базе - одна транзакция вместе с пользователями
+                shard_conn = db.session if shard is None else shard_router.engine(shard).connect()
+                try:
+                    for row in shard_conn.execute(
+                        delete(progress).where(progress.c.student_id.in_(chunk)).returning(*progress.c)
+                    ):
+                        records[row.student_id]['progress'].append(dict(row._mapping))
+                    for row in shard_conn.execute(
+                        delete(attempts).where(attempts.c.student_id.in_(chunk)).returning(*attempts.c)
+                    ):
+                        records[row.student_id]['attempts'].append(dict(row._mapping))
+                    shard_conn.execute(insert(ActivityEvent.__table__), [
+                        {'student_id': student_id, 'kind': STUDENT_REMOVED, 'created_at': datetime.utcnow()}
+                        for student_id in chunk
+                    ])
+                    # Пользователи удаляются последними, после коммита шарда
+                    for row in db.session.execute(
+                        select(*user_columns).where(users.c.id.in_(chunk), users.c.role == 'student')
+                    ):
+                        records[row.id]['user'] = dict(row._mapping)
+                    
+                    # Все удаленные строки попадают в архив, даже если пользователя уже нет
+                    write_archive(records.values())
+                    
+                    if shard is not None:
+                        shard_conn.commit()
+                    db.session.execute(delete(users).where(users.c.id.in_(chunk), users.c.role == 'student'))
+                    db.session.commit()
+                finally:
+                    if shard is not None:
+                        shard_conn.close()
+                write_archive([{'committed': chunk}])
+                
+                for record in records.values():
+                    summary['students'] += record['user'] is not None
+                    summary['progress'] += len(record['progress'])
+                    summary['attempts'] += len(record['attempts'])
+                snapshot_cache.invalidate()
+                for student_id in chunk:
+                    leaderboard.remove_student(student_id)
+                if report:
+                    report(summary['students'])
+                time.sleep(app.config['ROLLOVER_CHUNK_PAUSE'])
+    
+    return summary
+
+@app.route('/api/teacher/labs')
+def get_teacher_labs():
+    if 'user_id' not in session or session.get('user_role') != 'teacher':
+        return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
+    
+    def build_labs():
+        # Получаем только ЛР1 и ЛР2 (поля Lab.to_dict() без загрузки content)
+        labs = db.session.execute(
+            select(Lab.id, Lab.title, Lab.description, Lab.lab_number, Lab.difficulty,
+                   Lab.max_score, Lab.order)
+            .where(Lab.lab_number.in_([1, 2]), Lab.is_active == True)
+            .order_by(Lab.order)
+        ).all()
+        labs_data = []
+        
+        # Число выполнивших и сумма баллов по каждой работе из всех шардов
+        if app.config['ACTIVITY_READ_MODELS']:
+            source = StudentLabView
         else:
-            avg_score = 0
+            source = StudentProgress
+        query = (
+            select(source.lab_id, db.func.count(), db.func.sum(source.score))
+            .where(source.status == 'completed')
+            .group_by(source.lab_id)
+        )
+        completed = defaultdict(lambda: [0, 0])
+        for rows in shard_router.fan_out(lambda conn: conn.execute(query).all()):
+            for lab_id, count, score_sum in rows:
+                completed[lab_id][0] += count
+                completed[lab_id][1] += score_sum or 0
         
+        for lab in labs:
+            completed_count, total_score = completed.get(lab.id, (0, 0))
+        
+            # Средний балл только среди тех, кто выполнил
+            if completed_count:
+                avg_score = round(total_score / completed_count, 1)
+            else:
+                avg_score = 0
+        
+            labs_data.append({
+                **lab._mapping,
+                'completed_count': completed_count,
+                'average_score': avg_score
+            })
+        
+        return dumps({
+            'success': True,
+            'labs': labs_data
+        })
+    
+    return json_response(snapshot_cache.get_or_compute('teacher_labs', build_labs))
+
+@app.route('/api/teacher/activity')
+def get_activity_summary():
+    """Сводка активности по работам из модели чтения журнала событий"""
+    if 'user_id' not in session or session.get('user_role') != 'teacher':
+        return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
+    
+    view = StudentLabView
+    is_completed = view.status == 'completed'
+    query = select(
+        view.lab_id,
+        db.func.count(),
+        db.func.sum(db.case((is_completed, 1), else_=0)),
+        db.func.sum(db.case((is_completed, view.score), else_=0)),
+        db.func.sum(db.case((is_completed, view.elapsed_time), else_=0)),
+        db.func.sum(view.answers),
+        db.func.sum(view.correct_answers),
+        db.func.max(view.last_event_at)
+    ).group_by(view.lab_id)
+    
+    totals = defaultdict(lambda: [0, 0, 0, 0, 0, 0, None])
+    for rows in shard_router.fan_out(lambda conn: conn.execute(query).all()):
+        for lab_id, *values in rows:
+            merged = totals[lab_id]
+            for i in range(6):
+                merged[i] += values[i] or 0
+            if values[6] and (merged[6] is None or values[6] > merged[6]):
+                merged[6] = values[6]
+    
+    labs = Lab.query.filter_by(is_active=True).order_by(Lab.order).all()
+    labs_data = []
+    for lab in labs:
+        started, completed, score_sum, time_sum, answers, correct, last_event = \
+            totals.get(lab.id, [0, 0, 0, 0, 0, 0, None])
         labs_data.append({
-            **lab.to_dict(),
-            'completed_count': completed_count,
-            'average_score': avg_score
+            'lab_id': lab.id,
+            'lab_title': lab.title,
+            'lab_number': lab.lab_number,
+            'started_count': started,
+            'completed_count': completed,
+            'average_score': round(score_sum / completed, 1) if completed else 0,
+            'average_time': format_time(time_sum // completed) if completed else '-',
+            'answers': answers,
+            'correct_rate': round(correct / answers * 100, 1) if answers else 0,
+            'last_activity': last_event.isoformat() if last_event else None
         })
     
     return jsonify({
         'success': True,
-        'labs': labs_data
+        'labs': labs_data,
+        'lag': projection_runner.lag()
     })
 
 @app.route('/api/teacher/labs/<int:lab_id>/stats')
@@ -1003,28 +1936,43 @@ def get_lab_stats(lab_id):
     if not lab:
         return jsonify({'success': False, 'error': 'Практическая работа не найдена'}), 404
     
-    progresses = StudentProgress.query.filter_by(
-        lab_id=lab_id,
-        status='completed'
-    ).all()
+    def load_shard(conn):
+        progresses = conn.execute(
+            select(StudentProgress.student_id, StudentProgress.score, StudentProgress.start_time,
+                   StudentProgress.end_time, StudentProgress.total_time)
+            .where(StudentProgress.lab_id == lab_id, StudentProgress.status == 'completed')
+        ).all()
+        attempt_counts = conn.execute(
+            select(TaskAttempt.student_id, TaskAttempt.task_number, db.func.count())
+            .where(TaskAttempt.lab_id == lab_id)
+            .group_by(TaskAttempt.student_id, TaskAttempt.task_number)
+        ).all()
+        return progresses, attempt_counts
+    
+    # Выполнившие работу и их попытки собираются со всех шардов параллельно
+    progresses = []
+    attempts_by_student = defaultdict(dict)
+    for shard_progresses, attempt_counts in shard_router.fan_out(load_shard):
+        progresses.extend(shard_progresses)
+        for student_id, task_number, count in attempt_counts:
+            attempts_by_student[student_id][task_number] = count
+    
+    students = {
+        student.id: student
+        for student in db.session.execute(
+            select(User.id, User.name, User.group).where(User.id.in_([p.student_id for p in progresses]))
+        )
+    }
     
     stats = []
     for progress in progresses:
-        student = User.query.get(progress.student_id)
-        
-        attempts = TaskAttempt.query.filter_by(
-            student_id=student.id,
-            lab_id=lab_id
-        ).all()
+        student = students.get(progress.student_id)
+        if not student:
+            continue
         
         # Подсчитываем попытки по заданиям
-        task_attempts = {}
-        total_attempts = 0
-        for attempt in attempts:
-            if attempt.task_number not in task_attempts:
-                task_attempts[attempt.task_number] = 0
-            task_attempts[attempt.task_number] += 1
-            total_attempts += 1
+        task_attempts = attempts_by_student.get(student.id, {})
+        total_attempts = sum(task_attempts.values())
         
         # Форматируем попытки для отображения в таблице
         attempts_text = ""
@@ -1055,7 +2003,7 @@ def get_lab_stats(lab_id):
             'task_attempts': task_attempts
         })
     
-    return jsonify({
+    return json_response({
         'success': True,
         'lab': lab.to_dict(),
         'stats': stats,
@@ -1081,7 +2029,317 @@ def calculate_average_score(student_id):
     total_score = sum(p.score for p in progresses)
     return round(total_score / len(progresses), 1)
 
+def recalculate_lab_scores(lab_id, dry_run=False, report=None):
+    """Пересчет прогресса по работе: история TaskAttempt проигрывается по текущему
+    контенту работы и текущим правилам подсчета баллов.
+
+    Прогресс обновляется пакетами по RECALC_BATCH_SIZE строк в отдельных транзакциях.
+    Строки, измененные студентом во время пересчета (не совпала version), пропускаются.
+    Шарды обрабатываются по очереди.
+    """
+    lab = Lab.query.get(lab_id)
+    if not lab:
+        raise ValueError(f"Практическая работа {lab_id} не найдена")
+    
+    compiled_lab = get_compiled_lab(lab)
+    
+    attempts_count = 0
+    progress_count = 0
+    changes = []
+    for shard in shard_router.names():
+        use_shard(shard)
+        
+        # История попыток одним упорядоченным запросом, без загрузки ORM-объектов
+        history = defaultdict(list)
+        rows = db.session.execute(
+            select(TaskAttempt.student_id, TaskAttempt.task_number, TaskAttempt.answer)
+            .where(TaskAttempt.lab_id == lab_id)
+            .order_by(TaskAttempt.student_id, TaskAttempt.attempt_time, TaskAttempt.id)
+        )
+        for student_id, task_number, answer in rows:
+            history[student_id].append((task_number, answer))
+            attempts_count += 1
+        
+        progress_rows = db.session.execute(
+            select(StudentProgress.id, StudentProgress.student_id, StudentProgress.status,
+                   StudentProgress.score, StudentProgress.completed_tasks,
+                   StudentProgress.rules_version, StudentProgress.version)
+            .where(StudentProgress.lab_id == lab_id)
+        ).all()
+        progress_count += len(progress_rows)
+        
+        for row in progress_rows:
+            completed_tasks = replay_attempts(compiled_lab, history.get(row.student_id, []))
+            
+            new_score = row.score
+            if row.status == 'completed':
+                new_score = 0 if lab.lab_number == 0 else total_task_score(completed_tasks)
+            
+            old_tasks = json.loads(row.completed_tasks) if row.completed_tasks else []
+            if (new_score != row.score or completed_tasks != old_tasks
+                    or row.rules_version != SCORING_RULES_VERSION):
+                changes.append({
+                    'shard': shard,
+                    'progress_id': row.id,
+                    'student_id': row.student_id,
+                    'old_score': row.score,
+                    'new_score': new_score,
+                    'completed_tasks': completed_tasks,
+                    'version': row.version
+                })
+    
+    summary = {
+        'lab_id': lab_id,
+        'rules_version': SCORING_RULES_VERSION,
+        'dry_run': dry_run,
+        'attempts': attempts_count,
+        'progress_rows': progress_count,
+        'changed': len(changes),
+        'score_changed': sum(1 for c in changes if c['old_score'] != c['new_score']),
+        'diff': [
+            {k: c[k] for k in ('progress_id', 'student_id', 'old_score', 'new_score')}
+            for c in changes if c['old_score'] != c['new_score']
+        ][:app.config['RECALC_DIFF_LIMIT']]
+    }
+    
+    if dry_run:
+        return summary
+    
+    table = StudentProgress.__table__
+    statement = (
+        update(table)
+        .where(table.c.id == bindparam('b_id'), table.c.version == bindparam('b_version'))
+        .values(score=bindparam('b_score'),
+                completed_tasks=bindparam('b_tasks'),
+                rules_version=SCORING_RULES_VERSION,
+                version=table.c.version + 1,
+                # Пересчет не должен менять "последнюю активность" студента
+                updated_at=table.c.updated_at)
+    )
+    
+    batch_size = app.config['RECALC_BATCH_SIZE']
+    updated = 0
+    done = 0
+    if report:
+        report(0, len(changes))
+    
+    for shard in shard_router.names():
+        use_shard(shard)
+        shard_changes = [c for c in changes if c['shard'] == shard]
+        for start in range(0, len(shard_changes), batch_size):
+            batch = shard_changes[start:start + batch_size]
+            result = db.session.execute(statement, [
+                {'b_id': c['progress_id'], 'b_version': c['version'], 'b_score': c['new_score'],
+                 'b_tasks': json.dumps(c['completed_tasks'])}
+                for c in batch
+            ])
+            
+            # События только для строк, которые обновил этот пересчет (version сдвинута на 1)
+            versions = dict(db.session.execute(
+                select(table.c.id, table.c.version).where(table.c.id.in_([c['progress_id'] for c in batch]))
+            ).all())
+            events = [
+                {'student_id': c['student_id'], 'lab_id': lab_id, 'kind': SCORE_RECALCULATED,
+                 'payload': json.dumps({'score': c['new_score']}), 'created_at': datetime.utcnow()}
+                for c in batch
+                if versions.get(c['progress_id']) == c['version'] + 1 and c['old_score'] != c['new_score']
+            ]
+            if events:
+                db.session.execute(insert(ActivityEvent.__table__), events)
+            db.session.commit()
+            updated += result.rowcount
+            done += len(batch)
+            if report:
+                report(done)
+    
+    snapshot_cache.invalidate()
+    summary['updated'] = updated
+    summary['skipped'] = len(changes) - updated
+    return summary
+
+@app.route('/api/teacher/labs/<int:lab_id>/recalculate', methods=['POST'])
+@rate_limiter.limit('write')
+def recalculate_lab(lab_id):
+    if 'user_id' not in session or session.get('user_role') != 'teacher':
+        return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
+    
+    if not Lab.query.get(lab_id):
+        return jsonify({'success': False, 'error': 'Практическая работа не найдена'}), 404
+    
+    data = request.get_json(silent=True) or {}
+    job = job_runner.submit('recalculate_lab_scores',
+                            {'lab_id': lab_id, 'dry_run': bool(data.get('dry_run', False))},
+                            created_by=session['user_id'])
+    
+    return jsonify({
+        'success': True,
+        'message': 'Пересчет баллов запущен',
+        'job_id': job.id
+    }), 202
+
+@job_runner.handler('recalculate_lab_scores')
+def recalculate_lab_scores_job(ctx, lab_id, dry_run=False):
+    return recalculate_lab_scores(lab_id, dry_run=dry_run, report=ctx.report)
+
+# API ФОНОВЫХ ЗАДАЧ
+@app.route('/api/jobs/<int:job_id>')
+def get_job(job_id):
+    if 'user_id' not in session or session.get('user_role') != 'teacher':
+        return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
+    
+    job = Job.query.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Задача не найдена'}), 404
+    
+    return jsonify({
+        'success': True,
+        'job': job.to_dict()
+    })
+
+@app.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if 'user_id' not in session or session.get('user_role') != 'teacher':
+        return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
+    
+    job = Job.query.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Задача не найдена'}), 404
+    
+    if job.status not in ('queued', 'running'):
+        return jsonify({'success': False, 'error': 'Задача уже завершена'}), 400
+    
+    job_runner.cancel(job)
+    
+    return jsonify({
+        'success': True,
+        'message': 'Отмена запрошена',
+        'job': Job.query.get(job_id).to_dict()
+    })
+
 #endpoint для отладки
+@app.route('/api/debug/snapshot-cache')
+def debug_snapshot_cache():
+    """Счетчики кэша снимков текущего процесса и поколения общего уровня"""
+    if 'user_id' not in session or session.get('user_role') != 'teacher':
+        return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
+    
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'ttl': snapshot_cache.ttl,
+        'shared': cache_store.shared,
+        'stats': dict(snapshot_cache.stats),
+        'generation': cache_store.generation(snapshot_cache.namespace),
+        'catalog': {
+            'stats': dict(catalog_cache.stats),
+            'generation': cache_store.generation(catalog_cache.namespace)
+        }
+    })
+
+@app.route('/api/debug/rate-limits')
+def debug_rate_limits():
+    """Бюджеты ограничения частоты и счетчики срабатываний текущего процесса"""
+    if 'user_id' not in session or session.get('user_role') != 'teacher':
+        return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
+    
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'enabled': app.config['RATE_LIMIT_ENABLED'],
+        'shared': bool(app.config['RATE_LIMIT_STORAGE']),
+        'budgets': app.config['RATE_LIMITS'],
+        'stats': rate_limiter.snapshot()
+    })
+
+@app.route('/api/debug/profiler', methods=['POST'])
+@rate_limiter.limit('write')
+def start_profiler():
+    """Запуск профилирования: на seconds секунд или на следующие requests запросов к endpoint"""
+    if not app.config['PROFILER_ENABLED']:
+        return jsonify({'success': False, 'error': 'Профилировщик отключен'}), 404
+    if 'user_id' not in session or session.get('user_role') != 'teacher':
+        return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        seconds = float(data['seconds']) if data.get('seconds') else None
+        max_requests = int(data['requests']) if data.get('requests') else None
+        interval = float(data.get('interval_ms', 5)) / 1000
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Некорректные параметры профилирования'}), 400
+    
+    if seconds is None and max_requests is None:
+        return jsonify({'success': False, 'error': 'Укажите seconds или requests'}), 400
+    # Сеанс всегда ограничен по времени, даже если ждет запросов
+    seconds = min(seconds or app.config['PROFILER_MAX_SECONDS'], app.config['PROFILER_MAX_SECONDS'])
+    if max_requests is not None:
+        max_requests = min(max_requests, app.config['PROFILER_MAX_REQUESTS'])
+    interval = min(max(interval, 0.001), 1.0)
+    
+    try:
+        profile = profiler.start(seconds=seconds, pattern=data.get('endpoint') or None,
+                                 max_requests=max_requests, interval=interval)
+    except ProfilerBusy:
+        return jsonify({'success': False, 'error': 'Профилирование уже запущено'}), 409
+    
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'profile': profiler.report(profile)
+    }), 202
+
+@app.route('/api/debug/profiler')
+def get_profiler():
+    """Состояние и результаты последнего профилирования в этом процессе"""
+    if not app.config['PROFILER_ENABLED']:
+        return jsonify({'success': False, 'error': 'Профилировщик отключен'}), 404
+    if 'user_id' not in session or session.get('user_role') != 'teacher':
+        return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
+    
+    profile = profiler.current()
+    if profile is None:
+        return jsonify({'success': False, 'error': 'Профилирование не запускалось'}), 404
+    
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'profile': profiler.report(profile, top=request.args.get('top', 20, type=int))
+    })
+
+@app.route('/api/debug/profiler/collapsed')
+def get_profiler_collapsed():
+    """Стеки для flamegraph.pl или speedscope"""
+    if not app.config['PROFILER_ENABLED']:
+        return jsonify({'success': False, 'error': 'Профилировщик отключен'}), 404
+    if 'user_id' not in session or session.get('user_role') != 'teacher':
+        return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
+    
+    profile = profiler.current()
+    if profile is None:
+        return jsonify({'success': False, 'error': 'Профилирование не запускалось'}), 404
+    
+    return Response(
+        profiler.collapsed(profile),
+        mimetype='text/plain',
+        headers={'Content-Disposition': f'attachment; filename=profile-{os.getpid()}.folded'}
+    )
+
+@app.route('/api/debug/profiler/stop', methods=['POST'])
+def stop_profiler():
+    if not app.config['PROFILER_ENABLED']:
+        return jsonify({'success': False, 'error': 'Профилировщик отключен'}), 404
+    if 'user_id' not in session or session.get('user_role') != 'teacher':
+        return jsonify({'success': False, 'error': 'Доступ запрещен'}), 403
+    
+    profile = profiler.stop()
+    if profile is None:
+        return jsonify({'success': False, 'error': 'Профилирование не запускалось'}), 404
+    
+    return jsonify({
+        'success': True,
+        'profile': profiler.report(profile)
+    })
+
 @app.route('/api/debug/labs/<int:lab_id>')
 def debug_lab(lab_id):
     """Endpoint для отладки - показывает содержимое работы"""
@@ -1089,24 +2347,38 @@ def debug_lab(lab_id):
     if not lab:
         return jsonify({'success': False, 'error': 'Практическая работа не найдена'}), 404
     
+    content = lab.task_content()
+    package = lab_packages.get(lab.package) if lab.package else None
     return jsonify({
         'success': True,
         'lab_id': lab.id,
         'title': lab.title,
-        'has_content': bool(lab.content),
-        'content_length': len(lab.content) if lab.content else 0,
-        'content_preview': lab.content[:200] + '...' if lab.content else 'No content',
+        'package': lab.package,
+        'package_version': package.version if package else None,
+        'package_error': package.error if package else None,
+        'has_content': bool(content),
+        'content_length': len(content) if content else 0,
+        'content_preview': content[:200] + '...' if content else 'No content',
         'lab_number': lab.lab_number
     })
 
 # СТАТИЧЕСКИЕ ФАЙЛЫ
 @app.route('/')
 def index():
-    return send_from_directory(app.static_folder, 'index.html')
+    return send_asset(app.static_folder, 'index.html')
 
 @app.route('/<path:path>')
 def serve_static(path):
-    return send_from_directory(app.static_folder, path)
+    return send_asset(app.static_folder, path)
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Сборка статики с хешами в именах и сжатыми вариантами"""
+    out_dir = os.path.join(app.static_folder, BUILD_DIR)
+    manifest = build_assets(app.static_folder, out_dir)
+    for name, hashed_name in manifest.items():
+        print(f"{name} -> {hashed_name}")
+    print(f"Сборка записана в {out_dir}")
 
 # API для скачивания файлов
 @app.route('/api/download/<filename>')
@@ -1138,10 +2410,198 @@ def download_file(filename):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.cli.command('init-db')
+def init_db_command():
+    """Создание таблиц и начальных данных"""
+    try:
+        init_db()
+    except (CheckSpecError, LabPackageError) as e:
+        raise click.ClickException(str(e))
+    print("База данных инициализирована")
+
+@app.cli.command('recalculate-scores')
+@click.option('--lab-id', type=int, help='Только указанная работа (по умолчанию - все)')
+@click.option('--dry-run', is_flag=True, help='Показать изменения без записи')
+def recalculate_scores_command(lab_id, dry_run):
+    """Пересчет баллов по истории попыток и текущим правилам"""
+    lab_ids = [lab_id] if lab_id else [lab.id for lab in Lab.query.order_by(Lab.order)]
+    
+    for current_id in lab_ids:
+        started = time.perf_counter()
+        summary = recalculate_lab_scores(current_id, dry_run=dry_run)
+        elapsed = time.perf_counter() - started
+        
+        print(f"Работа {current_id}: попыток {summary['attempts']}, записей прогресса "
+              f"{summary['progress_rows']}, изменится {summary['changed']} "
+              f"(балл - {summary['score_changed']}), {elapsed:.2f} с")
+        for change in summary['diff']:
+            print(f"  студент {change['student_id']}: {change['old_score']} -> {change['new_score']}")
+        if not dry_run:
+            print(f"  обновлено {summary['updated']}, пропущено (изменены во время пересчета) {summary['skipped']}")
+
+@app.cli.command('labs-sync')
+def labs_sync_command():
+    """Повторный поиск пакетов работ и обновление строк Lab по их метаданным"""
+    try:
+        packages = lab_packages.rescan()
+        sync_lab_packages()
+        check_lab_contents()
+    except (CheckSpecError, LabPackageError) as e:
+        raise click.ClickException(str(e))
+    snapshot_cache.invalidate()
+    for package in lab_packages.packages():
+        print(f"{package.slug}: версия {package.version}, {package.meta.get('title')}")
+    print(f"Пакетов: {len(packages)}")
+
+@app.cli.command('events-backfill')
+def events_backfill_command():
+    """Журнал активности из существующего прогресса и попыток (для баз, созданных до журнала)"""
+    table = ActivityEvent.__table__
+    for shard in shard_router.names():
+        use_shard(shard)
+        label = shard or 'основная база'
+        if db.session.execute(select(ActivityEvent.id).limit(1)).first():
+            print(f"{label}: журнал уже ведется, пропуск")
+            continue
+        
+        # События собираются в хронологическом порядке, чтобы id журнала шли по времени
+        events = []
+        for row in db.session.execute(select(StudentProgress)).scalars():
+            if row.start_time:
+                events.append((row.start_time, row.student_id, row.lab_id, LAB_STARTED, None))
+            if row.status == 'completed':
+                events.append((row.end_time or row.updated_at, row.student_id, row.lab_id, LAB_COMPLETED,
+                               {'score': row.score, 'total_time': row.total_time}))
+            elif row.total_time:
+                events.append((row.updated_at, row.student_id, row.lab_id, TIME_HEARTBEAT,
+                               {'elapsed_time': row.total_time}))
+        for row in db.session.execute(select(TaskAttempt.student_id, TaskAttempt.lab_id, TaskAttempt.task_number,
+                                             TaskAttempt.is_correct, TaskAttempt.attempt_time)):
+            events.append((row.attempt_time, row.student_id, row.lab_id, ANSWER_SUBMITTED,
+                           {'task_number': row.task_number, 'is_correct': bool(row.is_correct)}))
+        events.sort(key=lambda e: (e[0] or datetime.min, e[3] != LAB_STARTED, e[3] == LAB_COMPLETED))
+        
+        chunk_size = 20000
+        for start in range(0, len(events), chunk_size):
+            db.session.execute(insert(table), [
+                {'created_at': created_at, 'student_id': student_id, 'lab_id': lab_id, 'kind': kind,
+                 'payload': json.dumps(payload) if payload else None}
+                for created_at, student_id, lab_id, kind, payload in events[start:start + chunk_size]
+            ])
+        db.session.commit()
+        print(f"{label}: записано событий {len(events)}")
+    
+    for name in projection_runner.projections:
+        started = time.perf_counter()
+        processed = projection_runner.rebuild(name)
+        print(f"Проекция {name}: событий {processed}, {time.perf_counter() - started:.2f} с")
+
+@app.cli.command('projections-rebuild')
+@click.option('--name', help='Только указанная проекция (по умолчанию - все)')
+def projections_rebuild_command(name):
+    """Перестроение моделей чтения проигрыванием журнала с начала"""
+    names = [name] if name else list(projection_runner.projections)
+    for current in names:
+        if current not in projection_runner.projections:
+            raise click.ClickException(f"Неизвестная проекция: {current}")
+        started = time.perf_counter()
+        processed = projection_runner.rebuild(current)
+        print(f"Проекция {current}: событий {processed}, {time.perf_counter() - started:.2f} с")
+
+@app.cli.command('rollover-group')
+@click.argument('group')
+def rollover_group_command(group):
+    """Архивирование результатов группы и удаление ее студентов"""
+    started = time.perf_counter()
+    
+    def report(done, total=None, message=None):
+        if total:
+            report.total = total
+        print(f"\r  студентов {done}/{report.total}", end='', flush=True)
+    
+    try:
+        summary = rollover_group(group, report=report)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    
+    print()
+    print(f"Группа {group}: студентов {summary['students']}, записей прогресса {summary['progress']}, "
+          f"попыток {summary['attempts']}, {time.perf_counter() - started:.2f} с")
+    print(f"Архив: {summary['archive']}")
+
+def sqlite_database_path():
+    url = db.engine.url
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        raise click.ClickException('Команда работает только с файловой базой SQLite')
+    return url.database
+
+def format_size(size):
+    return f"{size / 1024 / 1024:.2f} МБ"
+
+@app.cli.command('db-backup')
+@click.option('--dest', help='Файл копии (по умолчанию instance/backups/<имя>-<время>.db)')
+@click.option('--step-pages', default=256, show_default=True, help='Страниц за один шаг копирования')
+@click.option('--max-restarts', default=3, show_default=True,
+              help='Перезапусков копии из-за записи, после которых копия снимается через VACUUM INTO')
+def db_backup_command(dest, step_pages, max_restarts):
+    """Онлайн-копия базы без остановки приложения"""
+    path = sqlite_database_path()
+    if not dest:
+        name = os.path.splitext(os.path.basename(path))[0]
+        dest = os.path.join(app.instance_path, 'backups',
+                            f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.db")
+    
+    result = backup_database(path, dest, step_pages=step_pages, max_restarts=max_restarts)
+    method = 'VACUUM INTO' if result['method'] == 'vacuum_into' else 'backup API'
+    print(f"Копия: {result['dest']} ({format_size(result['size'])}), {method}, шагов {result['steps']}, "
+          f"перезапусков {result['restarts']}, проверка: {result['integrity']}, {result['seconds']:.2f} с")
+
+@app.cli.command('db-optimize')
+def db_optimize_command():
+    """ANALYZE и PRAGMA optimize"""
+    result = optimize_database(sqlite_database_path())
+    print(f"Статистика обновлена за {result['seconds']:.2f} с")
+
+@app.cli.command('db-vacuum')
+@click.option('--pages', default=0, show_default=True, help='Сколько свободных страниц вернуть (0 - все)')
+@click.option('--full', is_flag=True,
+              help='Полный VACUUM с перестройкой файла: держит блокировку записи до конца; '
+                   'один раз нужен, чтобы включить auto_vacuum=INCREMENTAL')
+def db_vacuum_command(pages, full):
+    """Возврат места, освободившегося после удалений"""
+    try:
+        result = vacuum_database(sqlite_database_path(), pages=pages, full=full)
+    except MaintenanceError as e:
+        raise click.ClickException(str(e))
+    print(f"Режим: {result['mode']}, свободных страниц {result['free_pages_before']} -> "
+          f"{result['free_pages_after']}, освобождено {format_size(result['reclaimed_bytes'])}, "
+          f"файл {format_size(result['file_bytes_before'])} -> {format_size(result['file_bytes_after'])}, "
+          f"{result['seconds']:.2f} с")
+
+@app.cli.command('db-check')
+@click.option('--quick', is_flag=True, help='quick_check вместо полного integrity_check')
+def db_check_command(quick):
+    """Проверка целостности базы"""
+    result = check_integrity(sqlite_database_path(), quick=quick)
+    for problem in result['problems']:
+        print(f"  {problem}")
+    for violation in result['foreign_key_violations']:
+        print(f"  внешний ключ: {violation['table']} rowid={violation['rowid']} -> {violation['parent']}")
+    print(f"{'Ошибок не найдено' if result['ok'] else 'Найдены ошибки'} ({result['seconds']:.2f} с)")
+    if not result['ok']:
+        raise SystemExit(1)
+
 if __name__ == '__main__':
+    # Режим разработки: однопроцессный сервер Werkzeug.
+    # В продакшене: flask --app app init-db && gunicorn -c gunicorn.conf.py wsgi:app
     with app.app_context():
-        db.create_all()
-        create_initial_data()
+        init_db()
+    
+    # При debug=True код запускается дважды (процесс-наблюдатель и сервер),
+    # фоновые потоки нужны только в процессе сервера
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        job_runner.start()
+        projection_runner.start()
     
     print("=" * 50)
     print("🚀 Киберполигон запущен!")
@@ -0,0 +1,97 @@
+"""Нагрузочный тест одновременной отправки ответов (оптимистичные блокировки StudentProgress).
+
+Каждый студент отправляет ответы на одно и то же задание из нескольких потоков сразу.
+Скрипт выводит пропускную способность, долю конфликтов версий и проверяет,
+что ни одна попытка не потерялась: attempts в completed_tasks должен совпасть
+с количеством строк TaskAttempt.
+
+    python benchmarks/answer_concurrency.py --students 5 --threads 8 --requests 25
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=5)
+    parser.add_argument('--threads', type=int, default=8, help='потоков на одного студента')
+    parser.add_argument('--requests', type=int, default=25, help='ответов от каждого потока')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='answer-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    sys.path.insert(0, BACKEND_DIR)
+
+    from app import (app, db, init_db, Lab, StudentProgress, TaskAttempt, User,
+                     progress_update_stats)
+
+    # Измеряется конкурентная запись, а не лимиты частоты
+    app.config['RATE_LIMIT_ENABLED'] = False
+
+    with app.app_context():
+        init_db()
+        lab = Lab.query.filter_by(lab_number=1).first()
+        student_ids = []
+        for i in range(args.students):
+            student = User(username=f'bench{i}', name=f'Bench {i}', role='student', group='BENCH')
+            student.set_password('bench')
+            db.session.add(student)
+            db.session.flush()
+            db.session.add(StudentProgress(student_id=student.id, lab_id=lab.id,
+                                           status='in_progress', start_time=datetime.utcnow()))
+            student_ids.append(student.id)
+        db.session.commit()
+        lab_id = lab.id
+
+    def worker(username):
+        client = app.test_client()
+        client.post('/api/login', json={'username': username, 'password': 'bench'})
+        for _ in range(args.requests):
+            # Неверный ответ: все потоки обновляют одну и ту же запись задания
+            response = client.post(f'/api/student/lab/{lab_id}/check-answer',
+                                   json={'task_number': 1, 'answer': 'wrong'})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    statuses = {}
+    threads = [threading.Thread(target=worker, args=(f'bench{i}',))
+               for i in range(args.students) for _ in range(args.threads)]
+
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    lost_updates = 0
+    with app.app_context():
+        for student_id in student_ids:
+            progress = StudentProgress.query.filter_by(student_id=student_id, lab_id=lab_id).first()
+            tasks = json.loads(progress.completed_tasks)
+            recorded = tasks[0]['attempts'] if tasks else 0
+            stored = TaskAttempt.query.filter_by(student_id=student_id, lab_id=lab_id).count()
+            lost_updates += stored - recorded
+
+    total = len(threads) * args.requests
+    writes = progress_update_stats['commits'] + progress_update_stats['conflicts']
+    print(f"Запросов:            {total}")
+    print(f"Статусы ответов:     {statuses}")
+    print(f"Время:               {elapsed:.2f} с")
+    print(f"Пропускная способн.: {total / elapsed:.1f} запр/с")
+    print(f"Коммитов:            {progress_update_stats['commits']}")
+    print(f"Конфликтов версии:   {progress_update_stats['conflicts']} "
+          f"({progress_update_stats['conflicts'] / writes * 100 if writes else 0:.1f}% попыток записи)")
+    print(f"Исчерпаны повторы:   {progress_update_stats['failures']}")
+    print(f"Потерянных обновлений: {lost_updates}")
+
+
+if __name__ == '__main__':
+    main()
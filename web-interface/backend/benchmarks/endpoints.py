@@ -0,0 +1,167 @@
+"""Замер времени ответа всех эндпоинтов /api/teacher/* и /api/student/*.
+
+Запросы выполняются через тестовый клиент Flask в одном процессе, поэтому
+измеряется время обработчиков и запросов к БД без сетевых издержек.
+База берется из DATABASE_URL; для замеров на большом наборе данных ее
+предварительно заполняет benchmarks/synthetic_data.py (или --generate).
+
+    DATABASE_URL=sqlite:////tmp/scale.db python benchmarks/endpoints.py --repeat 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app import Lab, StudentProgress, User, app, db, init_db  # noqa: E402
+from synthetic_data import STUDENT_PASSWORD, USERNAME_PREFIX, generate  # noqa: E402
+
+PREFIXES = ('/api/teacher/', '/api/student/', '/api/leaderboard')
+
+
+def _pick_fixtures():
+    """Синтетический студент с незавершенной работой и ЛР1 для статистики"""
+    progress = StudentProgress.query.join(User, User.id == StudentProgress.student_id) \
+        .filter(StudentProgress.status == 'in_progress',
+                User.username.like(f'{USERNAME_PREFIX}%')).first()
+    if progress is None:
+        raise SystemExit('Нет синтетических данных: запустите synthetic_data.py или укажите --generate')
+
+    student = db.session.get(User, progress.student_id)
+    stats_lab = Lab.query.filter(Lab.lab_number.in_([1, 2])).order_by(Lab.order).first()
+    return student, progress.lab_id, stats_lab.id
+
+
+def _scenarios(student, lab_id, stats_lab_id):
+    """(роль, метод, правило маршрута, функция(i) -> (url, json))"""
+    counter = {'n': 0}
+
+    def new_username():
+        counter['n'] += 1
+        return f'bench{os.getpid()}_{counter["n"]}'
+
+    def create_student(i):
+        return '/api/teacher/students', {'username': new_username(), 'name': 'Замер',
+                                          'group': 'ЗАМЕР', 'password': 'x'}
+
+    def disposable_student_id(group='ЗАМЕР'):
+        """Отдельный студент для замеров удаления"""
+        with app.app_context():
+            user = User(username=new_username(), name='Замер', role='student', group=group,
+                        password_hash='-')
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+
+    def disposable_group():
+        """Отдельная группа из одного студента для замера перевода в архив"""
+        group = f'ЗАМЕР-АРХИВ-{new_username()}'
+        disposable_student_id(group)
+        return group
+
+    return [
+        ('student', 'GET', '/api/student/dashboard', lambda i: ('/api/student/dashboard', None)),
+        ('student', 'GET', '/api/student/lab/<int:lab_id>/progress',
+         lambda i: (f'/api/student/lab/{lab_id}/progress', None)),
+        ('student', 'POST', '/api/student/lab/<int:lab_id>/start',
+         lambda i: (f'/api/student/lab/{lab_id}/start', None)),
+        ('student', 'POST', '/api/student/lab/<int:lab_id>/check-answer',
+         lambda i: (f'/api/student/lab/{lab_id}/check-answer', {'task_number': 1, 'answer': 'x'})),
+        ('student', 'POST', '/api/student/lab/<int:lab_id>/check-answers',
+         lambda i: (f'/api/student/lab/{lab_id}/check-answers',
+                    {'answers': [{'task_number': 1, 'answer': 'x'}, {'task_number': 1, 'answer': 'y'}]})),
+        ('student', 'POST', '/api/student/lab/<int:lab_id>/workspace',
+         lambda i: (f'/api/student/lab/{lab_id}/workspace', {'state': 'hidden' if i % 2 else 'visible'})),
+        ('student', 'POST', '/api/student/lab/<int:lab_id>/update-time',
+         lambda i: (f'/api/student/lab/{lab_id}/update-time', {'elapsed_time': 60 + i})),
+        ('student', 'POST', '/api/student/lab/<int:lab_id>/complete',
+         lambda i: (f'/api/student/lab/{lab_id}/complete', None)),
+        ('teacher', 'GET', '/api/leaderboard', lambda i: ('/api/leaderboard?limit=20', None)),
+        ('student', 'GET', '/api/leaderboard/students/<int:student_id>',
+         lambda i: (f'/api/leaderboard/students/{student.id}', None)),
+        ('teacher', 'GET', '/api/leaderboard/students/<int:student_id>/around',
+         lambda i: (f'/api/leaderboard/students/{student.id}/around?radius=5', None)),
+        ('teacher', 'GET', '/api/teacher/dashboard', lambda i: ('/api/teacher/dashboard', None)),
+        ('teacher', 'GET', '/api/teacher/students', lambda i: ('/api/teacher/students', None)),
+        ('teacher', 'POST', '/api/teacher/students', create_student),
+        ('teacher', 'GET', '/api/teacher/students/<int:student_id>',
+         lambda i: (f'/api/teacher/students/{student.id}', None)),
+        ('teacher', 'PUT', '/api/teacher/students/<int:student_id>',
+         lambda i: (f'/api/teacher/students/{student.id}', {'name': student.name})),
+        ('teacher', 'GET', '/api/teacher/groups', lambda i: ('/api/teacher/groups', None)),
+        ('teacher', 'POST', '/api/teacher/rollover',
+         lambda i: ('/api/teacher/rollover', {'group': disposable_group()})),
+        ('teacher', 'GET', '/api/teacher/labs', lambda i: ('/api/teacher/labs', None)),
+        ('teacher', 'GET', '/api/teacher/activity', lambda i: ('/api/teacher/activity', None)),
+        ('teacher', 'GET', '/api/teacher/labs/<int:lab_id>/stats',
+         lambda i: (f'/api/teacher/labs/{stats_lab_id}/stats', None)),
+        ('teacher', 'POST', '/api/teacher/labs/<int:lab_id>/recalculate',
+         lambda i: (f'/api/teacher/labs/{stats_lab_id}/recalculate', {'dry_run': True})),
+        ('teacher', 'POST', '/api/teacher/students/bulk-delete',
+         lambda i: ('/api/teacher/students/bulk-delete', {'student_ids': [disposable_student_id()]})),
+        ('teacher', 'DELETE', '/api/teacher/students/<int:student_id>',
+         lambda i: (f'/api/teacher/students/{disposable_student_id()}', None)),
+    ]
+
+
+def _check_coverage(scenarios):
+    covered = {(method, rule) for _, method, rule, _ in scenarios}
+    missing = []
+    for rule in app.url_map.iter_rules():
+        if not rule.rule.startswith(PREFIXES):
+            continue
+        for method in rule.methods - {'HEAD', 'OPTIONS'}:
+            if (method, rule.rule) not in covered:
+                missing.append(f'{method} {rule.rule}')
+    return missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--generate', action='store_true',
+                        help='сначала заполнить базу синтетическими данными (значения по умолчанию)')
+    args = parser.parse_args()
+
+    # Замеряются обработчики, а не лимиты частоты запросов
+    app.config['RATE_LIMIT_ENABLED'] = False
+
+    with app.app_context():
+        init_db()
+        if args.generate:
+            generate(5000, 100, 30, 1000000)
+        student, lab_id, stats_lab_id = _pick_fixtures()
+        scenarios = _scenarios(student, lab_id, stats_lab_id)
+
+    missing = _check_coverage(scenarios)
+    if missing:
+        raise SystemExit('Эндпоинты без сценария замера: ' + ', '.join(sorted(missing)))
+
+    clients = {'student': app.test_client(), 'teacher': app.test_client()}
+    clients['student'].post('/api/login', json={'username': student.username, 'password': STUDENT_PASSWORD})
+    clients['teacher'].post('/api/login', json={'username': 'teacher', 'password': 'teacher123'})
+
+    print(f"{'Эндпоинт':<58} {'код':>5} {'медиана':>9} {'p95':>9} {'макс':>9} {'байт':>10}")
+    for role, method, rule, make_request in scenarios:
+        timings = []
+        statuses = set()
+        size = 0
+        for i in range(args.repeat):
+            url, payload = make_request(i)
+            started = time.perf_counter()
+            response = clients[role].open(url, method=method, json=payload)
+            timings.append((time.perf_counter() - started) * 1000)
+            statuses.add(response.status_code)
+            size = len(response.data)
+
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"{method + ' ' + rule:<58} {','.join(map(str, sorted(statuses))):>5} "
+              f"{statistics.median(timings):>7.1f}мс {p95:>7.1f}мс {timings[-1]:>7.1f}мс {size:>10}")
+
+
+if __name__ == '__main__':
+    main()
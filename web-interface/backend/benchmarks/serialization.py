@@ -0,0 +1,118 @@
+"""Сравнение пути чтения через ORM и через строки Core: время и память на 10 000 строк.
+
+Для каждой таблицы строки читаются и сериализуются в JSON тремя способами:
+ORM-объекты + to_dict() + json провайдер Flask (как в обработчиках до перехода),
+строки Core + словари + fast_json.dumps и строки Core как компактные кортежи.
+Пиковая память считается через tracemalloc (замеры памяти и времени - раздельные
+прогоны, трассировка сильно замедляет код).
+
+    DATABASE_URL=sqlite:////tmp/scale.db python benchmarks/serialization.py --rows 50000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from sqlalchemy import select  # noqa: E402
+
+import fast_json  # noqa: E402
+from app import StudentProgress, User, app, db, init_db  # noqa: E402
+
+PER_ROWS = 10000
+
+PROGRESS_COLUMNS = (StudentProgress.id, StudentProgress.student_id, StudentProgress.lab_id,
+                    StudentProgress.status, StudentProgress.score, StudentProgress.attempts,
+                    StudentProgress.start_time, StudentProgress.end_time, StudentProgress.total_time,
+                    StudentProgress.completed_tasks)
+USER_COLUMNS = (User.id, User.username, User.name, User.role, User.group, User.department)
+
+
+def _progress_dict(row):
+    # Те же поля и преобразования, что и в StudentProgress.to_dict()
+    return {
+        'id': row.id,
+        'student_id': row.student_id,
+        'lab_id': row.lab_id,
+        'status': row.status,
+        'score': row.score,
+        'attempts': row.attempts,
+        'start_time': row.start_time.isoformat() if row.start_time else None,
+        'end_time': row.end_time.isoformat() if row.end_time else None,
+        'total_time': row.total_time,
+        'completed_tasks': json.loads(row.completed_tasks) if row.completed_tasks else []
+    }
+
+
+def _cases(limit):
+    def orm(model):
+        def run():
+            db.session.expunge_all()
+            objects = model.query.order_by(model.id).limit(limit).all()
+            body = app.json.dumps([obj.to_dict() for obj in objects]).encode('utf-8')
+            return len(objects), body
+        return run
+
+    def core_dicts(columns, to_dict):
+        def run():
+            rows = db.session.execute(select(*columns).order_by(columns[0]).limit(limit)).all()
+            return len(rows), fast_json.dumps([to_dict(row) for row in rows])
+        return run
+
+    def core_tuples(columns):
+        def run():
+            rows = db.session.execute(select(*columns).order_by(columns[0]).limit(limit)).all()
+            return len(rows), fast_json.dumps([tuple(row) for row in rows])
+        return run
+
+    return [
+        ('student_progress', 'ORM + to_dict + jsonify', orm(StudentProgress)),
+        ('student_progress', 'Core + словари + fast_json', core_dicts(PROGRESS_COLUMNS, _progress_dict)),
+        ('student_progress', 'Core + кортежи + fast_json', core_tuples(PROGRESS_COLUMNS)),
+        ('user', 'ORM + to_dict + jsonify', orm(User)),
+        ('user', 'Core + словари + fast_json', core_dicts(USER_COLUMNS, lambda row: dict(row._mapping))),
+        ('user', 'Core + кортежи + fast_json', core_tuples(USER_COLUMNS)),
+    ]
+
+
+def _measure(run, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows, body = run()
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return rows, len(body), min(timings), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=PER_ROWS, help='сколько строк читать за прогон')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"JSON: {'orjson' if fast_json.orjson else 'json (orjson не установлен)'}")
+    print(f"{'Таблица':<18} {'Способ':<30} {'строк':>7} {'мс/10к':>9} {'МБ/10к':>8} {'байт/10к':>10}")
+
+    with app.app_context():
+        init_db()
+        for table, label, run in _cases(args.rows):
+            rows, size, seconds, peak = _measure(run, args.repeat)
+            if not rows:
+                print(f"{table:<18} {label:<30} нет данных")
+                continue
+            scale = PER_ROWS / rows
+            print(f"{table:<18} {label:<30} {rows:>7} {seconds * 1000 * scale:>9.1f} "
+                  f"{peak / 1024 / 1024 * scale:>8.2f} {int(size * scale):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""Генератор синтетического набора данных для проверки производительности.
+
+Создает студентов по группам, дополнительные практические работы и историю
+попыток с реалистичным распределением повторов (число попыток на задание -
+геометрическое). Прогресс студентов собирается теми же правилами подсчета
+баллов, что и в приложении, поэтому данные согласованы.
+
+    DATABASE_URL=sqlite:////tmp/scale.db python benchmarks/synthetic_data.py \\
+        --students 5000 --groups 100 --labs 30 --attempts 1000000
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from app import Lab, StudentProgress, TaskAttempt, User, app, db, init_db  # noqa: E402
+from scoring import apply_task_answer, total_task_score  # noqa: E402
+
+USERNAME_PREFIX = 'syn'
+STUDENT_PASSWORD = 'student123'
+INSERT_CHUNK = 20000
+
+# Вероятность правильного ответа с каждой попытки и предел попыток на задание
+CORRECT_PROBABILITY = 0.55
+MAX_TASK_ATTEMPTS = 12
+# Доля студентов с начатой, но не завершенной следующей работой
+IN_PROGRESS_PROBABILITY = 0.3
+# Недобор попыток относительно --attempts, при котором генерация отказывается работать
+ATTEMPTS_TOLERANCE = 0.02
+
+
+def _insert(table, rows):
+    for start in range(0, len(rows), INSERT_CHUNK):
+        db.session.execute(table.insert(), rows[start:start + INSERT_CHUNK])
+    db.session.commit()
+
+
+def _make_lab_content(lab_index, rng, tasks_per_lab):
+    tasks = []
+    for number in range(1, tasks_per_lab + 1):
+        answers = [f'Вариант {lab_index}.{number}.{k}' for k in range(1, 5)]
+        tasks.append({
+            'type': 'question',
+            'question': f'Вопрос {number} синтетической работы {lab_index}',
+            'answers': answers,
+            'correct_answer': rng.choice(answers),
+            'task_number': number
+        })
+    return tasks
+
+
+def _expected_attempts(lab_attempts, probability):
+    """Ожидаемое число попыток одного студента: завершено K ~ Bin(N, p) первых работ,
+    следующая с вероятностью IN_PROGRESS_PROBABILITY начата (попытки в ней тоже есть)
+    """
+    count = len(lab_attempts)
+    prefix = [0.0]
+    for value in lab_attempts:
+        prefix.append(prefix[-1] + value)
+    expected = 0.0
+    for done in range(count + 1):
+        weight = math.comb(count, done) * probability ** done * (1 - probability) ** (count - done)
+        started = lab_attempts[done] * IN_PROGRESS_PROBABILITY if done < count else 0.0
+        expected += weight * (prefix[done] + started)
+    return expected
+
+
+def generate(students, groups, labs, attempts, tasks_per_lab=5, seed=42, log=print):
+    rng = random.Random(seed)
+    started = time.perf_counter()
+
+    if User.query.filter(User.username.like(f'{USERNAME_PREFIX}%')).first():
+        raise SystemExit('Синтетические данные уже созданы в этой базе')
+
+    # Хеш пароля считается один раз: pbkdf2 на каждого студента занял бы минуты
+    password_hash = generate_password_hash(STUDENT_PASSWORD)
+
+    created_at = datetime.utcnow() - timedelta(days=120)
+    _insert(User.__table__, [{
+        'username': f'{USERNAME_PREFIX}{i:05d}',
+        'password_hash': password_hash,
+        'name': f'Студент Синтетический {i}',
+        'role': 'student',
+        'group': f'СИН-{i % groups + 1:03d}',
+        'created_at': created_at
+    } for i in range(students)])
+    student_ids = [row.id for row in User.query.with_entities(User.id)
+                   .filter(User.username.like(f'{USERNAME_PREFIX}%')).order_by(User.id)]
+    log(f'Студентов: {len(student_ids)} ({time.perf_counter() - started:.1f} с)')
+
+    max_order = db.session.query(db.func.max(Lab.order)).scalar() or 0
+    max_number = db.session.query(db.func.max(Lab.lab_number)).scalar() or 0
+    _insert(Lab.__table__, [{
+        'title': f'Синтетическая работа №{max_number + i}',
+        'description': 'Сгенерирована для проверки производительности',
+        'lab_number': max_number + i,
+        'difficulty': rng.choice(['easy', 'medium', 'hard']),
+        'content': json.dumps(_make_lab_content(max_number + i, rng, tasks_per_lab), ensure_ascii=False),
+        'max_score': tasks_per_lab * 10,
+        'is_active': True,
+        'order': max_order + i
+    } for i in range(1, labs + 1)])
+
+    # Проходить работы можно только по порядку: у каждого студента выполнен префикс списка
+    all_labs = Lab.query.filter_by(is_active=True).order_by(Lab.order).all()
+    lab_tasks = [(lab.id, lab.lab_number, json.loads(lab.task_content() or '[]'))
+                 for lab in all_labs]
+    log(f'Работ: {len(all_labs)} ({time.perf_counter() - started:.1f} с)')
+
+    # Работы проходятся по порядку: число завершенных работ студента - биномиальное
+    # с вероятностью p, подобранной так, чтобы ожидаемое число попыток равнялось attempts
+    mean_attempts_per_task = (1 - (1 - CORRECT_PROBABILITY) ** MAX_TASK_ATTEMPTS) / CORRECT_PROBABILITY
+    lab_attempts = [mean_attempts_per_task * sum(task.get('type') in ('question', 'input') for task in tasks)
+                    for _, _, tasks in lab_tasks]
+    capacity = _expected_attempts(lab_attempts, 1.0) * len(student_ids)
+    if capacity < attempts * (1 - ATTEMPTS_TOLERANCE):
+        raise SystemExit(f'Работ слишком мало для {attempts} попыток: при прохождении всех работ '
+                         f'всеми студентами ~{int(capacity)}; увеличьте --labs, --tasks-per-lab или --students')
+    low, high = 0.0, 1.0
+    for _ in range(50):
+        p = (low + high) / 2
+        if _expected_attempts(lab_attempts, p) * len(student_ids) < attempts:
+            low = p
+        else:
+            high = p
+    lab_probability = high
+
+    progress_rows = []
+    attempt_rows = []
+    for student_id in student_ids:
+        labs_done = sum(rng.random() < lab_probability for _ in all_labs)
+        moment = created_at + timedelta(days=rng.uniform(0, 30), hours=rng.uniform(8, 18))
+
+        # Последняя работа из префикса иногда остается незавершенной
+        in_progress = labs_done < len(all_labs) and rng.random() < IN_PROGRESS_PROBABILITY
+        for index in range(labs_done + (1 if in_progress else 0)):
+            lab_id, lab_number, tasks = lab_tasks[index]
+            start_time = moment
+            completed_tasks = []
+
+            for task in tasks:
+                if task.get('type') not in ('question', 'input'):
+                    continue
+                task_number = task['task_number']
+                for attempt in range(MAX_TASK_ATTEMPTS):
+                    is_correct = rng.random() < CORRECT_PROBABILITY
+                    answer = task['correct_answer'] if is_correct else 'неверный ответ'
+                    moment += timedelta(seconds=rng.randint(10, 240))
+                    attempt_rows.append({
+                        'student_id': student_id,
+                        'lab_id': lab_id,
+                        'task_number': task_number,
+                        'answer': answer,
+                        'is_correct': is_correct,
+                        'attempt_time': moment
+                    })
+                    apply_task_answer(completed_tasks, task_number, answer, is_correct)
+                    if is_correct:
+                        break
+
+            completed = index < labs_done
+            progress_rows.append({
+                'student_id': student_id,
+                'lab_id': lab_id,
+                'status': 'completed' if completed else 'in_progress',
+                'score': total_task_score(completed_tasks) if completed and lab_number != 0 else 0,
+                'attempts': 0,
+                'start_time': start_time,
+                'end_time': moment if completed else None,
+                'total_time': int((moment - start_time).total_seconds()),
+                'completed_tasks': json.dumps(completed_tasks),
+                'created_at': start_time,
+                'updated_at': moment,
+                'version': 1,
+                'rules_version': 1
+            })
+            moment += timedelta(days=rng.uniform(1, 7))
+
+    log(f'Сгенерировано: прогресс {len(progress_rows)}, попыток {len(attempt_rows)} '
+        f'({time.perf_counter() - started:.1f} с)')
+
+    _insert(StudentProgress.__table__, progress_rows)
+    _insert(TaskAttempt.__table__, attempt_rows)
+    log(f'Записано в БД за {time.perf_counter() - started:.1f} с')
+
+    return {'students': len(student_ids), 'labs': len(all_labs),
+            'progress': len(progress_rows), 'attempts': len(attempt_rows)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--groups', type=int, default=100)
+    parser.add_argument('--labs', type=int, default=30, help='дополнительных работ')
+    parser.add_argument('--attempts', type=int, default=1000000, help='примерное число попыток')
+    parser.add_argument('--tasks-per-lab', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with app.app_context():
+        init_db()
+        generate(args.students, args.groups, args.labs, args.attempts,
+                 tasks_per_lab=args.tasks_per_lab, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
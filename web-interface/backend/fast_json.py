@@ -0,0 +1,34 @@
+import json
+from datetime import date
+
+from flask import Response
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен: без него используется стандартный json
+    orjson = None
+
+
+def _default(value):
+    # Даты - в том же формате, что и у jsonify
+    if isinstance(value, date):
+        return http_date(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload):
+    """Сериализация сразу в байты ответа: строки Core и словари без ORM-объектов"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=(
+            orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+        ))
+    return json.dumps(payload, default=_default, ensure_ascii=False, sort_keys=True,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def json_response(body, status=200):
+    """Ответ из готовых байтов (например, из кэша снимков) или из объекта"""
+    if not isinstance(body, bytes):
+        body = dumps(body)
+    return Response(body, status=status, mimetype='application/json')
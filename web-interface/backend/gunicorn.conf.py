@@ -0,0 +1,32 @@
+import multiprocessing
+import os
+
+# Конфигурация продакшен-запуска:
+#   flask --app app init-db
+#   gunicorn -c gunicorn.conf.py wsgi:app
+# Плавная перезагрузка воркеров без простоя: kill -HUP <pid мастера>
+# Общие для воркеров лимиты: RATE_LIMIT_STORAGE=...; общий кэш по умолчанию - файл рядом с базой (<база>.cache)
+
+bind = os.environ.get('WEB_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('WEB_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+timeout = int(os.environ.get('WEB_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# Периодический перезапуск воркеров ограничивает рост памяти
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 2000))
+max_requests_jitter = 200
+
+# Приложение загружается в мастере один раз, воркеры получают его через fork
+preload_app = True
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    from app import reset_worker_state
+    reset_worker_state()
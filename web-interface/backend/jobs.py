@@ -0,0 +1,187 @@
+import json
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+
+class JobCancelled(Exception):
+    """Задача отменена пользователем"""
+
+
+class JobContext:
+    """Передается обработчику задачи: отчет о прогрессе и проверка отмены"""
+
+    def __init__(self, runner, job_id):
+        self.runner = runner
+        self.job_id = job_id
+
+    def report(self, done, total=None, message=None):
+        """Сохраняет прогресс задачи.
+
+        Фиксирует текущую транзакцию сессии, поэтому вызывается на границах
+        порций работы. Если задачу отменили, выбрасывает JobCancelled.
+        """
+        values = {'progress_done': done, 'heartbeat_at': datetime.utcnow()}
+        if total is not None:
+            values['progress_total'] = total
+        if message is not None:
+            values['message'] = message
+
+        Job, db = self.runner.model, self.runner.db
+        Job.query.filter_by(id=self.job_id).update(values)
+        db.session.commit()
+
+        if Job.query.with_entities(Job.cancel_requested).filter_by(id=self.job_id).scalar():
+            raise JobCancelled()
+
+
+class JobRunner:
+    """Пул фоновых потоков для долгих операций преподавателя.
+
+    Задачи хранятся в таблице job, поэтому их состояние видно из любого воркера.
+    Задачу забирает тот поток, чей UPDATE ... WHERE status = 'queued' сработал первым.
+    Выполняющаяся задача отмечает heartbeat_at при каждом report(); задача, у которой
+    отметки нет дольше JOB_STALE_AFTER секунд (воркер упал или перезапущен),
+    возвращается в очередь.
+    """
+
+    def __init__(self, app, db, model):
+        self.app = app
+        self.db = db
+        self.model = model
+        self.handlers = {}
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._requeued_at = 0.0
+
+    def handler(self, kind):
+        def decorator(func):
+            self.handlers[kind] = func
+            return func
+        return decorator
+
+    def submit(self, kind, params=None, created_by=None):
+        if kind not in self.handlers:
+            raise ValueError(f"Неизвестный тип задачи: {kind}")
+
+        job = self.model(kind=kind, params=json.dumps(params or {}), created_by=created_by)
+        self.db.session.add(job)
+        self.db.session.commit()
+        # Без gunicorn (flask run) потоки запускаются первой задачей
+        self.start()
+        self._wakeup.set()
+        return job
+
+    def cancel(self, job):
+        """Отмена: задача в очереди снимается сразу, выполняющаяся - на ближайшем report()"""
+        Job = self.model
+        if job.status == 'queued':
+            Job.query.filter_by(id=job.id, status='queued').update(
+                {'status': 'cancelled', 'finished_at': datetime.utcnow()})
+        Job.query.filter_by(id=job.id).update({'cancel_requested': True})
+        self.db.session.commit()
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping.clear()
+        self._requeued_at = 0.0
+        for i in range(self.app.config['JOB_WORKERS']):
+            thread = threading.Thread(target=self._loop, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        self._threads = []
+
+    def reset(self):
+        """После fork потоки родителя не существуют: забываем о них"""
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._requeued_at = 0.0
+
+    def requeue_stale(self):
+        """Задачи без отметки дольше JOB_STALE_AFTER - снова в очередь (отмененные - отмена)"""
+        Job, db = self.model, self.db
+        deadline = datetime.utcnow() - timedelta(seconds=self.app.config['JOB_STALE_AFTER'])
+        stale = Job.query.with_entities(Job.id, Job.cancel_requested).filter(
+            Job.status == 'running',
+            db.func.coalesce(Job.heartbeat_at, Job.started_at) < deadline
+        ).all()
+        for job_id, cancel_requested in stale:
+            if cancel_requested:
+                values = {'status': 'cancelled', 'finished_at': datetime.utcnow()}
+            else:
+                values = {'status': 'queued', 'started_at': None, 'heartbeat_at': None,
+                          'message': 'Перезапуск после остановки воркера'}
+            # Условие на отметку: задачу могли оживить или вернуть в очередь параллельно
+            Job.query.filter(Job.id == job_id, Job.status == 'running',
+                             db.func.coalesce(Job.heartbeat_at, Job.started_at) < deadline).update(
+                values, synchronize_session=False)
+        db.session.commit()
+        return len(stale)
+
+    def _loop(self):
+        poll_interval = self.app.config['JOB_POLL_INTERVAL']
+        while not self._stopping.is_set():
+            try:
+                with self.app.app_context():
+                    # Первая проверка - сразу при запуске, дальше не чаще раза в JOB_STALE_AFTER / 2
+                    if time.monotonic() - self._requeued_at >= self.app.config['JOB_STALE_AFTER'] / 2:
+                        self._requeued_at = time.monotonic()
+                        self.requeue_stale()
+                    ran = self._run_next()
+            except Exception:
+                traceback.print_exc()
+                ran = False
+
+            if not ran:
+                self._wakeup.wait(poll_interval)
+                self._wakeup.clear()
+
+    def _claim_next(self):
+        Job, db = self.model, self.db
+        candidates = Job.query.with_entities(Job.id).filter_by(status='queued') \
+            .order_by(Job.id).limit(5).all()
+        for (job_id,) in candidates:
+            now = datetime.utcnow()
+            claimed = Job.query.filter_by(id=job_id, status='queued').update(
+                {'status': 'running', 'started_at': now, 'heartbeat_at': now})
+            db.session.commit()
+            if claimed:
+                return db.session.get(Job, job_id)
+        return None
+
+    def _run_next(self):
+        job = self._claim_next()
+        if job is None:
+            return False
+
+        Job, db = self.model, self.db
+        job_id = job.id
+        handler = self.handlers.get(job.kind)
+        params = json.loads(job.params) if job.params else {}
+
+        values = {}
+        try:
+            if handler is None:
+                raise ValueError(f"Неизвестный тип задачи: {job.kind}")
+            result = handler(JobContext(self, job_id), **params)
+            values.update(status='done', result=json.dumps(result, ensure_ascii=False, default=str))
+        except JobCancelled:
+            db.session.rollback()
+            values.update(status='cancelled')
+        except Exception as e:
+            db.session.rollback()
+            traceback.print_exc()
+            values.update(status='failed', error=str(e))
+
+        values['finished_at'] = datetime.utcnow()
+        Job.query.filter_by(id=job_id).update(values)
+        db.session.commit()
+        return True
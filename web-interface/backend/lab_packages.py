@@ -0,0 +1,194 @@
+import itertools
+import json
+import os
+import threading
+import time
+import traceback
+
+from answer_checkers import validate_content
+
+# Файлы пакета работы: метаданные читаются при индексации, остальное - при первом обращении
+META_FILE = 'lab.json'
+INSTRUCTIONS_FILE = 'instructions.html'
+TASKS_FILE = 'tasks.json'
+
+# Поля метаданных, которые переносятся в строку Lab
+LAB_FIELDS = ('title', 'description', 'lab_number', 'difficulty', 'order', 'max_score')
+
+# Номера сборок общие для всех пакетов процесса: пакет, заново найденный
+# после удаления, не повторит номер прошлой сборки
+_build_numbers = itertools.count(1)
+
+
+class LabPackageError(Exception):
+    """Пакет работы отсутствует или поврежден"""
+
+
+class LabPackage:
+    """Версионированный пакет работы в каталоге: lab.json, instructions.html, tasks.json.
+
+    Контент собирается в тот же JSON, что хранится в Lab.content: блок "info"
+    с инструкцией (если она есть) и задания. Сборка откладывается до первого
+    обращения и повторяется, когда у одного из файлов меняется mtime; проверка
+    mtime - не чаще раза в check_interval секунд. Если новая версия не
+    собирается (например, tasks.json записан наполовину), отдается прошлая
+    сборка, а ошибка хранится в error.
+    """
+
+    def __init__(self, path, meta, check_interval):
+        self.path = path
+        self.slug = meta['slug']
+        self.meta = meta
+        self.check_interval = check_interval
+        # (номер сборки, контент) - одним кортежем, чтобы читать их без блокировки
+        self._built = None
+        self._stamp = None
+        self.error = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self.meta.get('version', 1)
+
+    @classmethod
+    def load(cls, path, check_interval):
+        meta_path = os.path.join(path, META_FILE)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError) as e:
+            raise LabPackageError(f"{meta_path}: {e}")
+        meta.setdefault('slug', os.path.basename(path))
+        return cls(path, meta, check_interval)
+
+    def content(self):
+        return self.versioned_content()[1]
+
+    def versioned_content(self):
+        """(номер сборки, контент): номер меняется с каждой новой успешной сборкой"""
+        now = time.monotonic()
+        built = self._built
+        if built is not None and now - self._checked < self.check_interval:
+            return built
+
+        with self._lock:
+            stamp = self._file_stamp()
+            if self._built is None or stamp != self._stamp:
+                try:
+                    content = self._build()
+                    self._built = (next(_build_numbers), content)
+                    self.error = None
+                except (OSError, ValueError, LabPackageError) as e:
+                    self.error = f"{self.path}: {e}"
+                    if self._built is None:
+                        raise LabPackageError(self.error)
+                    print(f"Пакет {self.slug} не собирается, используется прошлая версия: {self.error}")
+                # Сборка повторяется только после следующего изменения файлов
+                self._stamp = stamp
+            self._checked = now
+            return self._built
+
+    def _file_stamp(self):
+        stamp = []
+        for name in (META_FILE, INSTRUCTIONS_FILE, TASKS_FILE):
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except FileNotFoundError:
+                stamp.append(None)
+            else:
+                stamp.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(stamp)
+
+    def _read(self, name):
+        try:
+            with open(os.path.join(self.path, name), encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _build(self):
+        # Метаданные перечитываются вместе с контентом: версия и заголовок меняются вместе
+        meta = json.loads(self._read(META_FILE) or '{}')
+        meta.setdefault('slug', self.slug)
+
+        items = []
+        instructions = self._read(INSTRUCTIONS_FILE)
+        if instructions is not None:
+            items.append({'type': 'info', 'title': meta.get('title'), 'content': instructions})
+
+        tasks = json.loads(self._read(TASKS_FILE) or '[]')
+        if not isinstance(tasks, list):
+            raise LabPackageError(f"{os.path.join(self.path, TASKS_FILE)}: ожидается список заданий")
+        items.extend(tasks)
+        content = json.dumps(items, ensure_ascii=False)
+        # Ошибка в поле check - ошибка сборки: отдается прошлая версия пакета
+        validate_content(content)
+        self.meta = meta
+        return content
+
+
+class LabPackageRegistry:
+    """Индекс пакетов работ в каталоге LAB_PACKAGES_DIR.
+
+    Читаются только lab.json; каталог просматривается заново не чаще раза
+    в LAB_PACKAGES_CHECK_INTERVAL секунд, поэтому пакеты, добавленные после
+    запуска (flask labs-sync в другом процессе), видны всем воркерам.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._packages = {}
+        self._scanned = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.rescan()
+
+    def rescan(self):
+        root = self.app.config['LAB_PACKAGES_DIR']
+        interval = self.app.config['LAB_PACKAGES_CHECK_INTERVAL']
+        packages = {}
+        # Уже проиндексированные пакеты сохраняют загруженный контент
+        known = {package.path: package for package in self._packages.values()}
+        if os.path.isdir(root):
+            for name in sorted(os.listdir(root)):
+                path = os.path.join(root, name)
+                if not os.path.isfile(os.path.join(path, META_FILE)):
+                    continue
+                package = known.get(path) or LabPackage.load(path, interval)
+                packages[package.slug] = package
+
+        with self._lock:
+            self._packages = packages
+            self._scanned = time.monotonic()
+        return list(packages.values())
+
+    def _refresh(self):
+        if time.monotonic() - self._scanned < self.app.config['LAB_PACKAGES_CHECK_INTERVAL']:
+            return
+        self._scanned = time.monotonic()
+        try:
+            self.rescan()
+        except LabPackageError:
+            # Новый пакет с поврежденным lab.json: остаются уже известные пакеты
+            traceback.print_exc()
+
+    def get(self, slug):
+        self._refresh()
+        return self._packages.get(slug)
+
+    def packages(self):
+        self._refresh()
+        return sorted(self._packages.values(), key=lambda package: package.meta.get('order', 0))
+
+    def versioned_content(self, slug):
+        self._refresh()
+        package = self._packages.get(slug)
+        if package is None:
+            raise LabPackageError(f"Пакет работы не найден: {slug}")
+        return package.versioned_content()
+
+
+lab_packages = LabPackageRegistry()
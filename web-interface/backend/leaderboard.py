@@ -0,0 +1,324 @@
+import random
+import threading
+
+# Таблица по сумме баллов за все работы рейтинга (остальные таблицы - по id работы)
+TOTAL = 'total'
+
+
+class _Node:
+    __slots__ = ('key', 'priority', 'left', 'right', 'size')
+
+    def __init__(self, key):
+        self.key = key
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.size = 1
+
+
+def _size(node):
+    return node.size if node is not None else 0
+
+
+def _update(node):
+    node.size = 1 + _size(node.left) + _size(node.right)
+    return node
+
+
+def _split(node, key):
+    """Делит дерево на ключи < key и >= key"""
+    if node is None:
+        return None, None
+    if node.key < key:
+        left, right = _split(node.right, key)
+        node.right = left
+        return _update(node), right
+    left, right = _split(node.left, key)
+    node.left = right
+    return left, _update(node)
+
+
+def _merge(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        return _update(left)
+    right.left = _merge(left, right.left)
+    return _update(right)
+
+
+def _remove(node, key):
+    if node is None:
+        return None
+    if key < node.key:
+        node.left = _remove(node.left, key)
+    elif node.key < key:
+        node.right = _remove(node.right, key)
+    else:
+        return _merge(node.left, node.right)
+    return _update(node)
+
+
+class OrderStatisticTree:
+    """Декартово дерево с размерами поддеревьев: вставка, удаление, позиция
+    ключа и ключ по позиции - O(log N) в среднем.
+    """
+
+    def __init__(self):
+        self._root = None
+
+    @classmethod
+    def from_sorted(cls, keys):
+        """Дерево из отсортированных уникальных ключей за O(N)"""
+        tree = cls()
+        nodes = [_Node(key) for key in keys]
+        levels = []
+
+        def build(start, stop, depth):
+            if start >= stop:
+                return None
+            middle = (start + stop) // 2
+            node = nodes[middle]
+            if depth == len(levels):
+                levels.append([])
+            levels[depth].append(node)
+            node.left = build(start, middle, depth + 1)
+            node.right = build(middle + 1, stop, depth + 1)
+            return _update(node)
+
+        tree._root = build(0, len(nodes), 0)
+        # Приоритеты убывают от корня к листьям: сбалансированное дерево - корректная куча
+        priorities = sorted((random.random() for _ in nodes), reverse=True)
+        for node, priority in zip((node for level in levels for node in level), priorities):
+            node.priority = priority
+        return tree
+
+    def __len__(self):
+        return _size(self._root)
+
+    def insert(self, key):
+        left, right = _split(self._root, key)
+        self._root = _merge(_merge(left, _Node(key)), right)
+
+    def remove(self, key):
+        self._root = _remove(self._root, key)
+
+    def rank(self, key):
+        """Число ключей меньше key"""
+        node, rank = self._root, 0
+        while node is not None:
+            if node.key < key:
+                rank += _size(node.left) + 1
+                node = node.right
+            else:
+                node = node.left
+        return rank
+
+    def select(self, index):
+        """Ключ на позиции index (с нуля)"""
+        node = self._root
+        while node is not None:
+            left = _size(node.left)
+            if index < left:
+                node = node.left
+            elif index == left:
+                return node.key
+            else:
+                index -= left + 1
+                node = node.right
+        raise IndexError(index)
+
+    def slice(self, start, stop):
+        start, stop = max(start, 0), min(stop, len(self))
+        return [self.select(index) for index in range(start, stop)]
+
+
+class Leaderboard:
+    """Рейтинг студентов по работам в памяти процесса.
+
+    Для каждой работы и для суммы по работам (TOTAL) есть общая таблица и
+    таблицы групп. Порядок: больше балл, затем меньше время, затем id студента.
+    Изменение результата студента - удаление и вставка ключа в несколько
+    деревьев, O(log N); позиция, процентиль и соседи - O(log N) на строку.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.generation = None
+        self.positions = {}
+        self.lab_ids = frozenset()
+        self.synced_at = 0.0
+        self._students = {}
+        self._boards = {}
+
+    @property
+    def loaded(self):
+        return self.generation is not None
+
+    def rebuild(self, results, lab_ids, generation, positions):
+        """results - (student_id, group, lab_id, score, total_time) завершенных работ из lab_ids.
+
+        generation и positions (позиции в журнале событий по шардам) хранятся
+        для последующей синхронизации.
+        """
+        students = {}
+        for student_id, group, lab_id, score, total_time in results:
+            student = students.setdefault(student_id, {'group': group, 'labs': {}})
+            student['labs'][lab_id] = (score or 0, total_time or 0)
+
+        board_keys = {}
+        for student_id, student in students.items():
+            for lab_id, key in self._keys(student_id, student).items():
+                for board in self._student_boards(lab_id, student):
+                    board_keys.setdefault(board, []).append(key)
+        boards = {board: OrderStatisticTree.from_sorted(sorted(keys)) for board, keys in board_keys.items()}
+
+        with self.lock:
+            self._students = students
+            self._boards = boards
+            self.lab_ids = frozenset(lab_ids)
+            self.generation = generation
+            self.positions = dict(positions)
+
+    def reset(self):
+        with self.lock:
+            self._students = {}
+            self._boards = {}
+            self.generation = None
+            self.positions = {}
+            self.lab_ids = frozenset()
+            self.synced_at = 0.0
+
+    def record(self, student_id, group, lab_id, score, total_time=None):
+        """Новый результат студента по работе; total_time=None - время не меняется"""
+        with self.lock:
+            self._set_result(student_id, group, lab_id, score, total_time)
+
+    def remove_student(self, student_id):
+        with self.lock:
+            student = self._students.pop(student_id, None)
+            if student is not None:
+                self._unlink(student_id, student)
+
+    def move_student(self, student_id, group):
+        """Перевод студента в другую группу: его ключи переходят в таблицы новой группы"""
+        with self.lock:
+            student = self._students.get(student_id)
+            if student is None or student['group'] == group:
+                return
+            self._unlink(student_id, student)
+            student['group'] = group
+            self._link(student_id, student)
+
+    def knows(self, student_id):
+        return student_id in self._students
+
+    def group_of(self, student_id):
+        student = self._students.get(student_id)
+        return student['group'] if student is not None else None
+
+    def _set_result(self, student_id, group, lab_id, score, total_time):
+        student = self._students.get(student_id)
+        if student is None:
+            student = self._students[student_id] = {'group': group, 'labs': {}}
+            only = None
+        elif student['group'] != group:
+            self._unlink(student_id, student)
+            only = None
+        else:
+            # Меняются только таблицы этой работы и суммы
+            only = (lab_id, TOTAL)
+            self._unlink(student_id, student, only)
+
+        if total_time is None:
+            total_time = student['labs'].get(lab_id, (0, 0))[1]
+        student['group'] = group
+        student['labs'][lab_id] = (score or 0, total_time or 0)
+        self._link(student_id, student, only)
+
+    def _keys(self, student_id, student):
+        labs = student['labs']
+        keys = {lab_id: (-score, total_time, student_id) for lab_id, (score, total_time) in labs.items()}
+        keys[TOTAL] = (-sum(score for score, _ in labs.values()),
+                       sum(total_time for _, total_time in labs.values()), student_id)
+        return keys
+
+    @staticmethod
+    def _student_boards(lab_id, student):
+        # Студент без группы есть только в общей таблице
+        if student['group'] is None:
+            return ((lab_id, None),)
+        return ((lab_id, None), (lab_id, student['group']))
+
+    def _link(self, student_id, student, only=None):
+        for lab_id, key in self._keys(student_id, student).items():
+            if only is not None and lab_id not in only:
+                continue
+            for board in self._student_boards(lab_id, student):
+                tree = self._boards.get(board)
+                if tree is None:
+                    tree = self._boards[board] = OrderStatisticTree()
+                tree.insert(key)
+
+    def _unlink(self, student_id, student, only=None):
+        for lab_id, key in self._keys(student_id, student).items():
+            if only is not None and lab_id not in only:
+                continue
+            for board in self._student_boards(lab_id, student):
+                self._boards[board].remove(key)
+
+    def size(self, lab_id, group=None):
+        tree = self._boards.get((lab_id, group))
+        return len(tree) if tree is not None else 0
+
+    def top(self, lab_id, group=None, limit=10):
+        with self.lock:
+            tree = self._boards.get((lab_id, group))
+            if tree is None:
+                return []
+            return [self._entry(key, index) for index, key in enumerate(tree.slice(0, limit))]
+
+    def position(self, lab_id, student_id, group=None):
+        """Место студента (с 1), размер таблицы и процентиль; None, если студента в ней нет"""
+        with self.lock:
+            tree, key = self._locate(lab_id, student_id, group)
+            if key is None:
+                return None
+            size = len(tree)
+            place = tree.rank(key) + 1
+            return {
+                'position': place,
+                'size': size,
+                # Доля студентов таблицы с таким же или худшим результатом
+                'percentile': round((size - place + 1) / size * 100, 1),
+                'score': -key[0],
+                'total_time': key[1]
+            }
+
+    def around(self, lab_id, student_id, group=None, radius=3):
+        with self.lock:
+            tree, key = self._locate(lab_id, student_id, group)
+            if key is None:
+                return None
+            index = tree.rank(key)
+            start = max(index - radius, 0)
+            return [self._entry(neighbour, start + offset)
+                    for offset, neighbour in enumerate(tree.slice(start, index + radius + 1))]
+
+    def _locate(self, lab_id, student_id, group):
+        student = self._students.get(student_id)
+        if student is None:
+            return None, None
+        if group is not None and student['group'] != group:
+            return None, None
+        key = self._keys(student_id, student).get(lab_id)
+        if key is None:
+            return None, None
+        return self._boards[(lab_id, group)], key
+
+    @staticmethod
+    def _entry(key, index):
+        return {'position': index + 1, 'student_id': key[2], 'score': -key[0], 'total_time': key[1]}
@@ -0,0 +1,171 @@
+import os
+import sqlite3
+import time
+
+
+class MaintenanceError(Exception):
+    """Операцию нельзя выполнить без явного разрешения или в текущем состоянии базы"""
+
+
+class _BackupRestarted(Exception):
+    pass
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute('PRAGMA busy_timeout=30000')
+    return conn
+
+
+def _page_stats(conn):
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+    freelist = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    return page_size, page_count, freelist
+
+
+def _file_size(path):
+    return sum(os.path.getsize(p) for p in (path, path + '-wal') if os.path.exists(p))
+
+
+def backup_database(path, dest, step_pages=256, pause=0.005, progress=None, max_restarts=3):
+    """Онлайн-копия через backup API SQLite.
+
+    Копирование идет порциями по step_pages страниц с паузой между ними:
+    блокировка чтения держится только на время одной порции, и запись
+    студентов не ждет окончания всей копии. Запись другого соединения между
+    порциями начинает копию заново; после max_restarts перезапусков копия
+    снимается одним VACUUM INTO - он читает один снимок WAL и запись не останавливает.
+    """
+    started = time.perf_counter()
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+
+    source = _connect(path)
+    steps = 0
+    restarts = 0
+    copied = 0
+
+    def on_step(status, remaining, total):
+        nonlocal steps, restarts, copied
+        steps += 1
+        if total - remaining < copied:
+            restarts += 1
+            if restarts > max_restarts:
+                raise _BackupRestarted()
+        copied = total - remaining
+        if progress:
+            progress(copied, total)
+
+    try:
+        target = sqlite3.connect(dest)
+        try:
+            source.backup(target, pages=step_pages, progress=on_step, sleep=pause)
+            method = 'backup'
+        except _BackupRestarted:
+            method = 'vacuum_into'
+        finally:
+            target.close()
+
+        if method == 'vacuum_into':
+            os.remove(dest)
+            source.execute('VACUUM INTO ?', (dest,))
+
+        target = sqlite3.connect(dest)
+        try:
+            integrity = target.execute('PRAGMA quick_check').fetchone()[0]
+        finally:
+            target.close()
+    finally:
+        source.close()
+
+    return {
+        'dest': dest,
+        'size': os.path.getsize(dest),
+        'method': method,
+        'steps': steps,
+        'restarts': restarts,
+        'integrity': integrity,
+        'seconds': time.perf_counter() - started
+    }
+
+
+def optimize_database(path):
+    """ANALYZE и PRAGMA optimize: свежая статистика для планировщика запросов"""
+    started = time.perf_counter()
+    conn = _connect(path)
+    try:
+        conn.execute('ANALYZE')
+        conn.execute('PRAGMA optimize')
+    finally:
+        conn.close()
+    return {'seconds': time.perf_counter() - started}
+
+
+def vacuum_database(path, pages=0, full=False):
+    """Возврат свободных страниц после удалений.
+
+    Основной режим - PRAGMA incremental_vacuum(pages) (0 - все свободные страницы),
+    он не перестраивает файл и держит блокировку записи недолго. full=True -
+    полный VACUUM: файл перестраивается целиком, запись в базу ждет до конца.
+    Для базы без auto_vacuum=INCREMENTAL он нужен один раз, чтобы включить режим;
+    без full такая база не трогается (MaintenanceError).
+    """
+    started = time.perf_counter()
+    size_before = _file_size(path)
+    conn = _connect(path)
+    try:
+        page_size, pages_before, free_before = _page_stats(conn)
+        auto_vacuum = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+        if auto_vacuum != 2 and not full:
+            raise MaintenanceError('База создана без auto_vacuum=INCREMENTAL: режим включается '
+                                   'один раз полным VACUUM (--full), который блокирует запись '
+                                   'на все время перестройки файла')
+
+        if full:
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.execute('VACUUM')
+            mode = 'full'
+        else:
+            conn.execute(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+            mode = 'incremental'
+
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        _, pages_after, free_after = _page_stats(conn)
+    finally:
+        conn.close()
+
+    return {
+        'mode': mode,
+        'pages_before': pages_before,
+        'pages_after': pages_after,
+        'free_pages_before': free_before,
+        'free_pages_after': free_after,
+        'reclaimed_bytes': (pages_before - pages_after) * page_size,
+        'file_bytes_before': size_before,
+        'file_bytes_after': _file_size(path),
+        'seconds': time.perf_counter() - started
+    }
+
+
+def check_integrity(path, quick=False):
+    """integrity_check (или quick_check) и проверка внешних ключей"""
+    started = time.perf_counter()
+    conn = _connect(path)
+    try:
+        pragma = 'quick_check' if quick else 'integrity_check'
+        problems = [row[0] for row in conn.execute(f'PRAGMA {pragma}')]
+        if problems == ['ok']:
+            problems = []
+        foreign_keys = conn.execute('PRAGMA foreign_key_check').fetchall()
+    finally:
+        conn.close()
+
+    return {
+        'ok': not problems and not foreign_keys,
+        'problems': problems,
+        'foreign_key_violations': [
+            {'table': table, 'rowid': rowid, 'parent': parent}
+            for table, rowid, parent, _ in foreign_keys
+        ],
+        'seconds': time.perf_counter() - started
+    }
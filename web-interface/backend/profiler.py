@@ -0,0 +1,219 @@
+import fnmatch
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Сколько разных SQL-запросов и профилированных HTTP-запросов хранить в одном сеансе
+MAX_SQL_STATEMENTS = 500
+MAX_REQUESTS_LOG = 1000
+
+
+class ProfilerBusy(Exception):
+    """Сеанс профилирования уже идет"""
+
+
+class ProfileSession:
+    """Один сеанс: выборки стеков, SQL и список профилированных запросов"""
+
+    def __init__(self, seconds, pattern, max_requests, interval):
+        self.seconds = seconds
+        self.pattern = pattern
+        self.max_requests = max_requests
+        self.interval = interval
+        self.started_at = time.time()
+        self.finished_at = None
+        self.stacks = Counter()
+        self.samples = 0
+        self.sql = {}
+        self.requests = []
+        self.remaining = max_requests
+        self.threads = {}
+        self.done = threading.Event()
+
+    def matches(self, path, endpoint):
+        if not self.pattern:
+            return True
+        return fnmatch.fnmatch(path, self.pattern) or fnmatch.fnmatch(endpoint or '', self.pattern)
+
+    def to_dict(self, top=20):
+        return {
+            'status': 'done' if self.done.is_set() else 'running',
+            'seconds': self.seconds,
+            'endpoint': self.pattern,
+            'max_requests': self.max_requests,
+            'interval_ms': self.interval * 1000,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'samples': self.samples,
+            'requests': list(self.requests),
+            'top_stacks': [
+                {'stack': stack.split(';'), 'samples': count}
+                for stack, count in self.stacks.most_common(top)
+            ],
+            'sql': sorted(
+                ({'statement': statement, 'count': count, 'total_ms': round(total * 1000, 2)}
+                 for statement, (count, total) in self.sql.items()),
+                key=lambda item: item['total_ms'], reverse=True
+            )
+        }
+
+
+class SamplingProfiler:
+    """Профилировщик по требованию: снимки стеков потоков запросов раз в interval секунд.
+
+    Профилируются либо все запросы в течение seconds секунд, либо следующие
+    max_requests запросов, путь или имя эндпоинта которых подходит под шаблон.
+    Выборка идет из отдельного потока через sys._current_frames(), поэтому сами
+    обработчики не замедляются трассировкой; SQL фиксируется событиями движка
+    только в профилируемых потоках. Состояние у каждого процесса свое.
+    """
+
+    def __init__(self):
+        self._session = None
+        self._lock = threading.Lock()
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def start(self, seconds=None, pattern=None, max_requests=None, interval=0.005):
+        with self._lock:
+            if self._session is not None and not self._session.done.is_set():
+                raise ProfilerBusy()
+            profile = self._session = ProfileSession(seconds, pattern, max_requests, interval)
+
+        threading.Thread(target=self._sample, args=(profile,), name='profiler', daemon=True).start()
+        return profile
+
+    def stop(self):
+        profile = self._session
+        if profile is not None:
+            self._finish(profile)
+        return profile
+
+    def current(self):
+        return self._session
+
+    def reset(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.done.set()
+            self._session = None
+
+    def request_started(self, method, path, endpoint):
+        profile = self._session
+        if profile is None or profile.done.is_set() or not profile.matches(path, endpoint):
+            return
+
+        with self._lock:
+            if profile.remaining is not None:
+                if profile.remaining <= 0:
+                    return
+                profile.remaining -= 1
+            profile.threads[threading.get_ident()] = {
+                'method': method,
+                'path': path,
+                'endpoint': endpoint,
+                'started': time.perf_counter(),
+                'sql_count': 0,
+                'sql_ms': 0.0
+            }
+
+    def request_finished(self, status_code):
+        profile = self._session
+        if profile is None:
+            return
+
+        with self._lock:
+            info = profile.threads.pop(threading.get_ident(), None)
+            if info is None:
+                return
+            if len(profile.requests) < MAX_REQUESTS_LOG:
+                profile.requests.append({
+                    'method': info['method'],
+                    'path': info['path'],
+                    'endpoint': info['endpoint'],
+                    'status': status_code,
+                    'ms': round((time.perf_counter() - info.pop('started')) * 1000, 2),
+                    'sql_count': info['sql_count'],
+                    'sql_ms': round(info['sql_ms'], 2)
+                })
+            last_request = (profile.max_requests is not None and profile.remaining == 0
+                            and not profile.threads)
+
+        if last_request:
+            self._finish(profile)
+
+    def report(self, profile, top=20):
+        with self._lock:
+            return profile.to_dict(top)
+
+    def collapsed(self, profile):
+        """Стеки в свернутом формате: 'кадр;кадр;кадр число' (flamegraph.pl, speedscope)"""
+        with self._lock:
+            return ''.join(f'{stack} {count}\n' for stack, count in profile.stacks.most_common())
+
+    def _finish(self, profile):
+        with self._lock:
+            if profile.done.is_set():
+                return
+            profile.finished_at = time.time()
+            profile.threads.clear()
+            profile.done.set()
+
+    def _sample(self, profile):
+        deadline = time.monotonic() + profile.seconds if profile.seconds else None
+        while not profile.done.wait(profile.interval):
+            if deadline is not None and time.monotonic() >= deadline:
+                self._finish(profile)
+                break
+
+            with self._lock:
+                threads = list(profile.threads)
+            if not threads:
+                continue
+
+            frames = sys._current_frames()
+            stacks = [_collapse(frames[ident]) for ident in threads if ident in frames]
+            del frames
+            with self._lock:
+                profile.stacks.update(stacks)
+                profile.samples += len(stacks)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        profile = self._session
+        if profile is None or threading.get_ident() not in profile.threads:
+            return
+        conn.info.setdefault('profiler_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        profile = self._session
+        if profile is None:
+            return
+        info = profile.threads.get(threading.get_ident())
+        started = conn.info.get('profiler_started')
+        if info is None or not started:
+            return
+
+        elapsed = time.perf_counter() - started.pop()
+        info['sql_count'] += 1
+        info['sql_ms'] += elapsed * 1000
+        with self._lock:
+            count, total = profile.sql.get(statement, (0, 0.0))
+            if count or len(profile.sql) < MAX_SQL_STATEMENTS:
+                profile.sql[statement] = (count + 1, total + elapsed)
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+profiler = SamplingProfiler()
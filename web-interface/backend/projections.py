@@ -0,0 +1,241 @@
+import abc
+import json
+import threading
+import traceback
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.sqlite import insert
+
+from shards import shard_router, use_shard
+
+# Типы событий журнала активности
+LAB_STARTED = 'lab_started'
+ANSWER_SUBMITTED = 'answer_submitted'
+LAB_COMPLETED = 'lab_completed'
+# Периодические отметки времени от клиента (старые записи журнала)
+TIME_HEARTBEAT = 'time_heartbeat'
+WORKSPACE_CHANGED = 'workspace_changed'
+SCORE_RECALCULATED = 'score_recalculated'
+STUDENT_REMOVED = 'student_removed'
+STUDENT_GROUP_CHANGED = 'student_group_changed'
+
+
+class Projection(abc.ABC):
+    """Модель чтения, которая строится из журнала событий.
+
+    apply() получает пачку событий по возрастанию id и обновляет свои таблицы
+    в текущей транзакции; reset() очищает их перед полным проигрыванием журнала.
+    """
+
+    name = None
+
+    def __init__(self, table):
+        self.table = table
+
+    def reset(self, session):
+        session.execute(delete(self.table))
+
+    @abc.abstractmethod
+    def apply(self, session, events):
+        """Обновление таблиц модели по пачке событий"""
+
+
+class StudentLabProjection(Projection):
+    """Состояние студента по работе: статус, балл, ответы и время.
+
+    Сводки по работам (статистика) и по студентам (ведомость) - GROUP BY по этой
+    узкой таблице вместо разбора прогресса и попыток на каждый запрос.
+    """
+
+    name = 'student_lab'
+    COLUMNS = ('status', 'score', 'answers', 'correct_answers', 'elapsed_time',
+               'started_at', 'completed_at', 'last_event_at')
+
+    def apply(self, session, events):
+        table = self.table
+        student_ids = {event.student_id for event in events}
+        rows = {
+            (row.student_id, row.lab_id): dict(row._mapping)
+            for row in session.execute(select(table).where(table.c.student_id.in_(student_ids)))
+        }
+        removed = set()
+
+        for event in events:
+            if event.kind == STUDENT_REMOVED:
+                removed.add(event.student_id)
+                for key in [key for key in rows if key[0] == event.student_id]:
+                    del rows[key]
+                continue
+            if event.kind == STUDENT_GROUP_CHANGED:
+                # Группа не хранится в модели чтения
+                continue
+
+            key = (event.student_id, event.lab_id)
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = {
+                    'student_id': event.student_id, 'lab_id': event.lab_id, 'status': 'not_started',
+                    'score': 0, 'answers': 0, 'correct_answers': 0, 'elapsed_time': 0,
+                    'started_at': None, 'completed_at': None, 'last_event_at': None
+                }
+            payload = json.loads(event.payload) if event.payload else {}
+
+            if event.kind == LAB_STARTED:
+                if row['status'] != 'completed':
+                    row['status'] = 'in_progress'
+                row['started_at'] = row['started_at'] or event.created_at
+            elif event.kind == ANSWER_SUBMITTED:
+                row['answers'] += 1
+                if payload.get('is_correct'):
+                    row['correct_answers'] += 1
+            elif event.kind == TIME_HEARTBEAT:
+                row['elapsed_time'] = payload.get('elapsed_time', row['elapsed_time'])
+            elif event.kind == WORKSPACE_CHANGED:
+                row['elapsed_time'] = payload.get('active_time', row['elapsed_time'])
+            elif event.kind == LAB_COMPLETED:
+                row['status'] = 'completed'
+                row['score'] = payload.get('score', 0)
+                row['elapsed_time'] = payload.get('total_time', row['elapsed_time'])
+                row['completed_at'] = event.created_at
+            elif event.kind == SCORE_RECALCULATED:
+                row['score'] = payload.get('score', row['score'])
+            row['last_event_at'] = event.created_at
+
+        if removed:
+            session.execute(delete(table).where(table.c.student_id.in_(removed)))
+        if rows:
+            statement = insert(table)
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.student_id, table.c.lab_id],
+                set_={column: statement.excluded[column] for column in self.COLUMNS}
+            )
+            session.execute(statement, list(rows.values()))
+
+
+class ProjectionRunner:
+    """Инкрементальное обновление моделей чтения по журналу событий.
+
+    Для каждой проекции в каждом шарде хранится позиция - id последнего
+    примененного события. Фоновый поток воркера раз в interval секунд применяет
+    новые события пачками; позиция сдвигается условным UPDATE, поэтому если два
+    воркера обработали одну пачку, изменения второго откатываются.
+    """
+
+    def __init__(self, app, db, event_model, checkpoint_model, projections):
+        self.app = app
+        self.db = db
+        self.event_model = event_model
+        self.checkpoint_model = checkpoint_model
+        self.projections = {projection.name: projection for projection in projections}
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def catch_up(self, names=None, report=None):
+        """Применяет все новые события; возвращает число обработанных"""
+        processed = 0
+        for shard in shard_router.names():
+            use_shard(shard)
+            for name in names or self.projections:
+                while True:
+                    count = self._apply_batch(self.projections[name])
+                    processed += count
+                    if report and count:
+                        report(processed)
+                    if count < self.app.config['PROJECTION_BATCH_SIZE']:
+                        break
+        return processed
+
+    def rebuild(self, name, report=None):
+        """Очистка модели чтения и проигрывание журнала с начала во всех шардах"""
+        projection = self.projections[name]
+        session = self.db.session
+        for shard in shard_router.names():
+            use_shard(shard)
+            self._position(projection)
+            projection.reset(session)
+            session.execute(
+                update(self.checkpoint_model.__table__)
+                .where(self.checkpoint_model.name == name)
+                .values(position=0)
+            )
+            session.commit()
+        return self.catch_up([name], report=report)
+
+    def lag(self):
+        """Число событий, еще не примененных каждой проекцией (по всем шардам)"""
+        event, checkpoint = self.event_model, self.checkpoint_model
+        totals = dict.fromkeys(self.projections, 0)
+        for rows in shard_router.fan_out(lambda conn: (
+            conn.execute(select(self.db.func.max(event.id))).scalar() or 0,
+            dict(conn.execute(select(checkpoint.name, checkpoint.position)).all())
+        )):
+            last_id, positions = rows
+            for name in totals:
+                totals[name] += last_id - positions.get(name, 0)
+        return totals
+
+    def _position(self, projection):
+        checkpoint = self.checkpoint_model
+        session = self.db.session
+        position = session.execute(
+            select(checkpoint.position).where(checkpoint.name == projection.name)
+        ).scalar()
+        if position is None:
+            session.execute(insert(checkpoint.__table__)
+                            .values(name=projection.name, position=0)
+                            .on_conflict_do_nothing())
+            position = 0
+        return position
+
+    def _apply_batch(self, projection):
+        event, checkpoint = self.event_model, self.checkpoint_model
+        session = self.db.session
+        position = self._position(projection)
+
+        events = session.execute(
+            select(event.id, event.student_id, event.lab_id, event.kind, event.payload, event.created_at)
+            .where(event.id > position)
+            .order_by(event.id)
+            .limit(self.app.config['PROJECTION_BATCH_SIZE'])
+        ).all()
+        if not events:
+            session.commit()
+            return 0
+
+        projection.apply(session, events)
+        moved = session.execute(
+            update(checkpoint.__table__)
+            .where(checkpoint.name == projection.name, checkpoint.position == position)
+            .values(position=events[-1].id)
+        ).rowcount
+        if moved != 1:
+            # Эту пачку уже применил другой воркер
+            session.rollback()
+            return 0
+
+        session.commit()
+        return len(events)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._loop, name='projections', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._thread = None
+
+    def reset(self):
+        """После fork поток родителя не существует: забываем о нем"""
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def _loop(self):
+        while not self._stopping.wait(self.app.config['PROJECTION_INTERVAL']):
+            try:
+                with self.app.app_context():
+                    self.catch_up()
+            except Exception:
+                traceback.print_exc()
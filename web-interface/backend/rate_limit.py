@@ -0,0 +1,169 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, jsonify, request, session
+
+from shared_cache import thread_connection
+
+# Корзина, не использовавшаяся час, уже наполнилась и не отличается от новой
+IDLE_SECONDS = 3600
+
+
+class LocalBucketStore:
+    """Корзины токенов в памяти процесса (один воркер)"""
+
+    MAX_KEYS = 50000
+
+    def __init__(self):
+        # Порядок - от давно не использованных корзин к недавним
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, now):
+        """Забирает один токен. Возвращает 0, если запрос разрешен, иначе секунды до следующего токена"""
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / rate
+
+            self._prune(now)
+
+        return wait
+
+    def _prune(self, now):
+        # Снимаем с головы простаивающие корзины, а сверх MAX_KEYS - самые давние.
+        # Каждый ключ удаляется один раз, поэтому в среднем это O(1) на запрос
+        while self._buckets:
+            key, (tokens, updated) = next(iter(self._buckets.items()))
+            if len(self._buckets) <= self.MAX_KEYS and now - updated <= IDLE_SECONDS:
+                break
+            del self._buckets[key]
+
+
+class SqliteBucketStore:
+    """Корзины токенов в общем SQLite-файле: лимиты действуют на все воркеры сразу"""
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS buckets ('
+        'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS buckets_updated ON buckets (updated)'
+    )
+    # Как часто (в секундах) процесс удаляет простаивающие корзины из файла
+    PRUNE_INTERVAL = 60
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._next_prune = 0.0
+
+    def _connection(self):
+        return thread_connection(self._local, self.path, self.SCHEMA)
+
+    def take(self, key, rate, burst, now):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / rate
+
+            conn.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                         (key, tokens, now))
+            if now >= self._next_prune:
+                self._next_prune = now + self.PRUNE_INTERVAL
+                conn.execute('DELETE FROM buckets WHERE updated < ?', (now - IDLE_SECONDS,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return wait
+
+
+class RateLimiter:
+    """Ограничение частоты запросов по схеме token bucket.
+
+    Бюджеты задаются в app.config['RATE_LIMITS']: {класс: {'rate': токенов/с, 'burst': емкость,
+    'key': 'user' | 'ip' | 'ip_username'}}; 'ip_username' - адрес и логин из тела запроса,
+    чтобы класс за одним NAT не делил одну корзину входа. Если задан app.config['RATE_LIMIT_STORAGE'], корзины хранятся
+    в общем SQLite-файле и лимит действует на все воркеры, иначе - в памяти процесса.
+    """
+
+    def __init__(self):
+        self._store = None
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def reset(self):
+        with self._lock:
+            self._store = None
+            self.stats = {}
+
+    def _get_store(self):
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    path = current_app.config.get('RATE_LIMIT_STORAGE')
+                    self._store = SqliteBucketStore(path) if path else LocalBucketStore()
+        return self._store
+
+    def _count(self, budget_name, outcome):
+        with self._lock:
+            counters = self.stats.setdefault(budget_name, {'allowed': 0, 'limited': 0})
+            counters[outcome] += 1
+
+    def snapshot(self):
+        """Счетчики разрешенных и отклоненных запросов текущего процесса по бюджетам"""
+        with self._lock:
+            return {name: dict(counters) for name, counters in self.stats.items()}
+
+    def check(self, budget_name):
+        """Возвращает 0, если запрос можно выполнить, иначе рекомендуемую паузу в секундах"""
+        if not current_app.config.get('RATE_LIMIT_ENABLED', True):
+            return 0
+
+        budget = current_app.config['RATE_LIMITS'][budget_name]
+        if budget.get('key') == 'ip_username':
+            data = request.get_json(silent=True)
+            username = data.get('username') if isinstance(data, dict) else None
+            client = f"ip:{request.remote_addr}:{str(username or '').strip().casefold()[:100]}"
+        elif budget.get('key') == 'ip' or 'user_id' not in session:
+            client = f"ip:{request.remote_addr}"
+        else:
+            client = f"user:{session['user_id']}"
+
+        wait = self._get_store().take(f"{budget_name}:{client}", budget['rate'], budget['burst'],
+                                      time.time())
+        self._count(budget_name, 'limited' if wait else 'allowed')
+        return wait
+
+    def limited_response(self, wait):
+        response = jsonify({'success': False, 'error': 'Слишком много запросов, повторите позже'})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(max(1, math.ceil(wait)))
+        return response
+
+    def limit(self, budget_name):
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                wait = self.check(budget_name)
+                if wait:
+                    return self.limited_response(wait)
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
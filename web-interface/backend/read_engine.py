@@ -0,0 +1,82 @@
+import threading
+
+import sqlalchemy as sa
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+
+from shards import READ_ONLY_FLAG, configure_read_only, shard_router
+
+
+class ReadEngine:
+    """Отдельный движок с собственным пулом соединений для аналитических запросов.
+
+    Соединения SQLite открываются с PRAGMA query_only, а каждая транзакция
+    начинается явным BEGIN, поэтому все запросы одного обработчика читают
+    один WAL-снимок и не задерживают запись студентов.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.db = None
+        self._engine = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db):
+        self.app = app
+        self.db = db
+
+    def get(self):
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._engine = self._create_engine()
+        return self._engine
+
+    def dispose(self):
+        with self._lock:
+            if self._engine is not None:
+                self._engine.dispose()
+            self._engine = None
+
+    def _create_engine(self):
+        url = self.db.engine.url
+        pool_size = self.app.config['READ_ENGINE_POOL_SIZE']
+
+        if url.get_backend_name() != 'sqlite':
+            return sa.create_engine(url, pool_size=pool_size, max_overflow=pool_size)
+
+        if url.database in (None, '', ':memory:'):
+            # Базу в памяти второе соединение не увидит
+            return self.db.engine
+
+        engine = sa.create_engine(url, poolclass=sa.pool.QueuePool, pool_size=pool_size,
+                                  max_overflow=pool_size, connect_args={'check_same_thread': False})
+
+        configure_read_only(engine)
+        return engine
+
+
+read_engine = ReadEngine()
+
+
+class RoutingSession(Session):
+    """Сессия, которая в режиме чтения отправляет SELECT в движок только для чтения.
+
+    Запись (flush) всегда идет через основной движок. Запросы к таблицам
+    студентов идут в шард текущего контекста (см. shards.py), в режиме
+    чтения - через движок шарда только для чтения.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        read_only = bind is None and not self._flushing and has_app_context() and bool(g.get(READ_ONLY_FLAG))
+        if bind is None:
+            shard_bind = shard_router.bind_for(mapper, clause, read_only)
+            if shard_bind is not None:
+                return shard_bind
+        if read_only:
+            return read_engine.get()
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def use_read_engine():
+    setattr(g, READ_ONLY_FLAG, True)
@@ -0,0 +1,84 @@
+# Правила начисления баллов за задания.
+# Версия увеличивается при любом изменении правил: по ней пересчет
+# (recalculate_lab_scores) находит записи, посчитанные по старым правилам.
+SCORING_RULES_VERSION = 1
+
+TASK_MAX_SCORE = 10
+
+# Типы заданий, за которые начисляются баллы
+SCORED_TASK_TYPES = ('question', 'input')
+
+
+def apply_task_answer(completed_tasks, task_number, answer, is_correct):
+    """Обновляет запись задания в completed_tasks по результату попытки"""
+    task_data = next((t for t in completed_tasks if t['task_number'] == task_number), None)
+
+    if not task_data:
+        # Первая попытка
+        score = TASK_MAX_SCORE if is_correct else TASK_MAX_SCORE - 1
+        task_data = {
+            'task_number': task_number,
+            'completed': is_correct,
+            'attempts': 1,
+            'last_answer': answer,
+            'score': score,
+            'unlocked_next': is_correct  # Разблокировать следующее задание если правильно
+        }
+        completed_tasks.append(task_data)
+    else:
+        # Уже есть попытки
+        task_data['attempts'] += 1
+
+        if is_correct and not task_data['completed']:
+            # Впервые ответил правильно
+            task_data['completed'] = True
+            # -1 балл за каждую лишнюю попытку (начиная со второй)
+            penalty = min(task_data['attempts'] - 1, 9)  # Максимум 9 баллов можно снять
+            task_data['score'] = max(1, TASK_MAX_SCORE - penalty)
+            task_data['unlocked_next'] = True  # Разблокировать следующее задание
+        elif not is_correct and not task_data['completed']:
+            # Еще не ответил правильно, уменьшаем баллы
+            if task_data['attempts'] <= 10:
+                task_data['score'] = max(0, TASK_MAX_SCORE - task_data['attempts'] + 1)
+            else:
+                task_data['score'] = 0
+
+        task_data['last_answer'] = answer
+
+    return task_data
+
+
+def previous_task_completed(completed_tasks, task_number):
+    if task_number <= 1:
+        return True
+    prev_task = next((t for t in completed_tasks if t['task_number'] == task_number - 1), None)
+    return bool(prev_task and prev_task.get('completed', False))
+
+
+def total_task_score(completed_tasks):
+    """Итоговый балл работы: сумма баллов выполненных заданий"""
+    return sum(task.get('score', 0) for task in completed_tasks if task.get('completed'))
+
+
+def lab_max_score(lab_number, tasks):
+    """Максимальный балл работы по ее текущему набору заданий"""
+    if lab_number == 0:
+        # Подготовительный этап оценивается без баллов
+        return 0
+    return TASK_MAX_SCORE * sum(1 for task in tasks if task.get('type') in SCORED_TASK_TYPES)
+
+
+def replay_attempts(compiled_lab, attempts):
+    """Заново проигрывает историю попыток по текущему контенту работы.
+
+    attempts - пары (task_number, answer) в хронологическом порядке.
+    Ответы проверяются текущими проверками, условие порядка заданий не
+    применяется: попытки уже были приняты на момент отправки.
+    """
+    completed_tasks = []
+    for task_number, answer in attempts:
+        if task_number not in compiled_lab.tasks_by_number:
+            continue
+        is_correct = compiled_lab.check(task_number, answer)
+        apply_task_answer(completed_tasks, task_number, answer, is_correct)
+    return completed_tasks
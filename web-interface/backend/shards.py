@@ -0,0 +1,179 @@
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import sqlalchemy as sa
+from flask import g, has_app_context
+from sqlalchemy.sql.util import find_tables
+
+# Таблицы с данными студентов. Пользователи, работы и задачи остаются
+# в основной базе - общем справочнике для входа и выбора шарда
+SHARDED_TABLES = frozenset({'student_progress', 'task_attempt', 'activity_event',
+                            'student_lab_view', 'projection_checkpoint'})
+
+# Флаг в flask.g: шард, в который идут запросы к SHARDED_TABLES (None - основная база)
+SHARD_FLAG = 'shard'
+# Флаг в flask.g: запросы сессии этого контекста идут через движки только для чтения
+READ_ONLY_FLAG = 'use_read_engine'
+
+
+def configure_read_only(engine):
+    """Соединения SQLite только для чтения: PRAGMA query_only и один WAL-снимок на транзакцию"""
+    @sa.event.listens_for(engine, 'connect')
+    def set_query_only(dbapi_connection, connection_record):
+        # Транзакциями управляет SQLAlchemy (BEGIN ниже), а не модуль sqlite3
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA query_only=ON')
+        cursor.close()
+
+    @sa.event.listens_for(engine, 'begin')
+    def begin_snapshot(connection):
+        connection.exec_driver_sql('BEGIN')
+
+
+class ShardRouter:
+    """Распределение прогресса и попыток студентов по отдельным базам.
+
+    SHARDS в конфиге - словарь имя шарда -> URI базы. Шард студента выбирается
+    при создании по SHARD_ASSIGNMENTS (группа или кафедра -> имя шарда), иначе
+    по хешу группы, и хранится в User.shard: смена группы не разделяет историю.
+    Студенты без шарда (созданные до включения шардирования) остаются в основной
+    базе, поэтому она всегда участвует в сборе данных по всем шардам.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.db = None
+        self._engines = {}
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db):
+        self.app = app
+        self.db = db
+
+    def names(self):
+        return [None] + sorted(self.app.config['SHARDS'])
+
+    def choose(self, group=None, department=None):
+        shards = sorted(self.app.config['SHARDS'])
+        if not shards:
+            return None
+
+        assignments = self.app.config['SHARD_ASSIGNMENTS']
+        for key in (group, department):
+            if key and key in assignments:
+                return assignments[key]
+
+        key = group or department or ''
+        return shards[zlib.crc32(key.encode('utf-8')) % len(shards)]
+
+    def engine(self, name, read_only=False):
+        if name is None:
+            return self.db.engine
+
+        key = (name, read_only)
+        engine = self._engines.get(key)
+        if engine is None:
+            with self._lock:
+                engine = self._engines.get(key)
+                if engine is None:
+                    engine = self._engines[key] = self._create_engine(name, read_only)
+        return engine
+
+    def _create_engine(self, name, read_only):
+        uri = self.app.config['SHARDS'].get(name)
+        if uri is None:
+            raise KeyError(f"Неизвестный шард: {name}")
+
+        url = sa.make_url(uri)
+        if url.get_backend_name() != 'sqlite':
+            return sa.create_engine(url)
+
+        # Относительные пути - от instance/, как у основной базы во Flask-SQLAlchemy
+        if url.database not in (None, '', ':memory:') and not os.path.isabs(url.database):
+            os.makedirs(self.app.instance_path, exist_ok=True)
+            url = url.set(database=os.path.join(self.app.instance_path, url.database))
+        engine = sa.create_engine(url, connect_args={'check_same_thread': False})
+        if read_only:
+            configure_read_only(engine)
+        return engine
+
+    def bind_for(self, mapper=None, clause=None, read_only=False):
+        """Движок шарда текущего контекста, если запрос касается таблиц студентов"""
+        if not has_app_context():
+            return None
+        name = g.get(SHARD_FLAG)
+        if name is None:
+            return None
+
+        if mapper is not None:
+            tables = {mapper.local_table}
+        elif clause is not None:
+            tables = find_tables(clause, include_crud=True)
+        else:
+            return None
+
+        if any(table.name in SHARDED_TABLES for table in tables):
+            return self.engine(name, read_only)
+        return None
+
+    def create_all(self, metadata):
+        tables = [metadata.tables[name] for name in SHARDED_TABLES]
+        for name in self.names():
+            if name is not None:
+                metadata.create_all(self.engine(name), tables=tables)
+
+    def fan_out(self, query):
+        """query(conn) во всех шардах параллельно; результаты в порядке names().
+
+        Основная база читается через db.session (с учетом движка только для
+        чтения), шарды - через собственные соединения в пуле потоков, в режиме
+        чтения - через движки шардов только для чтения.
+        """
+        names = self.names()
+        if len(names) == 1:
+            return [self._query_main(query)]
+        read_only = bool(g.get(READ_ONLY_FLAG))
+
+        def run(name):
+            with self.engine(name, read_only).connect() as conn:
+                return query(conn)
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=len(names) - 1,
+                                                    thread_name_prefix='shard')
+            executor = self._executor
+
+        futures = [executor.submit(run, name) for name in names[1:]]
+        results = [self._query_main(query)]
+        results.extend(future.result() for future in futures)
+        return results
+
+    def _query_main(self, query):
+        # Часть основной базы читается сессией: шард контекста на нее влиять не должен
+        previous = g.get(SHARD_FLAG)
+        use_shard(None)
+        try:
+            return query(self.db.session)
+        finally:
+            use_shard(previous)
+
+    def dispose(self):
+        with self._lock:
+            for engine in self._engines.values():
+                engine.dispose()
+            self._engines = {}
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+shard_router = ShardRouter()
+
+
+def use_shard(name):
+    setattr(g, SHARD_FLAG, name)
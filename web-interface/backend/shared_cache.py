@@ -0,0 +1,156 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+import sqlalchemy as sa
+
+
+def thread_connection(local, path, schema):
+    """Соединение с SQLite-файлом для текущего потока (после fork - новое).
+
+    В файле только восстановимые данные (кэш, счетчики лимитов), поэтому
+    synchronous=OFF: потеря последних изменений при сбое допустима. Вместе с
+    соединением сбрасывается и остальное состояние потока в local.
+    """
+    conn = getattr(local, 'conn', None)
+    if conn is None or getattr(local, 'pid', None) != os.getpid():
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=OFF')
+        for statement in schema:
+            conn.execute(statement)
+        local.__dict__.clear()
+        local.conn = conn
+        local.pid = os.getpid()
+    return conn
+
+
+class LocalCacheStore:
+    """Счетчики поколений в памяти процесса (один воркер): общего уровня нет"""
+
+    shared = False
+
+    def __init__(self):
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generation(self, namespace):
+        return self._generations.get(namespace, 0)
+
+    def bump(self, namespace):
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            return self._generations[namespace]
+
+    def get(self, namespace, key, generation):
+        return None
+
+    def put(self, namespace, key, generation, value, ttl):
+        pass
+
+
+class SqliteCacheStore:
+    """Общий уровень кэша в SQLite-файле: поколения пространств имен и значения.
+
+    Запись, после которой кэш устарел, увеличивает поколение своего пространства
+    имен; значения прошлых поколений перестают читаться во всех воркерах сразу.
+    Поколения читаются заново, только если файл изменили другие соединения
+    (PRAGMA data_version), поэтому проверка на каждом обращении почти бесплатна.
+    """
+
+    shared = True
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS generations ('
+        'namespace TEXT PRIMARY KEY, generation INTEGER NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS entries ('
+        'namespace TEXT NOT NULL, key TEXT NOT NULL, generation INTEGER NOT NULL, '
+        'expires REAL NOT NULL, value BLOB NOT NULL, PRIMARY KEY (namespace, key))'
+    )
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = thread_connection(self._local, self.path, self.SCHEMA)
+        if not hasattr(self._local, 'generations'):
+            self._local.data_version = None
+            self._local.generations = {}
+        return conn
+
+    def generation(self, namespace):
+        conn = self._connection()
+        local = self._local
+        data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if data_version != local.data_version:
+            local.generations = dict(conn.execute('SELECT namespace, generation FROM generations'))
+            local.data_version = data_version
+        return local.generations.get(namespace, 0)
+
+    def bump(self, namespace):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            generation = conn.execute(
+                'INSERT INTO generations (namespace, generation) VALUES (?, 1) '
+                'ON CONFLICT (namespace) DO UPDATE SET generation = generation + 1 '
+                'RETURNING generation', (namespace,)
+            ).fetchone()[0]
+            conn.execute('DELETE FROM entries WHERE namespace = ? AND generation < ?', (namespace, generation))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        # Свои записи не меняют data_version этого соединения
+        self._local.generations[namespace] = generation
+        return generation
+
+    def get(self, namespace, key, generation):
+        row = self._connection().execute(
+            'SELECT value FROM entries WHERE namespace = ? AND key = ? AND generation = ? AND expires > ?',
+            (namespace, key, generation, time.time())
+        ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def put(self, namespace, key, generation, value, ttl):
+        conn = self._connection()
+        now = time.time()
+        # Без этого истекшие значения копились бы до следующего bump() пространства имен
+        conn.execute('DELETE FROM entries WHERE expires <= ?', (now,))
+        # Значение посчитано по данным поколения generation: если оно уже сменилось, запись не нужна
+        conn.execute(
+            'INSERT OR REPLACE INTO entries (namespace, key, generation, expires, value) '
+            'SELECT ?, ?, ?, ?, ? WHERE COALESCE((SELECT generation FROM generations '
+            'WHERE namespace = ?), 0) = ?',
+            (namespace, key, generation, now + ttl,
+             pickle.dumps(value, pickle.HIGHEST_PROTOCOL), namespace, generation)
+        )
+
+
+def default_cache_path(database_uri, instance_path):
+    """Файл общего кэша своей базы: снимки и поколения разных баз не смешиваются.
+
+    Для файловой SQLite - <файл базы>.cache рядом с ней (относительный путь - от
+    instance/, как у Flask-SQLAlchemy), для других СУБД - instance/cache-<хеш URI>.db.
+    Для базы в памяти общего уровня нет: None.
+    """
+    url = sa.make_url(database_uri)
+    if url.get_backend_name() == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            return None
+        path = url.database
+        if not os.path.isabs(path):
+            path = os.path.join(instance_path, path)
+        return path + '.cache'
+    digest = hashlib.sha1(url.render_as_string(hide_password=False).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(instance_path, f'cache-{digest}.db')
+
+
+def create_cache_store(path=None):
+    """Общий SQLite-уровень, если задан путь к файлу, иначе (пустой путь) счетчики в памяти процесса"""
+    return SqliteCacheStore(path) if path else LocalCacheStore()
@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import OrderedDict
+
+from shared_cache import LocalCacheStore
+
+
+class _Flight:
+    """Вычисление, которое уже выполняется: остальные запросы ждут его результат"""
+
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SnapshotCache:
+    """Кэш готовых снимков ответов с коротким TTL и объединением одинаковых запросов.
+
+    Пока один поток считает снимок, остальные запросы с тем же ключом ждут
+    его результат вместо запуска такого же вычисления (single-flight).
+    invalidate() после записи делает все снимки устаревшими: снимок, который
+    считался во время записи, отдается ожидающим, но в кэш не попадает.
+
+    Снимки хранятся в локальном LRU процесса поверх store (shared_cache):
+    поколение пространства имен namespace берется из store, поэтому
+    invalidate() в одном воркере сбрасывает снимки всех воркеров, а снимок,
+    посчитанный одним воркером, читают остальные.
+    """
+
+    def __init__(self, ttl=5.0, store=None, namespace='snapshots', max_entries=256):
+        self.ttl = ttl
+        self.store = store or LocalCacheStore()
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'shared_hits': 0, 'misses': 0, 'coalesced': 0, 'invalidations': 0}
+
+    def get_or_compute(self, key, compute, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        generation = self.store.generation(self.namespace)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, entry_generation, expires = entry
+                if entry_generation == generation and expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return value
+
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.stats['coalesced'] += 1
+                leader = False
+            else:
+                flight = self._flights[key] = _Flight()
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = self.store.get(self.namespace, key, generation)
+            if flight.value is not None:
+                shared = True
+            else:
+                shared = False
+                flight.value = compute()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            try:
+                with self._lock:
+                    self._flights.pop(key, None)
+                    if flight.error is None:
+                        self.stats['shared_hits' if shared else 'misses'] += 1
+                if flight.error is None and self.store.generation(self.namespace) == generation:
+                    if not shared:
+                        self.store.put(self.namespace, key, generation, flight.value, ttl)
+                    self._remember(key, flight.value, generation, ttl)
+            finally:
+                # Ожидающие получают результат, даже если общий уровень недоступен
+                flight.done.set()
+
+        return flight.value
+
+    def _remember(self, key, value, generation, ttl):
+        with self._lock:
+            self._entries[key] = (value, generation, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        self.store.bump(self.namespace)
+        with self._lock:
+            self._entries.clear()
+            self.stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._flights.clear()
+            for key in self.stats:
+                self.stats[key] = 0
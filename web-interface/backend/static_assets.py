@@ -0,0 +1,145 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+from flask import request, send_from_directory
+from werkzeug.utils import safe_join
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен: без него собираются только .gz
+    brotli = None
+
+# Каталог сборки внутри frontend/ и файл соответствия "исходное имя -> имя с хешем"
+BUILD_DIR = 'dist'
+MANIFEST_NAME = 'assets-manifest.json'
+
+FINGERPRINT_EXTENSIONS = ('.js', '.css')
+COMPRESS_EXTENSIONS = ('.js', '.css', '.html')
+
+# Варианты сжатия в порядке предпочтения: (Content-Encoding, суффикс файла)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+HTML_CACHE = 'no-cache'
+
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{10}\.(?:js|css)$')
+ASSET_REF_RE = re.compile(r'(?P<attr>(?:src|href)=")(?P<name>[\w.-]+\.(?:js|css))(?=")')
+
+
+def _content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def _write_variants(out_dir, name, data):
+    """Записывает файл и его сжатые варианты (.gz, .br)"""
+    path = os.path.join(out_dir, name)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+    if not name.endswith(COMPRESS_EXTENSIONS):
+        return
+
+    # mtime=0 делает .gz воспроизводимым между сборками
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def build_assets(src_dir, out_dir):
+    """Сборка статики: имена с хешем содержимого, .gz/.br варианты, переписанные ссылки в HTML"""
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {}
+
+    for name in sorted(os.listdir(src_dir)):
+        path = os.path.join(src_dir, name)
+        if not os.path.isfile(path) or not name.endswith(FINGERPRINT_EXTENSIONS):
+            continue
+
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        root, ext = os.path.splitext(name)
+        hashed_name = f'{root}.{_content_hash(data)}{ext}'
+        _write_variants(out_dir, hashed_name, data)
+        manifest[name] = hashed_name
+
+    def rewrite(match):
+        name = match.group('name')
+        return match.group('attr') + manifest.get(name, name)
+
+    for name in sorted(os.listdir(src_dir)):
+        path = os.path.join(src_dir, name)
+        if not os.path.isfile(path) or not name.endswith('.html'):
+            continue
+
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+
+        _write_variants(out_dir, name, ASSET_REF_RE.sub(rewrite, html).encode('utf-8'))
+
+    # Удаляем устаревшие версии файлов с хешем
+    current = set(manifest.values())
+    for name in os.listdir(out_dir):
+        base = name
+        for _, suffix in ENCODINGS:
+            if base.endswith(suffix):
+                base = base[:-len(suffix)]
+        if HASHED_NAME_RE.search(base) and base not in current:
+            os.remove(os.path.join(out_dir, name))
+
+    with open(os.path.join(out_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    return manifest
+
+
+def _cache_control(path):
+    if HASHED_NAME_RE.search(path):
+        return IMMUTABLE_CACHE
+    if path.endswith('.html'):
+        return HTML_CACHE
+    return None
+
+
+def send_asset(static_folder, path):
+    """Отдает статический файл: из сборки, если она есть, с учетом Accept-Encoding"""
+    build_folder = os.path.join(static_folder, BUILD_DIR)
+    build_path = safe_join(build_folder, path)
+
+    if build_path is None or not os.path.isfile(build_path):
+        response = send_from_directory(static_folder, path)
+        cache_control = _cache_control(path)
+        if cache_control:
+            response.headers['Cache-Control'] = cache_control
+        return response
+
+    filename = path
+    content_encoding = None
+    if path.endswith(COMPRESS_EXTENSIONS):
+        for encoding, suffix in ENCODINGS:
+            if request.accept_encodings[encoding] and os.path.isfile(build_path + suffix):
+                filename = path + suffix
+                content_encoding = encoding
+                break
+
+    mimetype = mimetypes.guess_type(path)[0]
+    response = send_from_directory(build_folder, filename, mimetype=mimetype,
+                                   download_name=os.path.basename(path))
+
+    if content_encoding:
+        response.headers['Content-Encoding'] = content_encoding
+    if path.endswith(COMPRESS_EXTENSIONS):
+        response.headers['Vary'] = 'Accept-Encoding'
+
+    cache_control = _cache_control(path)
+    if cache_control:
+        response.headers['Cache-Control'] = cache_control
+
+    return response
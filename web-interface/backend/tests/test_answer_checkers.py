@@ -0,0 +1,24 @@
+from answer_checkers import compile_matcher
+
+
+def test_default_input_check_matches_baseline_normalization():
+    match = compile_matcher({'type': 'input', 'correct_answer': ' Sudo Nano /etc/logcheck/logcheck.conf '})
+    assert match('sudo nano /etc/logcheck/logcheck.conf')
+    assert match('  SUDO NANO /etc/logcheck/logcheck.conf\n')
+    # Пробелы внутри ответа по умолчанию значимы, как в исходной проверке
+    assert not match('sudo  nano /etc/logcheck/logcheck.conf')
+
+
+def test_collapse_whitespace_is_opt_in():
+    match = compile_matcher({'type': 'input', 'correct_answer': 'sudo nano /etc/logcheck/logcheck.conf',
+                             'check': {'type': 'text', 'collapse_whitespace': True}})
+    assert match('sudo  nano\t/etc/logcheck/logcheck.conf')
+    assert not match('sudonano /etc/logcheck/logcheck.conf')
+
+
+def test_set_items_keep_internal_whitespace_by_default():
+    task = {'type': 'input', 'correct_answer': 'Minetest, Open Arena', 'check': {'type': 'set'}}
+    assert compile_matcher(task)('open arena,minetest')
+    assert not compile_matcher(task)('open  arena, minetest')
+    task['check']['collapse_whitespace'] = True
+    assert compile_matcher(task)('open  arena, minetest')
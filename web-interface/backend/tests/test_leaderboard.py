@@ -0,0 +1,110 @@
+import bisect
+import random
+
+import pytest
+
+from leaderboard import TOTAL, Leaderboard, OrderStatisticTree
+
+
+def check_tree(tree, reference):
+    assert len(tree) == len(reference)
+    assert tree.slice(0, len(reference)) == reference
+    for index, key in enumerate(reference):
+        assert tree.rank(key) == index
+        assert tree.select(index) == key
+
+
+def test_insert_and_remove_match_sorted_list():
+    rng = random.Random(1)
+    tree, reference = OrderStatisticTree(), []
+    for _ in range(2000):
+        key = (rng.randint(-100, 0), rng.randint(0, 50), rng.randint(1, 300))
+        if key in reference:
+            tree.remove(key)
+            reference.remove(key)
+        else:
+            tree.insert(key)
+            bisect.insort(reference, key)
+    check_tree(tree, reference)
+
+
+def test_from_sorted_keeps_order_after_updates():
+    reference = [(-score, 0, student_id) for student_id, score in enumerate(range(100, 0, -1))]
+    tree = OrderStatisticTree.from_sorted(reference)
+    check_tree(tree, reference)
+
+    for key in reference[::3]:
+        tree.remove(key)
+    reference = [key for index, key in enumerate(reference) if index % 3]
+    tree.insert((-50, 5, 1000))
+    bisect.insort(reference, (-50, 5, 1000))
+    check_tree(tree, reference)
+
+
+def test_rank_of_missing_key_counts_smaller_keys():
+    tree = OrderStatisticTree.from_sorted([1, 3, 5])
+    assert tree.rank(0) == 0
+    assert tree.rank(4) == 2
+    assert tree.rank(6) == 3
+
+
+def test_select_out_of_range():
+    tree = OrderStatisticTree.from_sorted([1, 2])
+    with pytest.raises(IndexError):
+        tree.select(2)
+    with pytest.raises(IndexError):
+        OrderStatisticTree().select(0)
+
+
+def test_remove_missing_key_is_noop():
+    tree = OrderStatisticTree.from_sorted([1, 2, 3])
+    tree.remove(5)
+    check_tree(tree, [1, 2, 3])
+
+
+def test_slice_is_clamped():
+    tree = OrderStatisticTree.from_sorted(list(range(10)))
+    assert tree.slice(-5, 3) == [0, 1, 2]
+    assert tree.slice(8, 20) == [8, 9]
+
+
+def make_leaderboard():
+    board = Leaderboard()
+    board.rebuild([
+        (1, 'A', 10, 90, 300),
+        (2, 'A', 10, 80, 200),
+        (3, 'B', 10, 90, 100),
+        (1, 'A', 20, 50, 100),
+    ], [10, 20], generation=1, positions={None: 0})
+    return board
+
+
+def test_leaderboard_order_and_groups():
+    board = make_leaderboard()
+    assert [entry['student_id'] for entry in board.top(10)] == [3, 1, 2]
+    assert [entry['student_id'] for entry in board.top(10, 'A')] == [1, 2]
+    assert [entry['student_id'] for entry in board.top(TOTAL)] == [1, 3, 2]
+    assert board.position(10, 2) == {'position': 3, 'size': 3, 'percentile': 33.3,
+                                     'score': 80, 'total_time': 200}
+
+
+def test_leaderboard_record_and_remove():
+    board = make_leaderboard()
+    board.record(2, 'A', 10, 95)
+    assert board.position(10, 2)['position'] == 1
+    assert board.position(10, 2)['total_time'] == 200
+
+    board.remove_student(1)
+    assert board.size(10) == 2
+    assert board.size(TOTAL, 'A') == 1
+    assert board.position(20, 1) is None
+
+
+def test_leaderboard_move_student():
+    board = make_leaderboard()
+    board.move_student(1, 'B')
+    assert board.group_of(1) == 'B'
+    assert [entry['student_id'] for entry in board.top(10, 'A')] == [2]
+    assert [entry['student_id'] for entry in board.top(10, 'B')] == [3, 1]
+    assert board.size(20, 'A') == 0
+    assert board.size(10) == 3
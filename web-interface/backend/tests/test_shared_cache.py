@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+
+from shared_cache import default_cache_path
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Отдельный процесс на каждую базу: app.py настраивается при импорте
+CATALOG_SCRIPT = """
+import json, sys
+import app as m
+with m.app.app_context():
+    m.init_db()
+    if sys.argv[1]:
+        m.db.session.add(m.Lab(title=sys.argv[1], difficulty='easy', content='[]',
+                               lab_number=9, order=99, is_active=True))
+        m.db.session.commit()
+        m.catalog_cache.invalidate()
+    labs = m.app.test_client().get('/api/labs').get_json()['labs']
+print(json.dumps({'storage': m.app.config['CACHE_STORAGE'], 'titles': [lab['title'] for lab in labs]}))
+"""
+
+
+def catalog(database, extra_title=''):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{database}')
+    env.pop('CACHE_STORAGE', None)
+    output = subprocess.run([sys.executable, '-c', CATALOG_SCRIPT, extra_title], cwd=BACKEND, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_default_cache_path_is_per_database(tmp_path):
+    assert default_cache_path(f'sqlite:///{tmp_path}/a.db', '/inst') == f'{tmp_path}/a.db.cache'
+    assert default_cache_path('sqlite:///main.db', '/inst') == '/inst/main.db.cache'
+    assert default_cache_path('sqlite://', '/inst') is None
+    assert default_cache_path('postgresql://u@h/a', '/inst') != default_cache_path('postgresql://u@h/b', '/inst')
+
+
+def test_apps_on_different_databases_do_not_share_catalog(tmp_path):
+    first = catalog(tmp_path / 'first.db', 'Только в первой базе')
+    second = catalog(tmp_path / 'second.db')
+
+    assert first['storage'] != second['storage']
+    assert 'Только в первой базе' in first['titles']
+    assert 'Только в первой базе' not in second['titles']
@@ -0,0 +1,4 @@
+from app import app
+
+# Точка входа для WSGI-серверов (gunicorn -c gunicorn.conf.py wsgi:app).
+# Схема и начальные данные создаются отдельно: flask --app app init-db
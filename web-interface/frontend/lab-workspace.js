@@ -3,6 +3,10 @@ let currentTasks = [];
 let timerInterval = null;
 let startTime = null;
 let elapsedTime = 0;
+// Активное время по данным сервера на момент startTime (с)
+let baseTime = 0;
+// Вкладка рабочей области: сервер считает время, пока видна хотя бы одна вкладка
+const workspaceTabId = Math.random().toString(36).slice(2) + Date.now().toString(36);
 
 document.addEventListener('DOMContentLoaded', async function() {
     const user = await requireAuth('student');
@@ -57,8 +61,10 @@ document.addEventListener('DOMContentLoaded', async function() {
         // 5. Загружаем страницу
         loadLabPage();
         
-        // 6. Запускаем таймер
-        startTimer();
+        // 6. Запускаем таймер: время считает сервер по событиям рабочей области
+        elapsedTime = progress ? progress.total_time || 0 : 0;
+        setupWorkspaceTracking();
+        await sendWorkspaceState(document.visibilityState === 'visible' ? 'open' : 'hidden');
         
         // 7. Настраиваем обработчики
         setupEventListeners();
@@ -811,37 +817,65 @@ function startTimer() {
         clearInterval(timerInterval);
     }
     
-    // Сбрасываем startTime и используем только elapsedTime
+    // Локальный таймер только для отображения, на сервер он ничего не пишет
+    baseTime = elapsedTime;
     startTime = Date.now();
     
     timerInterval = setInterval(() => {
-        elapsedTime = Math.floor((Date.now() - startTime) / 1000);
-        
-        // Обновляем отображение каждую секунду
+        elapsedTime = baseTime + Math.floor((Date.now() - startTime) / 1000);
         updateTimerDisplay();
-        
-        // Каждые 10 секунд сохраняем время на сервере
-        if (elapsedTime % 10 === 0) {
-            saveTimeToServer();
-        }
     }, 1000);
 }
 
-async function saveTimeToServer() {
+function stopTimer() {
+    if (timerInterval) {
+        clearInterval(timerInterval);
+        timerInterval = null;
+    }
+}
+
+function setupWorkspaceTracking() {
+    document.addEventListener('visibilitychange', () => {
+        sendWorkspaceState(document.visibilityState === 'visible' ? 'visible' : 'hidden');
+    });
+    
+    // keepalive: запрос доживает до конца выгрузки страницы
+    window.addEventListener('pagehide', () => {
+        sendWorkspaceState('close', true);
+    });
+}
+
+// Сервер хранит интервалы активности; отправляем только смену состояния
+async function sendWorkspaceState(state, keepalive = false) {
     if (!currentLab) return;
     
+    if (state === 'hidden' || state === 'close') {
+        stopTimer();
+    }
+    
     try {
-        await apiRequest(`/api/student/lab/${currentLab.id}/update-time`, {
+        const response = await apiRequest(`/api/student/lab/${currentLab.id}/workspace`, {
             method: 'POST',
-            body: JSON.stringify({ elapsed_time: elapsedTime })
+            body: JSON.stringify({ state: state, tab: workspaceTabId }),
+            keepalive: keepalive
         });
+        
+        if (response && response.success) {
+            elapsedTime = response.total_time;
+            updateTimerDisplay();
+            if (response.active) {
+                startTimer();
+            } else {
+                stopTimer();
+            }
+        }
     } catch (error) {
-        console.error('Error saving time:', error);
+        console.error('Error sending workspace state:', error);
     }
 }
 
 function updateTimerDisplay() {
-    // Используем elapsedTime который начинается с 0
+    // elapsedTime - активное время по данным сервера плюс локальный отсчет
     const hours = Math.floor(elapsedTime / 3600);
     const minutes = Math.floor((elapsedTime % 3600) / 60);
     const seconds = elapsedTime % 60;
@@ -883,19 +917,10 @@ async function completeLabWork() {
     
     try {
         // Останавливаем таймер
-        if (timerInterval) {
-            clearInterval(timerInterval);
-            timerInterval = null;
-        }
-        
-        // Сохраняем финальное время
-        await saveTimeToServer();
+        stopTimer();
         
         const response = await apiRequest(`/api/student/lab/${currentLab.id}/complete`, {
-            method: 'POST',
-            body: JSON.stringify({ 
-                total_time: elapsedTime
-            })
+            method: 'POST'
         });
         
         if (response.success) {
@@ -912,7 +937,7 @@ async function completeLabWork() {
                     max_score: response.max_score || 100,
                     start_time: startTimeMsk,
                     end_time: endTimeMsk,
-                    total_time: formatTime(elapsedTime),
+                    total_time: formatTime(response.total_time),
                     errors: 0
                 });
             } else {